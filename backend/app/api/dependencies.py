@@ -1,23 +1,32 @@
 """
 API dependencies for authentication and authorization.
+
+Bearer-token authentication lives in ``app.core.security``; it is re-exported
+here so both import paths share the same classified fast path.
 """
-import uuid
-from typing import Optional, Dict, Any
+from typing import Dict, Any
 from fastapi import Depends, HTTPException, status, Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-import jwt
 import structlog
 
-from app.core.config import get_settings
 from app.core.database import get_async_session
+from app.core.security import security, get_current_user, get_optional_user
+from app.core.tracing import traced
 from app.models.database import User, UserQuota
 from app.services.usage_service import UsageService
 
 logger = structlog.get_logger(__name__)
 
-security = HTTPBearer(auto_error=False)
+__all__ = [
+    "security",
+    "get_current_user",
+    "get_optional_user",
+    "get_current_admin",
+    "check_user_quota",
+    "rate_limit_chat",
+    "AuthenticationError",
+    "QuotaExceededError",
+]
 
 class AuthenticationError(Exception):
     """Custom authentication error."""
@@ -27,107 +36,6 @@ class QuotaExceededError(Exception):
     """User quota exceeded error."""
     pass
 
-async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: AsyncSession = Depends(get_async_session)
-) -> User:
-    """Get current authenticated user."""
-    
-    if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    try:
-        # Try Firebase token verification first
-        from app.services.firebase_service import firebase_service
-        
-        logger.info("Attempting Firebase token verification")
-        firebase_user = await firebase_service.verify_firebase_token(credentials.credentials)
-        
-        if firebase_user:
-            logger.info(f"Firebase token verified for user: {firebase_user.get('email')}")
-            
-            # Firebase token verified - get user from database
-            user_email = firebase_user.get("email")
-            if not user_email:
-                logger.error("Firebase token missing email")
-                raise AuthenticationError("Firebase token missing email")
-            
-            # Find user by email in database
-            result = await db.execute(
-                select(User).where(User.email == user_email)
-            )
-            user = result.scalar_one_or_none()
-            
-            if not user:
-                logger.warning(f"User not found in database: {user_email}")
-                raise AuthenticationError("User not found in database")
-                
-            user_uuid = user.id
-            logger.info(f"User authenticated via Firebase: {user_email}")
-            
-        else:
-            logger.warning("Firebase token verification failed, trying JWT fallback")
-            
-            # Fallback to JWT token verification
-            settings = get_settings()
-            payload = jwt.decode(
-                credentials.credentials,
-                settings.jwt_secret_key,
-                algorithms=[settings.jwt_algorithm]
-            )
-            
-            # Extract user information from token payload
-            user_id = payload.get("user_id") or payload.get("sub")
-            if user_id is None:
-                raise AuthenticationError("Invalid token payload")
-            
-            # Convert string UUID to UUID object
-            try:
-                user_uuid = uuid.UUID(user_id)
-                logger.info(f"User authenticated via JWT: {user_id}")
-            except ValueError:
-                raise AuthenticationError("Invalid user ID format")
-        
-    except AuthenticationError as e:
-        logger.error(f"Authentication error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=str(e),
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    except jwt.PyJWTError as e:
-        logger.error("JWT decode error", error=str(e))
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    except Exception as e:
-        logger.error("Unexpected authentication error", error=str(e))
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication failed",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Get user from database
-    stmt = select(User).where(User.id == user_uuid, User.is_active == True)
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
-    
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found or inactive",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    return user
-
 async def get_current_admin(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -139,6 +47,7 @@ async def get_current_admin(
         )
     return current_user
 
+@traced("quota")
 async def check_user_quota(
     request: Request,
     current_user: User = Depends(get_current_user),
@@ -164,8 +73,10 @@ async def check_user_quota(
             if limits["requests"]:
                 raise QuotaExceededError("Monthly request limit exceeded")
         
-        # Store quota info in request state for later use
-        request.state.quota_info = quota_check["quota"]
+        # Store quota info in request state for later use (background jobs
+        # run without a request)
+        if request is not None:
+            request.state.quota_info = quota_check["quota"]
         
         return quota_check
         
@@ -188,43 +99,6 @@ async def check_user_quota(
         # Allow request to proceed if quota check fails
         return {"allowed": True, "quota": {}}
 
-async def get_optional_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: AsyncSession = Depends(get_async_session)
-) -> Optional[User]:
-    """Get current user if authenticated, otherwise return None."""
-    if not credentials:
-        return None
-    
-    try:
-        settings = get_settings()
-        payload = jwt.decode(
-            credentials.credentials,
-            settings.jwt_secret_key,
-            algorithms=[settings.jwt_algorithm]
-        )
-        
-        # Extract user information from token payload
-        user_id = payload.get("user_id") or payload.get("sub")
-        if user_id is None:
-            return None
-        
-        # Convert string UUID to UUID object
-        try:
-            user_uuid = uuid.UUID(user_id)
-        except ValueError:
-            return None
-        
-        # Get user from database
-        stmt = select(User).where(User.id == user_uuid, User.is_active == True)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        return user if user else None
-        
-    except jwt.PyJWTError:
-        return None
-
 async def rate_limit_chat(
     request: Request,
     current_user: User = Depends(get_current_user)
@@ -2,7 +2,7 @@
 Admin endpoints for Histora backend.
 """
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, Field
@@ -14,7 +14,10 @@ from app.core.database import get_async_session
 from app.core.config import get_settings, Settings
 from app.core.security import verify_admin_access
 from app.models.database import Character, User, SystemLog, ChatMessage, ChatSession, PricingPlan, CreditPackage, UserSubscription, CreditTransaction
-from app.services.auth_service import AuthService
+from app.services.auth_service import auth_service
+from app.services.character_registry import character_registry
+from app.core.response_cache import purge_cache_tags, TAG_PRICING_PLANS, TAG_CREDIT_PACKAGES
+from app.core.query_log import COMPONENT_SLOW_QUERY, COMPONENT_QUERY_COUNT
 
 logger = structlog.get_logger(__name__)
 router = APIRouter()
@@ -222,8 +225,6 @@ async def admin_login(
 ):
     """Admin login endpoint."""
     try:
-        auth_service = AuthService()
-        
         # Authenticate user with email and password
         user = await auth_service.authenticate_user(
             email=login_data.email,
@@ -244,7 +245,7 @@ async def admin_login(
                     demo_admin = User(
                         firebase_uid="admin-001",
                         email="admin@histora.com",
-                        password_hash=auth_service.hash_password("admin123"),
+                        password_hash=await auth_service.hash_password_async("admin123"),
                         display_name="Admin User",
                         full_name="Demo Admin",
                         role="admin",
@@ -402,8 +403,10 @@ async def create_character(
         )
         
         db.add(new_character)
+        await character_registry.publish_change(db, new_character.id)
         await db.commit()
         await db.refresh(new_character)
+        character_registry.upsert_from_model(new_character)
         
         response = CharacterResponse(
             id=new_character.id,
@@ -438,6 +441,67 @@ async def create_character(
             detail="Failed to create character"
         )
 
+@router.put("/characters/{character_id}", response_model=CharacterResponse)
+async def update_character(
+    character_id: str,
+    character_update: CharacterUpdate,
+    db: AsyncSession = Depends(get_async_session),
+    admin: dict = Depends(verify_admin_access)
+):
+    """Update an existing character."""
+    try:
+        result = await db.execute(
+            select(Character).where(Character.id == character_id)
+        )
+        character = result.scalar_one_or_none()
+        
+        if not character:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Character '{character_id}' not found"
+            )
+        
+        # Update only provided fields
+        update_data = character_update.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(character, field, value)
+        
+        await character_registry.publish_change(db, character.id)
+        await db.commit()
+        await db.refresh(character)
+        character_registry.upsert_from_model(character)
+        
+        logger.info(f"Updated character: {character.id}")
+        return CharacterResponse(
+            id=character.id,
+            name=character.name,
+            title=character.title,
+            birth_year=character.birth_year,
+            death_year=character.death_year,
+            nationality=character.nationality,
+            category=character.category,
+            description=character.description,
+            avatar_url=character.avatar_url,
+            personality_traits=character.personality_traits or [],
+            speaking_style=character.speaking_style,
+            knowledge_context=character.knowledge_context,
+            supported_languages=character.supported_languages or ["tr", "en"],
+            is_published=character.is_published,
+            is_featured=character.is_featured,
+            created_at=character.created_at.isoformat(),
+            updated_at=character.updated_at.isoformat()
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to update character {character_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update character"
+        )
+
 @router.get("/stats")
 async def get_admin_stats(
     db: AsyncSession = Depends(get_async_session),
@@ -529,6 +593,105 @@ async def get_admin_stats(
             detail="Failed to retrieve admin statistics"
         )
 
+@router.get("/query-log")
+async def get_query_log(
+    hours: int = Query(24, ge=1, le=24 * 30, description="Look-back window in hours"),
+    limit: int = Query(20, ge=1, le=100, description="Entries per list"),
+    db: AsyncSession = Depends(get_async_session),
+    admin: dict = Depends(verify_admin_access)
+) -> Dict[str, Any]:
+    """Worst database offenders from the query log.
+    
+    ``slow_queries`` groups slow statements by normalized SQL, ordered by
+    total time spent; ``query_heavy_routes`` groups requests that issued too
+    many statements by route, ordered by how often they did.
+    """
+    try:
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        duration_ms = SystemLog.log_metadata["duration_ms"].as_float()
+        statements = SystemLog.log_metadata["statements"].as_integer()
+        
+        slow_query = (
+            select(
+                SystemLog.message,
+                func.count(SystemLog.id).label("count"),
+                func.sum(duration_ms).label("total_ms"),
+                func.max(duration_ms).label("max_ms"),
+                func.max(SystemLog.log_metadata["route"].as_string()).label("example_route"),
+                func.max(SystemLog.created_at).label("last_seen"),
+            )
+            .where(SystemLog.component == COMPONENT_SLOW_QUERY, SystemLog.created_at >= since)
+            .group_by(SystemLog.message)
+            .order_by(func.sum(duration_ms).desc())
+            .limit(limit)
+        )
+        heavy_stats = (
+            select(
+                SystemLog.message,
+                func.count(SystemLog.id).label("count"),
+                func.avg(statements).label("avg_statements"),
+                func.max(statements).label("max_statements"),
+                func.max(SystemLog.created_at).label("last_seen"),
+            )
+            .where(SystemLog.component == COMPONENT_QUERY_COUNT, SystemLog.created_at >= since)
+            .group_by(SystemLog.message)
+            .order_by(func.count(SystemLog.id).desc())
+            .limit(limit)
+            .subquery()
+        )
+        # Most recent occurrence per route shows which statements repeated
+        latest = (
+            select(SystemLog.message, SystemLog.log_metadata)
+            .where(SystemLog.component == COMPONENT_QUERY_COUNT, SystemLog.created_at >= since)
+            .distinct(SystemLog.message)
+            .order_by(SystemLog.message, SystemLog.created_at.desc())
+            .subquery()
+        )
+        heavy_query = (
+            select(heavy_stats, latest.c.log_metadata)
+            .join(latest, latest.c.message == heavy_stats.c.message)
+            .order_by(heavy_stats.c.count.desc())
+        )
+        
+        slow_queries = [
+            {
+                "sql": row.message,
+                "count": row.count,
+                "total_ms": round(row.total_ms or 0, 1),
+                "avg_ms": round((row.total_ms or 0) / row.count, 1),
+                "max_ms": round(row.max_ms or 0, 1),
+                "example_route": row.example_route,
+                "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+            }
+            for row in (await db.execute(slow_query)).all()
+        ]
+        
+        heavy_routes = [
+            {
+                "route": row.message,
+                "count": row.count,
+                "avg_statements": round(float(row.avg_statements or 0), 1),
+                "max_statements": row.max_statements,
+                "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+                "latest_request_id": (row.log_metadata or {}).get("request_id"),
+                "repeated": (row.log_metadata or {}).get("repeated", []),
+            }
+            for row in (await db.execute(heavy_query)).all()
+        ]
+        
+        return {
+            "since": since.isoformat(),
+            "slow_queries": slow_queries,
+            "query_heavy_routes": heavy_routes,
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get query log: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve query log"
+        )
+
 @router.get("/health")
 async def admin_health_check():
     """Admin service health check."""
@@ -538,6 +701,7 @@ async def admin_health_check():
         "features": [
             "character_management",
             "system_stats",
+            "query_log",
             "pricing_management",
             "user_management"
         ]
@@ -621,6 +785,7 @@ async def create_pricing_plan(
         )
         
         db.add(new_plan)
+        await purge_cache_tags(db, TAG_PRICING_PLANS)
         await db.commit()
         await db.refresh(new_plan)
         
@@ -739,6 +904,7 @@ async def update_pricing_plan(
         for field, value in update_data.items():
             setattr(plan, field, value)
         
+        await purge_cache_tags(db, TAG_PRICING_PLANS)
         await db.commit()
         await db.refresh(plan)
         
@@ -800,6 +966,7 @@ async def delete_pricing_plan(
         
         # Delete the plan
         await db.delete(plan)
+        await purge_cache_tags(db, TAG_PRICING_PLANS)
         await db.commit()
         
         logger.info(f"Deleted pricing plan: {plan.name}")
@@ -884,6 +1051,7 @@ async def create_credit_package(
         )
         
         db.add(new_package)
+        await purge_cache_tags(db, TAG_CREDIT_PACKAGES)
         await db.commit()
         await db.refresh(new_package)
         
@@ -994,6 +1162,7 @@ async def update_credit_package(
         for field, value in update_data.items():
             setattr(package, field, value)
         
+        await purge_cache_tags(db, TAG_CREDIT_PACKAGES)
         await db.commit()
         await db.refresh(package)
         
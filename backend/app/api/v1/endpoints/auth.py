@@ -214,21 +214,17 @@ async def firebase_register(
                 detail="User with this email already exists"
             )
         
-        # Create user with Firebase UID
+        # Create user with Firebase UID (no local password: Firebase owns credentials)
         user = await auth_service.create_user(
             email=register_data.email,
-            password="firebase_auth",  # Firebase users don't need traditional password
+            password=None,
             full_name=register_data.display_name or register_data.email.split('@')[0],
             role="user",
-            db=db
+            db=db,
+            firebase_uid=register_data.firebase_uid,
+            email_verified=True  # Firebase handles email verification
         )
         
-        # Set Firebase UID
-        user.firebase_uid = register_data.firebase_uid
-        user.email_verified = True  # Firebase handles email verification
-        await db.commit()
-        await db.refresh(user)
-        
         # Create access token
         token_data = {
             "user_id": user.id,
@@ -283,20 +279,16 @@ async def firebase_login(
         user = await auth_service.get_user_by_email(firebase_user["email"], db)
         
         if not user:
-            # Create new user from Firebase data
+            # Create new user from Firebase data (no local password)
             user = await auth_service.create_user(
                 email=firebase_user["email"],
-                password="firebase_auth",  # Firebase users don't need password
+                password=None,
                 full_name=firebase_user.get("name", firebase_user["email"]),
                 role="user",
-                db=db
+                db=db,
+                firebase_uid=firebase_user["uid"],
+                email_verified=firebase_user.get("email_verified", False)
             )
-            
-            # Update with Firebase UID
-            user.firebase_uid = firebase_user["uid"]
-            user.email_verified = firebase_user.get("email_verified", False)
-            await db.commit()
-            await db.refresh(user)
         
         # Update last login
         user.last_login_at = datetime.utcnow()
@@ -1,16 +1,12 @@
 """
-Character management endpoints — served from the seed catalogue.
+Character management endpoints — served from the indexed seed catalogue.
 """
 
 from fastapi import APIRouter, HTTPException, status, Query
 from pydantic import BaseModel
 from typing import List, Optional
 
-from app.data.characters_seed import (
-    CHARACTERS,
-    get_categories_with_counts,
-    get_character as lookup_character,
-)
+from app.services.character_catalogue import character_catalogue
 
 router = APIRouter()
 
@@ -35,6 +31,11 @@ class CharacterResponse(BaseModel):
     view_count: int
 
 
+class CharacterSearchResult(CharacterResponse):
+    """Search hit with its relevance score."""
+    score: float
+
+
 class CategoryResponse(BaseModel):
     """Category response model."""
     id: str
@@ -57,11 +58,7 @@ async def get_characters(
     offset: int = Query(0, description="Offset for pagination"),
 ):
     """Get list of published characters."""
-    result = CHARACTERS
-    if category:
-        result = [c for c in result if c["category"] == category]
-    if featured_only:
-        result = [c for c in result if c["is_featured"]]
+    result = character_catalogue.list(category=category, featured_only=featured_only)
     return result[offset:offset + limit]
 
 
@@ -70,7 +67,21 @@ async def get_categories(
     language: str = Query("tr", description="Response language"),
 ):
     """Get list of character categories with counts."""
-    return get_categories_with_counts()
+    return character_catalogue.categories()
+
+
+@router.get("/search", response_model=List[CharacterSearchResult])
+async def search_characters(
+    q: str = Query(..., min_length=1, max_length=100, description="Search text (Turkish-insensitive)"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    language: str = Query("tr", description="Response language"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+):
+    """Search characters by name, bio and traits, best matches first."""
+    return [
+        {**character, "score": score}
+        for character, score in character_catalogue.search(q, limit=limit, category=category)
+    ]
 
 
 @router.get("/{character_id}", response_model=CharacterResponse)
@@ -79,7 +90,7 @@ async def get_character(
     language: str = Query("tr", description="Response language"),
 ):
     """Get character details by ID."""
-    character = lookup_character(character_id)
+    character = character_catalogue.get(character_id)
     if character:
         return character
     raise HTTPException(
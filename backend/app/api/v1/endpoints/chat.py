@@ -2,25 +2,41 @@
 Chat endpoints for conversations with historical characters.
 """
 
+import asyncio
+import json
 import time
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
 from app.core.config import get_settings, Settings
-from app.services.ai_service import get_ai_service, AIService
+from app.services.ai_service import get_ai_service, AIService, ChatMessage as AIChatMessage
 from app.services.usage_service import UsageService
 from app.services.session_service import session_service
 from app.services.token_service import TokenCreditService
-from app.core.database import get_async_session
-from app.models.database import Character, User
+from app.services.tokenizer_service import tokenizer_service
+from app.services.character_registry import character_registry
+from app.services.admission_service import admission_estimator
+from app.services.job_service import chat_job_service
+from app.core.database import get_async_session, async_session_scope
+from app.core.deadlines import cancel_on_disconnect, ClientDisconnected, CLIENT_CLOSED_REQUEST
+from app.core.tracing import span
+from app.core.session_locks import session_turn_lock, POLICY_QUEUE
+from app.core.idempotency import idempotency_store, request_fingerprint, IDEMPOTENCY_HEADER, REPLAYED_HEADER
+from app.core.stream_buffers import (
+    stream_buffers, stream_resumes, GenerationBuffer, BufferOverrun, parse_last_event_id,
+    LAST_EVENT_ID_HEADER, GENERATION_ID_HEADER
+)
+from app.models.database import User
 from app.data.characters_seed import get_character as lookup_seed_character
 from app.api.dependencies import get_current_user, check_user_quota, rate_limit_chat
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+import structlog
 
+logger = structlog.get_logger(__name__)
 router = APIRouter()
 
 
@@ -67,6 +83,54 @@ class ChatSession(BaseModel):
     mode: str
 
 
+class ChatJobRequest(ChatRequest):
+    """Chat request run as a background job."""
+    webhook_url: Optional[str] = None  # POSTed the job status when it finishes
+
+
+class ChatJobStatus(BaseModel):
+    """Background chat job state; ``result`` is set once it succeeds."""
+    job_id: str
+    status: str  # 'queued', 'running', 'succeeded', 'failed'
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    attempts: int = 0
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    error_status: Optional[int] = None
+
+
+class DebateRequest(BaseModel):
+    """Multi-character debate round on one topic."""
+    character_ids: List[str]
+    topic: str
+    session_id: Optional[str] = None
+    language: str = "tr"
+
+
+class DebateTurn(BaseModel):
+    """One character's answer in a debate round."""
+    character_id: str
+    character_name: str
+    response: str
+    model_used: str
+    response_time: float
+
+
+class DebateResponse(BaseModel):
+    """Debate round result."""
+    session_id: str
+    topic: str
+    language: str
+    mode: str
+    turns: List[DebateTurn]
+    failed_character_ids: List[str] = []
+    timestamp: datetime
+    response_time: float
+    usage: Optional[dict] = None  # Aggregated token usage for the round
+
+
 class DemoChatRequest(BaseModel):
     """Anonymous demo chat request — history is kept client-side."""
     character_id: str
@@ -108,13 +172,24 @@ async def send_demo_message(
         raise HTTPException(status_code=400, detail="Message too long")
 
     start_time = time.time()
-    ai_response = await ai_service.get_character_response(
-        character_id=chat_request.character_id,
-        user_message=chat_request.message,
-        chat_history=(chat_request.history or [])[-10:],
-        language=chat_request.language,
-        system_prompt_override=character["system_prompt"],
-    )
+    try:
+        ai_response = await cancel_on_disconnect(
+            request,
+            ai_service.get_character_response(
+                character_id=chat_request.character_id,
+                user_message=chat_request.message,
+                chat_history=(chat_request.history or [])[-10:],
+                language=chat_request.language,
+                system_prompt_override=character["system_prompt"],
+                plan_type="demo",
+                user_key=ip,
+                # Starter questions arrive in bursts; share one upstream call
+                coalesce=True,
+            ),
+            expected_tokens=admission_estimator.expected_output(chat_request.character_id),
+        )
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
     _demo_usage[ip] = (count + 1, today)
 
     return ChatResponse(
@@ -134,194 +209,484 @@ async def send_demo_message(
 @router.post("/send", response_model=ChatResponse)
 async def send_message(
     chat_request: ChatRequest,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    quota_check: dict = Depends(check_user_quota),
     _: None = Depends(rate_limit_chat),
     ai_service: AIService = Depends(get_ai_service),
     db: AsyncSession = Depends(get_async_session),
+    settings: Settings = Depends(get_settings),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255)
+):
+    """Send a message to a character and get RAG-enhanced AI response.
+    
+    With an ``Idempotency-Key`` header, a retry attaches to the in-flight
+    generation or replays its stored response instead of generating (and
+    billing) again.
+    """
+    if not idempotency_key:
+        return await _serialized_turn(
+            chat_request,
+            lambda: _send_message(chat_request, request, current_user, ai_service, db, settings)
+        )
+    
+    # The client will retry on its own, so the generation is not tied to this
+    # connection: it completes and is kept for the retry even if we disconnect.
+    # Duplicates attach here, before the session turn lock, so they never count
+    # as overlapping turns.
+    async def produce():
+        # Own session: the request's session is closed if the client goes away
+        async with async_session_scope() as turn_db:
+            return await _serialized_turn(
+                chat_request,
+                lambda: _send_message(chat_request, request, current_user, ai_service, turn_db, settings, detached=True)
+            )
+    
+    result, outcome = await idempotency_store.run(
+        (str(current_user.id), idempotency_key),
+        request_fingerprint(chat_request.dict()),
+        produce,
+        encode=lambda chat_response: json.loads(chat_response.json()),
+        decode=lambda data: ChatResponse(**data)
+    )
+    if outcome != "new":
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+@router.post("/stream")
+async def stream_message(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(rate_limit_chat),
+    ai_service: AIService = Depends(get_ai_service),
+    settings: Settings = Depends(get_settings)
+):
+    """Send a message and stream the reply as Server-Sent Events.
+    
+    Events are ``delta`` (``{"text"}``) fragments, then ``done`` with the
+    ChatResponse or ``error`` (``{"status", "detail"}``); ids are
+    ``<generation_id>:<seq>``. The generation does not depend on this
+    connection: after a drop, ``GET /chat/stream/{generation_id}`` with
+    ``Last-Event-ID`` replays the missed events and continues live, without
+    generating or billing again.
+    """
+    async def run(buffer: GenerationBuffer, db: AsyncSession) -> dict:
+        result = await _serialized_turn(
+            chat_request,
+            lambda: _send_message(
+                chat_request, None, current_user, ai_service, db, settings, detached=True,
+                on_delta=lambda text: buffer.publish("delta", {"text": text})
+            )
+        )
+        return json.loads(result.json())
+    
+    return await _start_stream(current_user, settings, run)
+
+
+@router.post("/debate")
+async def start_debate(
+    debate_request: DebateRequest,
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(rate_limit_chat),
+    ai_service: AIService = Depends(get_ai_service),
     settings: Settings = Depends(get_settings)
 ):
-    """Send a message to a character and get RAG-enhanced AI response."""
+    """Debate a topic between several characters, streamed as Server-Sent Events.
+    
+    All characters answer concurrently; each ``turn`` event is sent as soon
+    as that character has answered, then ``done`` carries the DebateResponse.
+    The round is stored in one write and billed as one usage record. Streams
+    resume like ``/chat/stream``.
+    """
+    async def run(buffer: GenerationBuffer, db: AsyncSession) -> dict:
+        result = await _serialized_turn(
+            debate_request,
+            lambda: _run_debate(debate_request, current_user, ai_service, db, settings, buffer.publish)
+        )
+        return json.loads(result.json())
+    
+    return await _start_stream(current_user, settings, run)
+
+
+@router.get("/stream/{generation_id}")
+async def resume_stream(
+    generation_id: str,
+    current_user: User = Depends(get_current_user),
+    settings: Settings = Depends(get_settings),
+    last_event_id: Optional[str] = Header(None, alias=LAST_EVENT_ID_HEADER)
+):
+    """Reconnect to a streamed generation, replaying events after ``Last-Event-ID``."""
+    buffer = stream_buffers.get(generation_id, str(current_user.id))
+    if buffer is None:
+        stream_resumes.inc(result="not_found")
+        raise HTTPException(status_code=404, detail="Generation not found or expired")
+    
+    after = parse_last_event_id(last_event_id, generation_id)
+    response = _sse_response(buffer, after, settings)
+    stream_resumes.inc(result="resumed")
+    return response
+
+
+# Background generations behind streamed replies (kept referenced until done)
+_stream_tasks: set = set()
+
+
+async def _start_stream(current_user: User, settings: Settings, run) -> StreamingResponse:
+    """Start ``run(buffer, db)`` as a detached generation and stream its buffer.
+    
+    ``run`` publishes its own events and returns the ``done`` payload.
+    """
+    generation_id = str(uuid.uuid4())
+    buffer = stream_buffers.create(generation_id, str(current_user.id))
+    rejected: List[HTTPException] = []
+    
+    async def produce():
+        try:
+            # Own session: the generation may outlive this request
+            async with async_session_scope() as db:
+                result = await run(buffer, db)
+            buffer.close("done", result)
+        except HTTPException as e:
+            if not buffer.last_seq:
+                rejected.append(e)
+            buffer.close("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error("Streamed chat turn failed", generation_id=generation_id, error=str(e))
+            buffer.close("error", {"status": 500, "detail": f"Chat error: {str(e)}"})
+        except asyncio.CancelledError:
+            # Cancelled (e.g. at shutdown): end the stream so wait_started and readers return
+            buffer.close("error", {"status": 503, "detail": "Generation cancelled"})
+            raise
+    
+    task = asyncio.ensure_future(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+    
+    # Admission failures (quota, credits, busy session) come before any
+    # output, so they are still returned as plain HTTP errors
+    await buffer.wait_started()
+    if rejected:
+        stream_buffers.discard(generation_id)
+        raise rejected[0]
+    return _sse_response(buffer, 0, settings)
+
+
+def _sse_response(buffer: GenerationBuffer, after: int, settings: Settings) -> StreamingResponse:
+    try:
+        buffer.check_resumable(after)
+    except BufferOverrun:
+        stream_resumes.inc(result="gone")
+        raise HTTPException(status_code=410, detail="Missed events are no longer buffered")
+    
+    async def events():
+        # Ask EventSource clients to reconnect quickly
+        yield b"retry: 1000\n\n"
+        try:
+            async for chunk in buffer.events(after, heartbeat=settings.stream_heartbeat_seconds):
+                yield chunk
+        except BufferOverrun:
+            # Reader fell behind the ring buffer; its reconnect gets 410
+            return
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            GENERATION_ID_HEADER: buffer.generation_id,
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+async def _serialized_turn(chat_request: ChatRequest, run_turn, policy: Optional[str] = None):
+    """Run a turn holding its session's turn lock (one generation per session)."""
+    if not chat_request.session_id:
+        return await run_turn()
+    async with session_turn_lock.turn(chat_request.session_id, policy=policy):
+        return await run_turn()
+
+
+@router.post("/jobs", response_model=ChatJobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def create_chat_job(
+    job_request: ChatJobRequest,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(rate_limit_chat),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Queue a chat turn and return its job id at once.
+    
+    For long generations (e.g. lesson mode) that would outlive proxy
+    timeouts. Poll ``GET /chat/jobs/{job_id}`` or pass ``webhook_url``.
+    """
+    if not character_registry.get(job_request.character_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Character '{job_request.character_id}' not found or not published"
+        )
     
+    webhook_url = None
+    if job_request.webhook_url:
+        try:
+            webhook_url = chat_job_service.validate_webhook_url(job_request.webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    payload = job_request.dict(exclude={"webhook_url"})
+    job = await chat_job_service.submit(db, current_user.id, payload, webhook_url)
+    response.headers["Location"] = f"/api/v1/chat/jobs/{job.id}"
+    return ChatJobStatus(**chat_job_service.to_payload(job))
+
+
+@router.get("/jobs/{job_id}", response_model=ChatJobStatus)
+async def get_chat_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Get a chat job's status, and its response once it has succeeded."""
     try:
-        # Handle session creation or retrieval
-        if chat_request.session_id:
-            # Use existing session
-            session_uuid = uuid.UUID(chat_request.session_id)
-            session = await session_service.get_session(db, session_uuid, current_user.id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
-            session_id = chat_request.session_id
-        else:
-            # Development mode: use mock session for mock users
-            settings = get_settings()
-            if (settings.environment == "development" and 
-                hasattr(current_user, '__class__') and 
-                current_user.__class__.__name__ == 'MockUser'):
-                # Generate a consistent mock session ID
-                session_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"mock-session-{current_user.id}-{chat_request.character_id}"))
-            else:
-                # Create new session
-                session = await session_service.create_session(
-                    db_session=db,
-                    user_id=current_user.id,
-                    character_id=chat_request.character_id,
-                    language=chat_request.language,
-                    mode=chat_request.mode
-                )
-                session_id = str(session.id)
-        
-        # Verify character exists and is published
-        result = await db.execute(
-            select(Character).where(
-                Character.id == chat_request.character_id,
-                Character.is_published == True
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job = await chat_job_service.get(db, job_uuid, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ChatJobStatus(**chat_job_service.to_payload(job))
+
+
+async def run_chat_job(payload: dict, current_user: User, db: AsyncSession) -> dict:
+    """Job worker entry point: run a stored turn with no client connection.
+    
+    Jobs wait for a busy session instead of being rejected.
+    """
+    chat_request = ChatRequest(**payload)
+    ai_service = await get_ai_service()
+    result = await _serialized_turn(
+        chat_request,
+        lambda: _send_message(chat_request, None, current_user, ai_service, db, get_settings(), detached=True),
+        policy=POLICY_QUEUE
+    )
+    return json.loads(result.json())
+
+
+async def _send_message(
+    chat_request: ChatRequest,
+    request: Optional[Request],
+    current_user: User,
+    ai_service: AIService,
+    db: AsyncSession,
+    settings: Settings,
+    detached: bool = False,
+    on_delta=None
+):
+    """Run one chat turn: admission, session, generation, persistence, billing.
+    
+    ``on_delta`` streams the reply's text fragments as they are generated.
+    """
+    
+    try:
+        # Resolve character from the in-memory registry (no per-message query)
+        character = character_registry.get(chat_request.character_id)
+        if not character:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Character '{chat_request.character_id}' not found or not published"
             )
+        
+        # Pre-flight admission: estimate this turn's tokens and check quota and
+        # credits before any session write or model call
+        estimate = admission_estimator.estimate(
+            chat_request.character_id, character.prompt_tokens, chat_request.message
         )
-        character = result.scalar_one_or_none()
+        quota_check = await check_user_quota(request, current_user, db, tokens_needed=estimate.total_tokens)
         
-        # Fallback to the seed catalogue if not found in database
-        if not character:
-            seed_char = lookup_seed_character(chat_request.character_id)
-            if not seed_char:
+        token_service = TokenCreditService(db)
+        mock_user = (settings.environment == "development" and 
+                     current_user.__class__.__name__ == 'MockUser')
+        if not mock_user:
+            credits_needed = await token_service.calculate_credits_needed(
+                estimate.input_tokens, estimate.output_tokens, settings.default_ai_model
+            )
+            if (current_user.credits or 0) < credits_needed:
                 raise HTTPException(
-                    status_code=404,
-                    detail=f"Character '{chat_request.character_id}' not found or not published"
+                    status_code=402,  # Payment Required
+                    detail=f"Insufficient credits for this request. Need about {credits_needed}, have {current_user.credits or 0}"
                 )
-
-            class MockCharacter:
-                def __init__(self, data):
-                    self.id = data["id"]
-                    self.name = data["name"]
-                    self.system_prompt = data["system_prompt"]
-                    self.is_published = True
-
-            character = MockCharacter(seed_char)
         
-        # Use character's base system prompt (RAG system removed)
+        # Handle session creation or retrieval
+        with span("chat.session"):
+            if chat_request.session_id:
+                # Use existing session
+                session_uuid = uuid.UUID(chat_request.session_id)
+                session = await session_service.get_session(db, session_uuid, current_user.id)
+                if not session:
+                    raise HTTPException(status_code=404, detail="Session not found")
+                session_id = chat_request.session_id
+            else:
+                # Development mode: use mock session for mock users
+                settings = get_settings()
+                if (settings.environment == "development" and 
+                    hasattr(current_user, '__class__') and 
+                    current_user.__class__.__name__ == 'MockUser'):
+                    # Generate a consistent mock session ID
+                    session_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"mock-session-{current_user.id}-{chat_request.character_id}"))
+                else:
+                    # Create new session
+                    session = await session_service.create_session(
+                        db_session=db,
+                        user_id=current_user.id,
+                        character_id=chat_request.character_id,
+                        language=chat_request.language,
+                        mode=chat_request.mode
+                    )
+                    session_id = str(session.id)
+        
+        # Use character's precompiled system prompt (RAG system removed)
         start_time = time.time()
-        base_prompt = character.system_prompt or "Sen bu karaktersin ve ona uygun şekilde konuş."
-        enhanced_prompt = base_prompt
+        enhanced_prompt = character.system_prompt
         
-        # Get AI response with enhanced prompt
-        ai_response = await ai_service.get_character_response(
-            character_id=chat_request.character_id,
-            user_message=chat_request.message,
-            language=chat_request.language,
-            system_prompt_override=enhanced_prompt
+        # Get AI response with enhanced prompt; a client that disconnects
+        # cancels the upstream call and nothing below is persisted or billed
+        ai_response = await cancel_on_disconnect(
+            None if detached else request,
+            ai_service.get_character_response(
+                character_id=chat_request.character_id,
+                user_message=chat_request.message,
+                language=chat_request.language,
+                system_prompt_override=enhanced_prompt,
+                plan_type=quota_check.get("quota", {}).get("plan_type"),
+                user_key=str(current_user.id),
+                on_delta=on_delta,
+                mode=chat_request.mode
+            ),
+            expected_tokens=estimate.output_tokens
         )
         
         # Save user message (skip in development mode for mock users)
-        if not (settings.environment == "development" and 
-                hasattr(current_user, '__class__') and 
-                current_user.__class__.__name__ == 'MockUser'):
-            await session_service.add_message(
-                db_session=db,
-                session_id=uuid.UUID(session_id),
-                role="user",
-                content=chat_request.message
-            )
+        with span("chat.persist"):
+            if not (settings.environment == "development" and 
+                    hasattr(current_user, '__class__') and 
+                    current_user.__class__.__name__ == 'MockUser'):
+                await session_service.add_message(
+                    db_session=db,
+                    session_id=uuid.UUID(session_id),
+                    role="user",
+                    content=chat_request.message
+                )
         
-        # Save AI response (skip in development mode for mock users)
-        response_time_ms = int((time.time() - start_time) * 1000)
-        if not (settings.environment == "development" and 
-                hasattr(current_user, '__class__') and 
-                current_user.__class__.__name__ == 'MockUser'):
-            await session_service.add_message(
-                db_session=db,
-                session_id=uuid.UUID(session_id),
-                role="assistant",
-                content=ai_response.content,
-                model_used=ai_response.model_used,
-                response_time=response_time_ms,
-                context_used=None  # No RAG context since system was removed
-            )
+            # Save AI response (skip in development mode for mock users)
+            response_time_ms = int((time.time() - start_time) * 1000)
+            if not (settings.environment == "development" and 
+                    hasattr(current_user, '__class__') and 
+                    current_user.__class__.__name__ == 'MockUser'):
+                await session_service.add_message(
+                    db_session=db,
+                    session_id=uuid.UUID(session_id),
+                    role="assistant",
+                    content=ai_response.content,
+                    model_used=ai_response.model_used,
+                    response_time=response_time_ms,
+                    context_used=None  # No RAG context since system was removed
+                )
         
         # Track token usage and deduct credits
-        usage_service = UsageService()
-        token_service = TokenCreditService(db)
-        usage_info = None
+        with span("chat.billing"):
+            usage_service = UsageService()
+            usage_info = None
         
-        if ai_response.usage:
-            try:
-                # Count tokens in user message and AI response
-                input_tokens = await token_service.count_tokens(chat_request.message, ai_response.model_used)
-                output_tokens = await token_service.count_tokens(ai_response.content, ai_response.model_used)
+            # Bill every provider response; mock/unavailable fallbacks are free
+            billable = ai_response.usage is not None or not ai_response.model_used.startswith(("mock-", "unavailable"))
+            if billable:
+                try:
+                    # Provider-reported usage when present, local tokenizer counts otherwise
+                    input_tokens, output_tokens, _ = tokenizer_service.resolve_usage(
+                        ai_response.usage,
+                        ai_response.model_used,
+                        [enhanced_prompt, chat_request.message],
+                        ai_response.content
+                    )
+                    admission_estimator.observe(
+                        chat_request.character_id, ai_response.model_used, output_tokens
+                    )
                 
-                # For non-mock users, record usage and deduct credits
-                if not (settings.environment == "development" and 
-                        hasattr(current_user, '__class__') and 
-                        current_user.__class__.__name__ == 'MockUser'):
+                    # For non-mock users, record usage and deduct credits
+                    if not (settings.environment == "development" and 
+                            hasattr(current_user, '__class__') and 
+                            current_user.__class__.__name__ == 'MockUser'):
                     
-                    # Record usage with TokenCreditService (handles credit deduction)
-                    usage_record = await token_service.record_usage(
-                        user_id=str(current_user.id),
-                        input_tokens=int(input_tokens),
-                        output_tokens=int(output_tokens),
-                        model=ai_response.model_used,
-                        request_type="chat",
-                        character_id=chat_request.character_id,
-                        session_id=session_id,
-                        user_message_length=len(chat_request.message),
-                        ai_response_length=len(ai_response.content)
-                    )
+                        # Record usage with TokenCreditService (handles credit deduction)
+                        usage_record = await token_service.record_usage(
+                            user_id=str(current_user.id),
+                            input_tokens=int(input_tokens),
+                            output_tokens=int(output_tokens),
+                            model=ai_response.model_used,
+                            request_type="chat",
+                            character_id=chat_request.character_id,
+                            session_id=session_id,
+                            user_message_length=len(chat_request.message),
+                            ai_response_length=len(ai_response.content)
+                        )
                     
-                    # Also track with legacy usage service for compatibility
-                    usage_info = await usage_service.track_usage(
-                        db_session=db,
-                        user_id=current_user.id,
-                        input_tokens=int(input_tokens),
-                        output_tokens=int(output_tokens),
-                        model_name=ai_response.model_used,
-                        request_type="chat",
-                        character_id=chat_request.character_id,
-                        session_id=uuid.UUID(session_id) if session_id else None
-                    )
+                        # Also track with legacy usage service for compatibility
+                        usage_info = await usage_service.track_usage(
+                            db_session=db,
+                            user_id=current_user.id,
+                            input_tokens=int(input_tokens),
+                            output_tokens=int(output_tokens),
+                            model_name=ai_response.model_used,
+                            request_type="chat",
+                            character_id=chat_request.character_id,
+                            session_id=uuid.UUID(session_id) if session_id else None
+                        )
                     
-                    # Add credit usage info to response
-                    usage_info = {
-                        "input_tokens": int(input_tokens),
-                        "output_tokens": int(output_tokens),
-                        "total_tokens": int(input_tokens + output_tokens),
-                        "credits_used": usage_record.credits_used,
-                        "model": ai_response.model_used
-                    }
+                        # Add credit usage info to response
+                        usage_info = {
+                            "input_tokens": int(input_tokens),
+                            "output_tokens": int(output_tokens),
+                            "total_tokens": int(input_tokens + output_tokens),
+                            "credits_used": usage_record.credits_used,
+                            "model": ai_response.model_used
+                        }
                     
-                else:
-                    # For mock users, just return token info without deducting credits
+                    else:
+                        # For mock users, just return token info without deducting credits
+                        usage_info = {
+                            "input_tokens": int(input_tokens),
+                            "output_tokens": int(output_tokens),
+                            "total_tokens": int(input_tokens + output_tokens),
+                            "credits_used": 0,
+                            "model": ai_response.model_used,
+                            "mock_mode": True
+                        }
+                    
+                except ValueError as credit_error:
+                    # Handle insufficient credits
+                    if "Insufficient credits" in str(credit_error):
+                        raise HTTPException(
+                            status_code=402,  # Payment Required
+                            detail=f"Insufficient credits for this request. {str(credit_error)}"
+                        )
+                    else:
+                        raise HTTPException(status_code=400, detail=str(credit_error))
+                except Exception as e:
+                    # Don't fail the request if usage tracking fails, but log the error
+                    print(f"Warning: Failed to track token usage: {e}")
+                    # Provide basic usage info without credit deduction
                     usage_info = {
-                        "input_tokens": int(input_tokens),
-                        "output_tokens": int(output_tokens),
-                        "total_tokens": int(input_tokens + output_tokens),
-                        "credits_used": 0,
-                        "model": ai_response.model_used,
-                        "mock_mode": True
+                        "error": "Usage tracking failed",
+                        "model": ai_response.model_used
                     }
-                    
-            except ValueError as credit_error:
-                # Handle insufficient credits
-                if "Insufficient credits" in str(credit_error):
-                    raise HTTPException(
-                        status_code=402,  # Payment Required
-                        detail=f"Insufficient credits for this request. {str(credit_error)}"
-                    )
-                else:
-                    raise HTTPException(status_code=400, detail=str(credit_error))
-            except Exception as e:
-                # Don't fail the request if usage tracking fails, but log the error
-                print(f"Warning: Failed to track token usage: {e}")
-                # Provide basic usage info without credit deduction
-                usage_info = {
-                    "error": "Usage tracking failed",
-                    "model": ai_response.model_used
-                }
         
-        else:
-            # No usage info from AI service
-            if not (settings.environment == "development" and 
-                    hasattr(current_user, '__class__') and 
-                    current_user.__class__.__name__ == 'MockUser'):
-                print(f"Warning: No token usage information from AI service")
+            else:
+                # Mock response, nothing to bill
+                if not (settings.environment == "development" and 
+                        hasattr(current_user, '__class__') and 
+                        current_user.__class__.__name__ == 'MockUser'):
+                    print("Warning: AI service fell back to a mock response")
         
         total_time = time.time() - start_time
         
@@ -340,77 +705,260 @@ async def send_message(
         
     except HTTPException:
         raise
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
-@router.get("/characters")
-async def get_available_characters(
-    db: AsyncSession = Depends(get_async_session)
-):
-    """Get list of available published characters for chat."""
+DEBATE_INSTRUCTIONS = """
+
+# TARTIŞMA MODU:
+- {others} ile şu konuyu tartışıyorsun: "{topic}"
+- Kendi görüşünü kendi bakış açınla savun; diğerlerine saygılı ama net ol
+- Yanıtını kısa tut (en fazla üç paragraf)"""
+
+
+def _is_mock_user(settings: Settings, user) -> bool:
+    return settings.environment == "development" and user.__class__.__name__ == 'MockUser'
+
+
+async def _run_debate(
+    debate_request: DebateRequest,
+    current_user: User,
+    ai_service: AIService,
+    db: AsyncSession,
+    settings: Settings,
+    publish
+) -> DebateResponse:
+    """Run one debate round: every character answers concurrently.
     
-    try:
-        # Get published characters from database
-        result = await db.execute(
-            select(Character).where(Character.is_published == True)
-            .order_by(Character.is_featured.desc(), Character.name)
+    Each turn is passed to ``publish("turn", ...)`` as it completes; the
+    round is persisted in one batched write and billed as one usage record.
+    """
+    character_ids = list(dict.fromkeys(debate_request.character_ids))
+    if not 2 <= len(character_ids) <= settings.debate_max_characters:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A debate needs between 2 and {settings.debate_max_characters} different characters"
         )
-        characters_db = result.scalars().all()
-        
-        # Format characters for frontend
-        characters = []
-        for char in characters_db:
-            # Set default stats since RAG system was removed
-            stats = {
-                "ready_for_chat": True,  # All published characters are ready
-                "total_sources": 0,
-                "total_chunks": 0
-            }
-            
-            # Build era string
-            era = ""
-            if char.birth_year and char.death_year:
-                era = f"{char.birth_year}-{char.death_year}"
-            elif char.birth_year:
-                era = f"Born {char.birth_year}"
-            
-            character_data = {
-                "id": char.id,
-                "name": char.name,
-                "title": char.title,
-                "description": char.description or char.title,
-                "era": era,
-                "nationality": char.nationality,
-                "category": char.category,
-                "personality_traits": char.personality_traits or [],
-                "speaking_style": char.speaking_style,
-                "avatar_url": f"/avatars/{char.id}.svg",
-                "is_featured": char.is_featured,
-                "ready_for_chat": stats.get("ready_for_chat", False),
-                "knowledge_sources": stats.get("total_sources", 0),
-                "processed_chunks": stats.get("total_chunks", 0)
-            }
-            characters.append(character_data)
-        
-        return {"characters": characters}
-        
-    except Exception as e:
-        # Fallback to static data if database fails
-        characters = [
+    if not debate_request.topic.strip() or len(debate_request.topic) > 2000:
+        raise HTTPException(status_code=400, detail="Topic must be between 1 and 2000 characters")
+    
+    characters = []
+    for character_id in character_ids:
+        character = character_registry.get(character_id)
+        if not character:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Character '{character_id}' not found or not published"
+            )
+        characters.append(character)
+    
+    mock_user = _is_mock_user(settings, current_user)
+    
+    # Admission for the whole round up front
+    estimates = [
+        admission_estimator.estimate(c.id, c.prompt_tokens, debate_request.topic)
+        for c in characters
+    ]
+    tokens_needed = sum(e.total_tokens for e in estimates)
+    quota_check = await check_user_quota(None, current_user, db, tokens_needed=tokens_needed)
+    token_service = TokenCreditService(db)
+    if not mock_user:
+        credits_needed = await token_service.calculate_credits_needed(
+            sum(e.input_tokens for e in estimates),
+            sum(e.output_tokens for e in estimates),
+            settings.default_ai_model
+        )
+        if (current_user.credits or 0) < credits_needed:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Insufficient credits for this debate. Need about {credits_needed}, have {current_user.credits or 0}"
+            )
+    
+    # Session and recent history (earlier rounds)
+    history = []
+    if debate_request.session_id:
+        session_uuid = uuid.UUID(debate_request.session_id)
+        session = await session_service.get_session(db, session_uuid, current_user.id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session_id = debate_request.session_id
+        for message in await session_service.get_recent_messages(db, session_uuid, limit=10):
+            speaker = (message.message_metadata or {}).get("character_name")
+            content = f"[{speaker}]: {message.content}" if speaker else message.content
+            history.append(AIChatMessage(role=message.role, content=content))
+    elif mock_user:
+        session_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"mock-debate-{current_user.id}-{'-'.join(character_ids)}"))
+    else:
+        session = await session_service.create_session(
+            db_session=db,
+            user_id=current_user.id,
+            character_id=character_ids[0],
+            title=f"Tartışma: {debate_request.topic[:200]}",
+            language=debate_request.language,
+            mode="debate"
+        )
+        session_id = str(session.id)
+    
+    start_time = time.time()
+    plan_type = quota_check.get("quota", {}).get("plan_type")
+    
+    async def take_turn(character):
+        others = ", ".join(c.name for c in characters if c.id != character.id)
+        turn_start = time.time()
+        ai_response = await ai_service.get_character_response(
+            character_id=character.id,
+            user_message=debate_request.topic,
+            chat_history=history,
+            language=debate_request.language,
+            system_prompt_override=character.system_prompt + DEBATE_INSTRUCTIONS.format(
+                others=others, topic=debate_request.topic
+            ),
+            plan_type=plan_type,
+            user_key=str(current_user.id)
+        )
+        turn = DebateTurn(
+            character_id=character.id,
+            character_name=character.name,
+            response=ai_response.content,
+            model_used=ai_response.model_used,
+            response_time=time.time() - turn_start
+        )
+        # Stream each answer as soon as it is ready
+        publish("turn", json.loads(turn.json()))
+        return turn, ai_response
+    
+    # Wall-clock time is the slowest character's, not the sum
+    results = await cancel_on_disconnect(
+        None,
+        asyncio.gather(*(take_turn(c) for c in characters), return_exceptions=True),
+        expected_tokens=sum(e.output_tokens for e in estimates)
+    )
+    
+    completed = []
+    failed_character_ids = []
+    for character, result in zip(characters, results):
+        if isinstance(result, BaseException):
+            logger.error("Debate turn failed", character_id=character.id, error=str(result))
+            publish("turn_error", {"character_id": character.id, "detail": str(result)})
+            failed_character_ids.append(character.id)
+        else:
+            completed.append((character, *result))
+    if not completed:
+        raise HTTPException(status_code=502, detail="No character could answer")
+    
+    # One batched write for the whole round
+    if not mock_user:
+        messages = [{"role": "user", "content": debate_request.topic}]
+        messages += [
             {
-                "id": "ataturk-001",
-                "name": "Mustafa Kemal Atatürk",
-                "description": "Türkiye Cumhuriyeti'nin kurucusu",
-                "era": "1881-1938",
-                "category": "leader",
-                "avatar_url": "/avatars/ataturk.jpg",
-                "ready_for_chat": True
+                "role": "assistant",
+                "content": ai_response.content,
+                "model_used": ai_response.model_used,
+                "response_time": int(turn.response_time * 1000),
+                "metadata": {"character_id": character.id, "character_name": character.name}
             }
+            for character, turn, ai_response in completed
         ]
-        return {"characters": characters}
+        await session_service.add_messages(db, uuid.UUID(session_id), messages)
+    
+    # One aggregated usage record for the round, priced per model;
+    # mock/unavailable fallbacks are free
+    input_tokens = output_tokens = 0
+    # Model -> [input tokens, output tokens]
+    models_used: dict = {}
+    for character, turn, ai_response in completed:
+        if ai_response.usage is None and ai_response.model_used.startswith(("mock-", "unavailable")):
+            continue
+        turn_input, turn_output, _ = tokenizer_service.resolve_usage(
+            ai_response.usage,
+            ai_response.model_used,
+            [character.system_prompt, debate_request.topic],
+            ai_response.content
+        )
+        admission_estimator.observe(character.id, ai_response.model_used, turn_output)
+        input_tokens += int(turn_input)
+        output_tokens += int(turn_output)
+        model_tokens = models_used.setdefault(ai_response.model_used, [0, 0])
+        model_tokens[0] += int(turn_input)
+        model_tokens[1] += int(turn_output)
+    
+    usage_info = None
+    if models_used:
+        model = next(iter(models_used)) if len(models_used) == 1 else "mixed"
+        usage_info = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "credits_used": 0,
+            "model": model
+        }
+        if mock_user:
+            usage_info["mock_mode"] = True
+        else:
+            try:
+                # Each model's tokens at its own rates, summed into one record
+                usage_service = UsageService()
+                credits = input_cost = output_cost = 0
+                for model_name, (model_input, model_output) in models_used.items():
+                    credits += await token_service.calculate_credits_needed(model_input, model_output, model_name)
+                    model_input_cost, model_output_cost = usage_service.calculate_cost(model_name, model_input, model_output)
+                    input_cost += model_input_cost
+                    output_cost += model_output_cost
+                usage_record = await token_service.record_usage(
+                    user_id=str(current_user.id),
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    model=model,
+                    request_type="debate",
+                    session_id=session_id,
+                    user_message_length=len(debate_request.topic),
+                    ai_response_length=sum(len(t.response) for _, t, _ in completed),
+                    credits=credits
+                )
+                await usage_service.track_usage(
+                    db_session=db,
+                    user_id=current_user.id,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    model_name=model,
+                    request_type="debate",
+                    session_id=uuid.UUID(session_id),
+                    cost=(input_cost, output_cost)
+                )
+                usage_info["credits_used"] = usage_record.credits_used
+            except ValueError as credit_error:
+                if "Insufficient credits" in str(credit_error):
+                    raise HTTPException(
+                        status_code=402,
+                        detail=f"Insufficient credits for this debate. {str(credit_error)}"
+                    )
+                raise HTTPException(status_code=400, detail=str(credit_error))
+            except Exception as e:
+                logger.error("Failed to track debate usage", session_id=session_id, error=str(e))
+                usage_info = {"error": "Usage tracking failed", "model": model}
+    
+    return DebateResponse(
+        session_id=session_id,
+        topic=debate_request.topic,
+        language=debate_request.language,
+        mode="debate",
+        turns=[turn for _, turn, _ in completed],
+        failed_character_ids=failed_character_ids,
+        timestamp=datetime.now(),
+        response_time=time.time() - start_time,
+        usage=usage_info
+    )
+
+
+@router.get("/characters")
+async def get_available_characters():
+    """Get list of available published characters for chat."""
+    return {"characters": character_registry.chat_listing()}
 
 
 @router.get("/sessions", response_model=List[ChatSession])
@@ -440,7 +988,7 @@ async def get_chat_sessions(
             session_data = {
                 "id": str(session_db.id),
                 "character_id": session_db.character_id,
-                "character_name": session_db.character.name if session_db.character else "Unknown",
+                "character_name": character_registry.name_for(session_db.character_id),
                 "title": session_db.title,
                 "message_count": session_db.message_count,
                 "last_message_at": session_db.updated_at,
@@ -54,11 +54,43 @@ class Settings(BaseSettings):
         env="BACKUP_AI_MODEL"
     )
     
+    # Additional OpenAI-compatible provider (comma-separated models it serves)
+    openai_compatible_name: str = Field(default="openai", env="OPENAI_COMPATIBLE_NAME")
+    openai_compatible_base_url: str = Field(default="", env="OPENAI_COMPATIBLE_BASE_URL")
+    openai_compatible_api_key: str = Field(default="", env="OPENAI_COMPATIBLE_API_KEY")
+    openai_compatible_models: str = Field(default="", env="OPENAI_COMPATIBLE_MODELS")
+    
+    # Local stand-in server for load/chaos tests (e.g. http://localhost:8787/api/v1)
+    local_llm_base_url: str = Field(default="", env="LOCAL_LLM_BASE_URL")
+    local_llm_models: str = Field(default="", env="LOCAL_LLM_MODELS")
+    
+    # Model routing: relative answer quality per model ("model=score,...";
+    # unlisted models score 2). Long lesson/advisor prompts favour higher scores
+    # (the reasoning backup by default), short casual messages favour the fast
+    # default model.
+    llm_model_quality: str = Field(
+        default=(
+            "google/gemini-2.0-flash-001=3,deepseek/deepseek-r1-0528:free=4,"
+            "nousresearch/hermes-3-llama-3.1-405b:free=3.5,openai/gpt-oss-120b:free=3.5,"
+            "google/gemma-4-31b-it:free=2.5"
+        ),
+        env="LLM_MODEL_QUALITY"
+    )
+    
     # Model parameters
     ai_max_tokens: int = Field(default=2048, env="AI_MAX_TOKENS")
     ai_temperature: float = Field(default=0.7, env="AI_TEMPERATURE")
     ai_top_p: float = Field(default=0.9, env="AI_TOP_P")
     
+    # Local BPE tokenizers: <directory>/<family>.json (Hugging Face tokenizer.json)
+    tokenizer_directory: str = Field(default="./tokenizers", env="TOKENIZER_DIRECTORY")
+    tokenizer_cache_size: int = Field(default=4096, env="TOKENIZER_CACHE_SIZE")
+    
+    # LLM dispatch: concurrent calls per model ("model=limit,..." overrides)
+    llm_model_concurrency: int = Field(default=8, env="LLM_MODEL_CONCURRENCY")
+    llm_model_concurrency_overrides: str = Field(default="", env="LLM_MODEL_CONCURRENCY_OVERRIDES")
+    llm_queue_max_wait: float = Field(default=20.0, env="LLM_QUEUE_MAX_WAIT")
+    
     # =============================================================================
     # EMBEDDING SETTINGS
     # =============================================================================
@@ -109,6 +141,56 @@ class Settings(BaseSettings):
     jwt_algorithm: str = Field(default="HS256", env="JWT_ALGORITHM")
     jwt_expire_minutes: int = Field(default=1440, env="JWT_EXPIRE_MINUTES")
     admin_api_key: str = Field(default="", env="ADMIN_API_KEY")
+    # bcrypt runs on a bounded thread pool so hashing never blocks the event loop
+    password_hash_workers: int = Field(default=4, env="PASSWORD_HASH_WORKERS")
+    
+    # =============================================================================
+    # REQUEST DEADLINES (seconds; clients may shorten with X-Request-Timeout)
+    # =============================================================================
+    request_deadline_default: float = Field(default=30.0, env="REQUEST_DEADLINE_DEFAULT")
+    chat_request_deadline: float = Field(default=60.0, env="CHAT_REQUEST_DEADLINE")
+    # How long a completed Idempotency-Key result is replayed; the "database"
+    # backend shares keys across workers, "local" is only safe with one worker
+    idempotency_ttl_seconds: float = Field(default=300.0, env="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_backend: str = Field(default="database", env="IDEMPOTENCY_BACKEND")
+    # One in-flight turn per chat session: overlapping turns are rejected (409)
+    # or queued; "advisory" backend enforces it across workers via Postgres
+    chat_turn_overlap_policy: str = Field(default="reject", env="CHAT_TURN_OVERLAP_POLICY")
+    chat_turn_lock_backend: str = Field(default="local", env="CHAT_TURN_LOCK_BACKEND")
+    chat_turn_queue_timeout: float = Field(default=30.0, env="CHAT_TURN_QUEUE_TIMEOUT")
+    # Asynchronous chat jobs (POST /chat/jobs): worker pool size per process,
+    # per-job time budget, and how long a running job may go silent before
+    # another worker takes it over (its worker died)
+    chat_job_workers: int = Field(default=4, env="CHAT_JOB_WORKERS")
+    chat_job_deadline: float = Field(default=300.0, env="CHAT_JOB_DEADLINE")
+    chat_job_stale_after: float = Field(default=900.0, env="CHAT_JOB_STALE_AFTER")
+    chat_job_max_attempts: int = Field(default=3, env="CHAT_JOB_MAX_ATTEMPTS")
+    chat_job_max_pending_per_user: int = Field(default=5, env="CHAT_JOB_MAX_PENDING_PER_USER")
+    chat_job_poll_interval: float = Field(default=5.0, env="CHAT_JOB_POLL_INTERVAL")
+    # Hosts webhook callbacks may be delivered to (comma-separated)
+    chat_job_webhook_hosts: str = Field(default="localhost,127.0.0.1", env="CHAT_JOB_WEBHOOK_HOSTS")
+    # Resumable SSE streams (POST /chat/stream): per-generation ring buffer
+    # size, how long a finished generation stays replayable, per-worker cap
+    stream_buffer_max_events: int = Field(default=4096, env="STREAM_BUFFER_MAX_EVENTS")
+    stream_buffer_grace_seconds: float = Field(default=120.0, env="STREAM_BUFFER_GRACE_SECONDS")
+    stream_buffer_memory_limit_mb: int = Field(default=64, env="STREAM_BUFFER_MEMORY_LIMIT_MB")
+    stream_heartbeat_seconds: float = Field(default=15.0, env="STREAM_HEARTBEAT_SECONDS")
+    # Characters allowed in one debate round (POST /chat/debate)
+    debate_max_characters: int = Field(default=4, env="DEBATE_MAX_CHARACTERS")
+    
+    # =============================================================================
+    # LOAD SHEDDING (adaptive concurrency limit on /api/v1/chat/*)
+    # =============================================================================
+    chat_load_shedding_enabled: bool = Field(default=True, env="CHAT_LOAD_SHEDDING_ENABLED")
+    chat_concurrency_initial: int = Field(default=20, env="CHAT_CONCURRENCY_INITIAL")
+    chat_concurrency_min: int = Field(default=4, env="CHAT_CONCURRENCY_MIN")
+    chat_concurrency_max: int = Field(default=200, env="CHAT_CONCURRENCY_MAX")
+    
+    # =============================================================================
+    # RESPONSE CACHE
+    # =============================================================================
+    response_cache_enabled: bool = Field(default=True, env="RESPONSE_CACHE_ENABLED")
+    response_cache_max_entries: int = Field(default=1024, env="RESPONSE_CACHE_MAX_ENTRIES")
     
     # =============================================================================
     # FILE UPLOAD SETTINGS
@@ -137,7 +219,28 @@ class Settings(BaseSettings):
     log_file_path: str = Field(default="./logs/histora.log", env="LOG_FILE_PATH")
     log_max_size_mb: int = Field(default=100, env="LOG_MAX_SIZE_MB")
     log_backup_count: int = Field(default=5, env="LOG_BACKUP_COUNT")
-    
+    # Opt-in capture of anonymized request shapes for replay (scripts/replay_traffic.py);
+    # sampling is per user so captured sessions stay whole
+    traffic_capture_enabled: bool = Field(default=False, env="TRAFFIC_CAPTURE_ENABLED")
+    traffic_capture_path: str = Field(default="./logs/traffic.jsonl", env="TRAFFIC_CAPTURE_PATH")
+    traffic_capture_sample_rate: float = Field(default=1.0, env="TRAFFIC_CAPTURE_SAMPLE_RATE")
+    # Prometheus scrape endpoint (GET /metrics); scrapers send the token as a
+    # bearer token. Outside development the endpoint is only served with a token.
+    metrics_enabled: bool = Field(default=True, env="METRICS_ENABLED")
+    metrics_token: Optional[str] = Field(default=None, env="METRICS_TOKEN")
+    # Metrics are per process: with several workers, each writes snapshots to
+    # this directory and /metrics merges them. Required for multi-worker setups.
+    metrics_multiprocess_dir: str = Field(default="", env="METRICS_MULTIPROCESS_DIR")
+    # Per-stage Server-Timing response header; OTLP/HTTP trace export to a
+    # collector (e.g. http://localhost:4318/v1/traces) when an endpoint is set
+    server_timing_enabled: bool = Field(default=True, env="SERVER_TIMING_ENABLED")
+    otel_exporter_otlp_traces_endpoint: Optional[str] = Field(default=None, env="OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+    tracing_sample_rate: float = Field(default=1.0, env="TRACING_SAMPLE_RATE")
+    # Slow-query log and per-request statement counts, written to system_logs
+    query_log_enabled: bool = Field(default=True, env="QUERY_LOG_ENABLED")
+    slow_query_ms: float = Field(default=250.0, env="SLOW_QUERY_MS")
+    query_count_threshold: int = Field(default=30, env="QUERY_COUNT_THRESHOLD")
+
     # Analytics
     google_analytics_id: Optional[str] = Field(default=None, env="GOOGLE_ANALYTICS_ID")
     sentry_dsn: Optional[str] = Field(default=None, env="SENTRY_DSN")
@@ -2,18 +2,48 @@
 Database connection and session management.
 """
 import asyncio
-from typing import AsyncGenerator
-from sqlalchemy import create_engine, text
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator
+from sqlalchemy import create_engine, text, event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 import structlog
 
 from app.core.config import get_settings
+from app.core.deadlines import remaining
+from app.core.metrics import metrics
 from app.models.database import Base
 
 logger = structlog.get_logger(__name__)
 
+db_pool_wait_seconds = metrics.histogram(
+    "histora_db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+db_pool_connections = metrics.gauge(
+    "histora_db_pool_connections",
+    "Async engine pool connections by state, sampled at scrape time",
+    ["state"],
+)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long each checkout waits.
+
+    The wait includes opening a new connection when the pool grows.
+    """
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - start_time)
+
+
 class DatabaseManager:
     """Database connection and session manager."""
     
@@ -67,6 +97,7 @@ class DatabaseManager:
             
             self._async_engine = create_async_engine(
                 database_url,
+                poolclass=TimedAsyncQueuePool,
                 pool_size=self.settings.db_pool_size,
                 max_overflow=self.settings.db_max_overflow,
                 pool_pre_ping=True,
@@ -147,6 +178,18 @@ class DatabaseManager:
             logger.error("Database connection test failed", error=str(e))
             return False
     
+    def record_pool_stats(self):
+        """Update the pool gauges from the async engine's queue pool."""
+        if self._async_engine is None:
+            return
+        pool = self._async_engine.pool
+        if not isinstance(pool, TimedAsyncQueuePool):
+            return
+        db_pool_connections.set(pool.size(), state="size")
+        db_pool_connections.set(pool.checkedout(), state="checked_out")
+        db_pool_connections.set(pool.checkedin(), state="idle")
+        db_pool_connections.set(max(pool.overflow(), 0), state="overflow")
+    
     async def close(self):
         """Close database connections."""
         if self._async_engine:
@@ -163,11 +206,29 @@ db_manager = DatabaseManager()
 # Export engine for external access
 engine = db_manager.get_async_engine()
 
+def _apply_statement_timeout(session, transaction, connection):
+    """Bound each transaction's statements by the request deadline."""
+    left = remaining()
+    if left is not None:
+        timeout_ms = max(1, int(left * 1000))
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """Async session bounded by the current deadline, for background work."""
+    session_factory = db_manager.get_async_session_factory()
+    async with session_factory() as session:
+        event.listen(session.sync_session, "after_begin", _apply_statement_timeout)
+        yield session
+
+
 # Dependency functions for FastAPI
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """Get async database session for FastAPI dependency injection."""
     session_factory = db_manager.get_async_session_factory()
     async with session_factory() as session:
+        event.listen(session.sync_session, "after_begin", _apply_statement_timeout)
         try:
             yield session
         except Exception as e:
@@ -0,0 +1,190 @@
+"""
+Request deadlines and client-disconnect cancellation.
+
+Every request gets a deadline: the client's ``X-Request-Timeout`` header
+(seconds) or the route's default, capped by the route default. It lives in a
+context variable so ``AIService`` can size upstream timeouts and database
+transactions can set ``statement_timeout`` from the time that is left.
+``cancel_on_disconnect`` runs a generation while watching for the client to
+go away, cancelling the upstream call so nothing is persisted or billed.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Optional, TypeVar
+from fastapi import HTTPException, Request, status
+import structlog
+
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+# Non-standard status logged for requests whose client went away (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+
+T = TypeVar("T")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# Per-call upstream timeout override (chat jobs allow calls as long as the job)
+_upstream_timeout: ContextVar[Optional[float]] = ContextVar("upstream_timeout", default=None)
+
+generations_cancelled = metrics.counter(
+    "histora_generations_cancelled_total",
+    "LLM generations abandoned before completion",
+    ["reason"],
+)
+generation_tokens_saved = metrics.counter(
+    "histora_generation_tokens_saved_total",
+    "Expected output tokens not generated because the generation was cancelled",
+    ["reason"],
+)
+
+
+class DeadlineExceeded(HTTPException):
+    """The request ran out of time."""
+
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=detail)
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready."""
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None if unbounded)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline():
+    """Raise ``DeadlineExceeded`` if the current request is out of time."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def bounded_timeout(timeout: float) -> float:
+    """``timeout`` shortened to the time left on the current deadline."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.0, min(timeout, left))
+
+
+def upstream_timeout(default: float) -> float:
+    """Timeout for one upstream call: ``default`` (or the scope's override), bounded by the deadline."""
+    override = _upstream_timeout.get()
+    return bounded_timeout(default if override is None else override)
+
+
+@contextmanager
+def deadline_scope(seconds: float, upstream_timeout: Optional[float] = None):
+    """Run the block under a fresh deadline, for work outside a request.
+    
+    ``upstream_timeout`` replaces the per-call upstream cap inside the block,
+    so e.g. a long lesson generation in a job is bounded only by the job.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    timeout_token = _upstream_timeout.set(upstream_timeout) if upstream_timeout is not None else None
+    try:
+        yield
+    finally:
+        if timeout_token is not None:
+            _upstream_timeout.reset(timeout_token)
+        _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that sets each request's deadline."""
+
+    def __init__(self, app, route_defaults: Dict[str, float], default: float):
+        self.app = app
+        # Longest prefix wins
+        self.route_defaults = sorted(route_defaults.items(), key=lambda item: -len(item[0]))
+        self.default = default
+
+    def _budget(self, scope) -> float:
+        budget = self.default
+        for prefix, seconds in self.route_defaults:
+            if scope["path"].startswith(prefix):
+                budget = seconds
+                break
+        for key, value in scope.get("headers") or []:
+            if key == DEADLINE_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0:
+                    budget = min(budget, requested)
+                break
+        return budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + self._budget(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+async def _wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(
+    request: Optional[Request],
+    generation: Awaitable[T],
+    expected_tokens: int = 0
+) -> T:
+    """Await ``generation`` unless the client disconnects or the deadline passes first.
+
+    On disconnect the generation task is cancelled (closing the upstream
+    HTTP request) and ``ClientDisconnected`` is raised so callers skip
+    persistence and billing. With ``request=None`` only the deadline applies.
+    """
+    task = asyncio.ensure_future(generation)
+    if request is not None:
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    else:
+        watcher = asyncio.get_running_loop().create_future()
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher},
+            timeout=remaining(),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if task in done:
+            try:
+                return task.result()
+            except DeadlineExceeded:
+                reason = "deadline"
+                raise
+        if watcher in done:
+            reason = "disconnect"
+            raise ClientDisconnected()
+        reason = "deadline"
+        raise DeadlineExceeded()
+    except (ClientDisconnected, DeadlineExceeded):
+        generations_cancelled.inc(reason=reason)
+        generation_tokens_saved.inc(expected_tokens, reason=reason)
+        logger.info("Generation cancelled", reason=reason, tokens_saved=expected_tokens)
+        raise
+    finally:
+        for pending in (task, watcher):
+            if not pending.done():
+                pending.cancel()
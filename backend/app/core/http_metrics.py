@@ -0,0 +1,76 @@
+"""
+HTTP request metrics.
+
+``RequestMetricsMiddleware`` times every HTTP request and records it under
+its route template (``/api/v1/chat/sessions/{session_id}``), never the raw
+path, so label cardinality stays bounded by the number of routes.
+"""
+import time
+from typing import Callable, Dict, List
+
+from app.core.metrics import metrics
+
+http_request_duration = metrics.histogram(
+    "histora_http_request_duration_seconds",
+    "HTTP request latency until the last response byte, by route and status",
+    ["method", "route", "status"],
+)
+http_requests_in_flight = metrics.gauge(
+    "histora_http_requests_in_flight",
+    "HTTP requests currently being processed",
+)
+
+
+# Endpoint -> routes serving it, filled on first use (routes are fixed after startup)
+_endpoint_routes: Dict[Callable, List] = {}
+
+
+def route_template(scope) -> str:
+    """Path template of the matched route (``/sessions/{session_id}``); unmatched paths are not kept."""
+    endpoint = scope.get("endpoint")
+    router = scope.get("router")
+    if endpoint is None or router is None:
+        return "<unmatched>"
+    routes = _endpoint_routes.get(endpoint)
+    if routes is None:
+        routes = _endpoint_routes[endpoint] = [
+            route for route in router.routes if getattr(route, "endpoint", None) is endpoint
+        ]
+    # One endpoint may serve several paths; take the one this request matched
+    for route in routes:
+        if len(routes) == 1 or route.path_regex.match(scope["path"]):
+            return route.path
+    return "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request latency per route and status."""
+
+    def __init__(self, app, exclude_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                time.perf_counter() - start_time,
+                method=scope["method"],
+                route=route_template(scope),
+                status=str(status["code"]),
+            )
@@ -0,0 +1,255 @@
+"""
+Idempotency-Key support for non-idempotent POST endpoints.
+
+A short-TTL store keyed by (user, Idempotency-Key). The first request runs
+and its result is kept; a concurrent duplicate awaits the same in-flight
+future and a later duplicate gets the stored result, so client retries never
+repeat upstream calls, DB writes or billing. Failed runs are forgotten so a
+retry can try again.
+
+With the ``database`` backend the key is also claimed in the
+``idempotency_keys`` table, so the rule holds across workers: a duplicate
+on another worker polls the row until the owner stores its result, then
+replays it. The ``local`` backend only sees duplicates that reach the same
+worker, so it is only safe with a single worker.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple, TypeVar
+from fastapi import HTTPException, status
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+import structlog
+
+from app.core.config import get_settings
+from app.core.database import async_session_scope
+from app.core.deadlines import bounded_timeout
+from app.core.metrics import metrics
+from app.models.database import IdempotencyKey
+
+logger = structlog.get_logger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+BACKEND_LOCAL = "local"
+BACKEND_DATABASE = "database"
+
+# How often a duplicate on another worker checks for the owner's result
+DATABASE_POLL_INTERVAL = 0.25
+
+T = TypeVar("T")
+
+idempotency_requests = metrics.counter(
+    "histora_idempotency_requests_total",
+    "Requests carrying an Idempotency-Key by outcome (new, attached, replayed, conflict)",
+    ["result"],
+)
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, to detect a key reused for another request."""
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = float("inf")  # set once the run completes
+
+
+class IdempotencyStore:
+    """In-flight and recently completed results by idempotency key."""
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 10000,
+        backend: str = BACKEND_LOCAL,
+        lease: float = 60.0
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        # How long a database claim holds without a result (its owner may have died)
+        self.lease = max(ttl, lease)
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            full = len(self._entries) > self.max_entries
+            if not (entry.future.done() and (full or entry.expires_at <= now)):
+                break
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _row_filter(key: Hashable):
+        user_id, idempotency_key = key
+        return and_(IdempotencyKey.user_id == uuid.UUID(str(user_id)), IdempotencyKey.key == idempotency_key)
+
+    @staticmethod
+    def _conflict() -> HTTPException:
+        idempotency_requests.inc(result="conflict")
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{IDEMPOTENCY_HEADER} was already used for a different request"
+        )
+
+    async def _claim(self, key: Hashable, fingerprint: str, decode: Callable[[Any], T]) -> Optional[Tuple[T, str]]:
+        """Claim the key in the database.
+
+        Returns None when this request now owns the key, or ``(result,
+        outcome)`` once the worker that owns it has stored its result.
+        """
+        user_id, idempotency_key = key
+        give_up_at = time.monotonic() + bounded_timeout(self.lease)
+        waited = False
+        while True:
+            now = datetime.now(timezone.utc)
+            async with async_session_scope() as db:
+                # Ended replay window, or a claim whose owner never finished
+                await db.execute(
+                    delete(IdempotencyKey).where(self._row_filter(key), IdempotencyKey.expires_at <= now)
+                )
+                claimed = await db.execute(
+                    insert(IdempotencyKey)
+                    .values(
+                        user_id=uuid.UUID(str(user_id)),
+                        key=idempotency_key,
+                        fingerprint=fingerprint,
+                        status="running",
+                        expires_at=now + timedelta(seconds=self.lease),
+                    )
+                    .on_conflict_do_nothing(index_elements=["user_id", "key"])
+                    .returning(IdempotencyKey.key)
+                )
+                owned = claimed.first() is not None
+                row = None
+                if not owned:
+                    row = (await db.execute(select(IdempotencyKey).where(self._row_filter(key)))).scalar_one_or_none()
+                await db.commit()
+
+            if owned:
+                return None
+            if row is not None:
+                if row.fingerprint != fingerprint:
+                    raise self._conflict()
+                if row.status == "succeeded":
+                    outcome = "attached" if waited else "replayed"
+                    idempotency_requests.inc(result=outcome)
+                    return decode(row.response), outcome
+                if time.monotonic() >= give_up_at:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+                    )
+                waited = True
+                await asyncio.sleep(DATABASE_POLL_INTERVAL)
+            # No row: the owner failed and released it, so claim again
+
+    async def _store(self, key: Hashable, response: Any):
+        try:
+            async with async_session_scope() as db:
+                await db.execute(
+                    update(IdempotencyKey)
+                    .where(self._row_filter(key))
+                    .values(
+                        status="succeeded",
+                        response=response,
+                        expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            # Duplicates on other workers wait out the lease, then run again
+            logger.error("Failed to store idempotent result", error=str(e))
+
+    async def _release(self, key: Hashable):
+        try:
+            async with async_session_scope() as db:
+                await db.execute(
+                    delete(IdempotencyKey).where(self._row_filter(key), IdempotencyKey.status == "running")
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error("Failed to release idempotency key", error=str(e))
+
+    async def run(
+        self,
+        key: Hashable,
+        fingerprint: str,
+        producer: Callable[[], Awaitable[T]],
+        encode: Optional[Callable[[T], Any]] = None,
+        decode: Optional[Callable[[Any], T]] = None,
+    ) -> Tuple[T, str]:
+        """Return ``(result, outcome)``; ``producer`` runs at most once per live key.
+
+        The producer runs as its own task, so it finishes (and its result is
+        kept for the retry) even if the request that started it goes away.
+        With the database backend ``key`` is ``(user_id, idempotency_key)``
+        and ``encode``/``decode`` convert the result to and from JSON.
+        """
+        self._evict()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise self._conflict()
+            outcome = "replayed" if entry.future.done() else "attached"
+            idempotency_requests.inc(result=outcome)
+            return await asyncio.shield(entry.future), outcome
+
+        if self.backend == BACKEND_DATABASE:
+            replayed = await self._claim(key, fingerprint, decode)
+            if replayed is not None:
+                return replayed
+
+            async def produce_and_store():
+                try:
+                    result = await producer()
+                except BaseException:
+                    await self._release(key)
+                    raise
+                await self._store(key, encode(result))
+                return result
+
+            task = asyncio.ensure_future(produce_and_store())
+        else:
+            task = asyncio.ensure_future(producer())
+        idempotency_requests.inc(result="new")
+        entry = self._entries[key] = _Entry(fingerprint, task)
+
+        def _completed(done: asyncio.Future):
+            if done.cancelled() or done.exception() is not None:
+                # Let a retry run again
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.expires_at = time.monotonic() + self.ttl
+
+        task.add_done_callback(_completed)
+        return await asyncio.shield(task), "new"
+
+
+_settings = get_settings()
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore(
+    ttl=_settings.idempotency_ttl_seconds,
+    backend=_settings.idempotency_backend,
+    lease=_settings.chat_request_deadline,
+)
@@ -0,0 +1,194 @@
+"""
+Adaptive concurrency limiting for latency-bound endpoints.
+
+The limit follows a gradient rule: a long-term latency baseline is compared
+with recent latency, and when requests get slower than the baseline allows
+(upstream LLM or database pressure) the limit shrinks; when latency is
+healthy it grows by a small queue allowance. Requests over the limit are
+shed immediately with 503 and ``Retry-After`` instead of piling up in memory
+and on the connection pool until everything times out. A request holds its
+slot until its response starts, so streamed responses count only their
+admission and time to first byte.
+"""
+import json
+import math
+import time
+from typing import Iterable
+import structlog
+
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+concurrency_limit = metrics.gauge(
+    "histora_concurrency_limit",
+    "Current adaptive concurrency limit",
+    ["scope"],
+)
+concurrency_in_flight = metrics.gauge(
+    "histora_concurrency_in_flight",
+    "Requests currently admitted by the adaptive limiter",
+    ["scope"],
+)
+requests_admitted = metrics.counter(
+    "histora_requests_admitted_total",
+    "Requests admitted by the adaptive limiter",
+    ["scope"],
+)
+requests_shed = metrics.counter(
+    "histora_requests_shed_total",
+    "Requests rejected with 503 by the adaptive limiter",
+    ["scope"],
+)
+
+
+class _ExpAvg:
+    """Exponential moving average that is a plain mean until warmed up."""
+
+    def __init__(self, window: int, warmup: int):
+        self.alpha = 2.0 / (window + 1)
+        self.warmup = warmup
+        self.count = 0
+        self.value = 0.0
+
+    def add(self, sample: float) -> float:
+        self.count += 1
+        if self.count <= self.warmup:
+            self.value += (sample - self.value) / self.count
+        else:
+            self.value += self.alpha * (sample - self.value)
+        return self.value
+
+
+class GradientLimiter:
+    """Concurrency limit driven by the ratio of baseline to recent latency."""
+
+    def __init__(
+        self,
+        scope: str,
+        initial_limit: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 200,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        long_window: int = 600,
+    ):
+        self.scope = scope
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self._long_latency = _ExpAvg(long_window, warmup=10)
+        self._short_latency = _ExpAvg(10, warmup=1)
+        concurrency_limit.set(self.limit, scope=scope)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            requests_shed.inc(scope=self.scope)
+            return False
+        self.in_flight += 1
+        requests_admitted.inc(scope=self.scope)
+        concurrency_in_flight.set(self.in_flight, scope=self.scope)
+        return True
+
+    def release(self, latency: float, dropped: bool = False):
+        """Record a finished request; ``dropped`` marks overload failures (5xx)."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        concurrency_in_flight.set(self.in_flight, scope=self.scope)
+
+        if dropped:
+            new_limit = self.limit * 0.9
+        else:
+            short = self._short_latency.add(latency)
+            long = self._long_latency.add(latency)
+            # Let the baseline drift down quickly after a slow period
+            if long / short > 2:
+                self._long_latency.value = short * 2
+                long = short * 2
+            # Don't grow a limit the traffic isn't using
+            if in_flight < self.limit / 2:
+                return
+            gradient = max(0.5, min(1.0, self.tolerance * long / short))
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+            new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+        concurrency_limit.set(self.limit, scope=self.scope)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: roughly one recent request duration."""
+        return max(1, min(30, math.ceil(self._short_latency.value or 1)))
+
+
+class AdaptiveConcurrencyMiddleware:
+    """ASGI middleware applying a ``GradientLimiter`` to a set of routes.
+
+    Only the listed paths with one of ``methods`` share the limiter; cheap
+    reads and polls on neighbouring routes would otherwise dilute the
+    latency gradient and take slots from the expensive requests.
+    """
+
+    def __init__(
+        self,
+        app,
+        paths: Iterable[str],
+        limiter: GradientLimiter,
+        methods: Iterable[str] = ("POST",),
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.methods = frozenset(methods)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        if not limiter.try_acquire():
+            await self._shed(send, limiter.retry_after())
+            return
+
+        start = time.perf_counter()
+        released = False
+
+        def release(dropped: bool):
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(time.perf_counter() - start, dropped=dropped)
+
+        async def send_wrapper(message):
+            # The slot covers the work before the response starts; streamed
+            # bodies (SSE chat, resumes) would otherwise hold it for minutes
+            # and feed stream lifetimes into the latency gradient
+            if message["type"] == "http.response.start":
+                release(dropped=message["status"] >= 500)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release(dropped=True)
+
+    @staticmethod
+    async def _shed(send, retry_after: int):
+        body = json.dumps({"detail": "Server is busy, please retry shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(retry_after).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
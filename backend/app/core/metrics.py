@@ -0,0 +1,337 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and histograms are plain dict updates keyed by label
+values, so recording on a hot path costs well under a microsecond and
+needs no external client library. ``render_prometheus`` exposes the
+registry in the Prometheus text format for ``GET /metrics``.
+
+The registry is per process. With several workers, ``SharedMetricsDir``
+has each worker write snapshots to a shared directory and merges them at
+scrape time, so a scrape does not depend on which worker answered.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed histogram with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            state[index] += 1
+            state[-1] += value
+
+    def count(self, **labels: str) -> float:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0.0
+
+    def total(self, **labels: str) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0.0
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], List[float]]]:
+        with self._lock:
+            return [(key, list(state)) for key, state in self._values.items()]
+
+
+class MetricsRegistry:
+    """Registry of named metrics; re-registering a name returns the existing metric."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def all(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """All metrics and their samples as JSON-serializable data."""
+        snapshot = {}
+        for metric in self.all():
+            entry = {
+                "kind": metric.kind,
+                "documentation": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "samples": [[list(key), value] for key, value in metric.samples()],
+            }
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            snapshot[metric.name] = entry
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in sorted(self.all(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                bounds = [_format_value(b) for b in metric.buckets] + ["+Inf"]
+                for key, state in metric.samples():
+                    labels = _labels(metric.labelnames, key)
+                    # Stored per bucket; exposed cumulatively
+                    cumulative = 0.0
+                    for bound, count in zip(bounds, state[:-1]):
+                        cumulative += count
+                        bucket_labels = _labels(metric.labelnames + ("le",), key + (bound,))
+                        lines.append(f"{metric.name}_bucket{bucket_labels} {_format_value(cumulative)}")
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(state[-1])}")
+                    lines.append(f"{metric.name}_count{labels} {_format_value(cumulative)}")
+            else:
+                for key, value in metric.samples():
+                    lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class SharedMetricsDir:
+    """Per-worker snapshots in a shared directory, merged at scrape time.
+
+    Each worker writes its registry to ``<path>/<pid>.json`` every
+    ``interval`` seconds and whenever it serves a scrape. Counters and
+    histograms are summed over all files, including workers that have
+    exited, so totals never go backwards. Gauges get a ``worker`` label and
+    are dropped once that worker's file is stale. The directory should be
+    emptied on deploy (e.g. a tmpfs or the container's /tmp).
+    """
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def _own_file(self) -> str:
+        return os.path.join(self.path, f"{os.getpid()}.json")
+
+    def write(self):
+        """Write this worker's snapshot (atomically, so readers never see half a file)."""
+        os.makedirs(self.path, exist_ok=True)
+        data = json.dumps({"written_at": time.time(), "metrics": self.registry.snapshot()})
+        temporary = f"{self._own_file}.tmp"
+        with open(temporary, "w") as f:
+            f.write(data)
+        os.replace(temporary, self._own_file)
+
+    def _read_all(self) -> List[Tuple[str, Dict[str, Any]]]:
+        snapshots = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    snapshots.append((name[:-len(".json")], json.load(f)))
+            except (OSError, ValueError):
+                # Removed or replaced while listing
+                continue
+        return snapshots
+
+    def merged(self) -> MetricsRegistry:
+        """A registry holding every worker's metrics combined."""
+        merged = MetricsRegistry()
+        stale_before = time.time() - 3 * self.interval
+        for worker, snapshot in self._read_all():
+            live = snapshot.get("written_at", 0) >= stale_before
+            for name, entry in snapshot.get("metrics", {}).items():
+                labelnames = tuple(entry["labelnames"])
+                if entry["kind"] == "counter":
+                    metric = merged.counter(name, entry["documentation"], labelnames)
+                    for key, value in entry["samples"]:
+                        metric.inc(value, **dict(zip(labelnames, key)))
+                elif entry["kind"] == "histogram":
+                    metric = merged.histogram(name, entry["documentation"], labelnames, entry["buckets"])
+                    if list(metric.buckets) != entry["buckets"]:
+                        continue
+                    for key, state in entry["samples"]:
+                        total = metric._values.setdefault(tuple(key), [0.0] * len(state))
+                        for i, value in enumerate(state):
+                            total[i] += value
+                elif live:
+                    metric = merged.gauge(name, entry["documentation"], labelnames + ("worker",))
+                    for key, value in entry["samples"]:
+                        metric.set(value, worker=worker, **dict(zip(labelnames, key)))
+        return merged
+
+    def render_prometheus(self) -> str:
+        self.write()
+        return self.merged().render_prometheus()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self.write()
+        self._task = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Final totals stay in the directory for the other workers to sum
+        self.write()
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning("Metrics snapshot write failed", path=self.path, error=str(e))
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,78 @@
+"""
+Cross-worker invalidation over Postgres LISTEN/NOTIFY.
+
+Each worker holds one dedicated connection that LISTENs on every subscribed
+channel. Writers call ``publish`` inside their transaction, so the
+notification is delivered only once the write commits.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+NotificationHandler = Callable[[str], Awaitable[None]]
+
+
+class NotificationHub:
+    """Routes Postgres notifications to in-process async handlers."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[NotificationHandler]] = {}
+        self._conn = None
+
+    def subscribe(self, channel: str, handler: NotificationHandler):
+        """Register a handler; call before ``start``."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None
+
+    async def start(self, engine):
+        """Open the LISTEN connection for all subscribed channels."""
+        if self._conn is not None or not self._handlers:
+            return
+
+        try:
+            conn = await engine.connect()
+            raw = await conn.get_raw_connection()
+            driver_conn = raw.driver_connection
+            loop = asyncio.get_running_loop()
+
+            def _dispatch(_conn, _pid, channel, payload):
+                for handler in self._handlers.get(channel, []):
+                    loop.create_task(self._run(handler, channel, payload))
+
+            for channel in self._handlers:
+                await driver_conn.add_listener(channel, _dispatch)
+
+            self._conn = conn
+            logger.info("Listening for notifications", channels=list(self._handlers))
+        except Exception as e:
+            logger.warning("LISTEN/NOTIFY unavailable; invalidation is local only", error=str(e))
+
+    async def _run(self, handler: NotificationHandler, channel: str, payload: str):
+        try:
+            await handler(payload)
+        except Exception as e:
+            logger.error("Notification handler failed", channel=channel, payload=payload, error=str(e))
+
+    async def stop(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    async def publish(db: AsyncSession, channel: str, payload: str):
+        """Queue a NOTIFY in the current transaction; delivered on commit."""
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": channel, "payload": payload}
+        )
+
+
+# Global notification hub instance
+notification_hub = NotificationHub()
@@ -0,0 +1,277 @@
+"""
+Slow-query log and per-request statement counts.
+
+Engine cursor hooks time every statement. ``QueryCountMiddleware`` counts
+the statements each request issues. Two things are written to
+``system_logs``:
+
+- ``db.slow_query``: a statement slower than ``SLOW_QUERY_MS``.
+- ``db.query_count``: a request that issued more than
+  ``QUERY_COUNT_THRESHOLD`` statements (the N+1 signature). Its metadata
+  lists the statements it repeated most.
+
+Statements are normalized (literals and ``IN`` lists collapsed) so that
+occurrences of the same query group together. Each record carries the
+route template and the request's trace id.
+
+Records are buffered and inserted in batches by a background task; the
+writer's own statements are not timed. If the writer falls behind,
+records are dropped rather than slowing requests down.
+"""
+import asyncio
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+import structlog
+from sqlalchemy import event, insert
+
+from app.core.config import get_settings
+from app.core.database import async_session_scope, engine
+from app.core.http_metrics import route_template
+from app.core.metrics import metrics
+from app.core.tracing import current_trace_id
+from app.models.database import SystemLog
+
+logger = structlog.get_logger(__name__)
+
+FLUSH_INTERVAL = 5.0
+MAX_PENDING = 5000
+MAX_SQL_LENGTH = 2000
+# Repeated statements listed on a query-heavy request
+MAX_REPEATED = 5
+
+COMPONENT_SLOW_QUERY = "db.slow_query"
+COMPONENT_QUERY_COUNT = "db.query_count"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*(?:\$\d+(?:::\w+)?|\?)(?:\s*,\s*(?:\$\d+(?:::\w+)?|\?))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+statement_seconds = metrics.histogram(
+    "histora_db_statement_seconds",
+    "Database statement execution time by operation",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+statements_per_request = metrics.histogram(
+    "histora_db_statements_per_request",
+    "Database statements issued by HTTP requests that used the database",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+flagged_queries = metrics.counter(
+    "histora_db_flagged_total",
+    "Slow statements and query-heavy requests flagged for the query log",
+    ["kind"],
+)
+query_log_records = metrics.counter(
+    "histora_db_query_log_records_total",
+    "Query log records written to system_logs, or dropped",
+    ["result"],
+)
+
+# Set while the writer inserts, so its own statements are not logged
+_suppressed: ContextVar[bool] = ContextVar("query_log_suppressed", default=False)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """Statement with literals replaced by ``?`` and parameter lists collapsed."""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PARAM_LIST.sub("(...)", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return sql[:MAX_SQL_LENGTH]
+
+
+def _operation(sql: str) -> str:
+    verb = sql.split(" ", 1)[0].upper()
+    return verb.lower() if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "other"
+
+
+class RequestQueries:
+    """Statements issued by one request, by normalized SQL."""
+
+    __slots__ = ("scope", "count", "seconds", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        # Normalized SQL -> [executions, total seconds]
+        self.statements: Dict[str, List[float]] = {}
+
+    def add(self, sql: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        entry = self.statements.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def repeated(self) -> List[Dict]:
+        top = sorted(self.statements.items(), key=lambda item: -item[1][0])[:MAX_REPEATED]
+        return [
+            {"sql": sql, "count": int(count), "total_ms": round(seconds * 1000, 1)}
+            for sql, (count, seconds) in top
+            if count > 1
+        ]
+
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+class QueryLog:
+    """Flags slow statements and query-heavy requests and writes them in batches."""
+
+    def __init__(self, slow_query_ms: float, query_count_threshold: int):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.query_count_threshold = query_count_threshold
+        self._pending: List[Dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def install(self, target_engine):
+        """Attach the timing hooks to an (async) engine."""
+        sync_engine = getattr(target_engine, "sync_engine", target_engine)
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_time = getattr(context, "_query_start", None)
+        if start_time is None or _suppressed.get():
+            return
+        elapsed = time.perf_counter() - start_time
+        sql = normalize_sql(statement)
+        statement_seconds.observe(elapsed, operation=_operation(sql))
+
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.add(sql, elapsed)
+        if elapsed >= self.slow_query_seconds:
+            flagged_queries.inc(kind="slow_query")
+            self._record(
+                COMPONENT_SLOW_QUERY,
+                sql,
+                queries,
+                duration_ms=round(elapsed * 1000, 1),
+                executemany=executemany,
+            )
+
+    def request_finished(self, queries: RequestQueries):
+        if queries.count:
+            statements_per_request.observe(queries.count)
+        if queries.count <= self.query_count_threshold:
+            return
+        flagged_queries.inc(kind="query_count")
+        self._record(
+            COMPONENT_QUERY_COUNT,
+            f"{queries.scope['method']} {route_template(queries.scope)}",
+            queries,
+            statements=queries.count,
+            total_ms=round(queries.seconds * 1000, 1),
+            distinct_statements=len(queries.statements),
+            repeated=queries.repeated(),
+        )
+
+    def _record(self, component: str, message: str, queries: Optional[RequestQueries], **details):
+        if self._task is None:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            query_log_records.inc(result="dropped")
+            return
+        if queries is not None:
+            details["route"] = f"{queries.scope['method']} {route_template(queries.scope)}"
+        details["request_id"] = current_trace_id()
+        self._pending.append({
+            "level": "WARNING",
+            "component": component,
+            "message": message,
+            "log_metadata": details,
+        })
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(
+            "Query log started",
+            slow_query_ms=self.slow_query_seconds * 1000,
+            query_count_threshold=self.query_count_threshold,
+        )
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self._flush()
+        except Exception as e:
+            logger.warning("Final query log write failed", error=str(e))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error("Query log write failed", error=str(e))
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        token = _suppressed.set(True)
+        try:
+            async with async_session_scope() as db:
+                await db.execute(insert(SystemLog), rows)
+                await db.commit()
+        except Exception:
+            query_log_records.inc(len(rows), result="dropped")
+            raise
+        finally:
+            _suppressed.reset(token)
+        query_log_records.inc(len(rows), result="written")
+
+
+class QueryCountMiddleware:
+    """ASGI middleware counting the database statements of each request."""
+
+    def __init__(self, app, query_log: "QueryLog"):
+        self.app = app
+        self.query_log = query_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(scope)
+        token = _request_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            self.query_log.request_finished(queries)
+
+
+_settings = get_settings()
+
+# Global query log instance
+query_log = QueryLog(_settings.slow_query_ms, _settings.query_count_threshold)
+if _settings.query_log_enabled:
+    query_log.install(engine)
@@ -0,0 +1,270 @@
+"""
+Tag-invalidated response cache for read-mostly public endpoints.
+
+Pure ASGI middleware: successful GET responses for configured routes are
+stored as pre-serialized bytes keyed by (route, query, language) and served
+with a strong ETag and Cache-Control; ``If-None-Match`` gets a 304. Each
+route carries tags, and admin mutations purge by tag when they commit (on
+this worker from an ``after_commit`` hook, elsewhere through LISTEN/NOTIFY).
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.notifications import notification_hub
+
+logger = structlog.get_logger(__name__)
+
+CACHE_CHANNEL = "histora_response_cache"
+
+# Cache tags
+TAG_CATALOGUE = "catalogue"
+TAG_CHAT_CHARACTERS = "chat_characters"
+TAG_PRICING_PLANS = "pricing_plans"
+TAG_CREDIT_PACKAGES = "credit_packages"
+
+cache_lookups = metrics.counter(
+    "histora_response_cache_lookups_total",
+    "Response cache lookups by route and outcome (hit, miss, not_modified)",
+    ["route", "result"],
+)
+
+
+class CacheRule:
+    """Caching policy for one route."""
+
+    def __init__(self, tags: Iterable[str], max_age: int = 60, ttl: int = 3600):
+        self.tags = tuple(tags)
+        self.max_age = max_age
+        self.ttl = ttl
+        self.cache_control = f"public, max-age={max_age}".encode("latin-1")
+
+
+class _Entry:
+    __slots__ = ("status", "headers", "body", "etag", "tags", "expires_at")
+
+    def __init__(self, status, headers, body, etag, tags, expires_at):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.tags = tags
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """In-process LRU store of serialized responses with a tag index."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._tag_index: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self._generations: Dict[str, int] = {}
+
+    def generation(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def get(self, key) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: _Entry, generation: Tuple[int, ...]):
+        # A purge that ran while this response was being built wins
+        if generation != self.generation(entry.tags):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tag_index.get(tag)
+            if keys:
+                keys.discard(key)
+
+    def purge_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tag_index.pop(tag, ())):
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+        if removed:
+            logger.info("Response cache purged", tags=list(tags), entries=removed)
+        return removed
+
+    def clear(self):
+        self.purge_tags(list(self._tag_index))
+        self._entries.clear()
+
+
+# Global response cache instance
+response_cache = ResponseCache(max_entries=get_settings().response_cache_max_entries)
+
+
+async def purge_cache_tags(db: AsyncSession, *tags: str):
+    """Purge tags on every worker once the current transaction commits.
+
+    Call before ``db.commit()``: this worker purges from an ``after_commit``
+    hook and other workers get the NOTIFY, both only once the write is visible.
+    """
+    await notification_hub.publish(db, CACHE_CHANNEL, ",".join(tags))
+
+    def _purge_local(_session):
+        response_cache.purge_tags(tags)
+
+    event.listen(db.sync_session, "after_commit", _purge_local, once=True)
+
+
+async def _on_cache_notification(payload: str):
+    response_cache.purge_tags([tag for tag in payload.split(",") if tag])
+
+
+notification_hub.subscribe(CACHE_CHANNEL, _on_cache_notification)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
+
+
+def _etag_matches(if_none_match: Optional[bytes], etag: bytes) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(b",")]
+    return b"*" in candidates or etag in candidates or b"W/" + etag in candidates
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving configured GET routes from ``response_cache``."""
+
+    def __init__(self, app, rules: Dict[str, CacheRule], cache: ResponseCache = response_cache):
+        self.app = app
+        self.rules = rules
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        rule = self.rules.get(path)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers") or []
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"))))
+        accept_language = _header(request_headers, b"accept-language") or b""
+        language = accept_language.split(b",")[0].split(b";")[0].strip().decode("latin-1").lower()
+        key = (path.rstrip("/"), query, language)
+        if_none_match = _header(request_headers, b"if-none-match")
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            if _etag_matches(if_none_match, entry.etag):
+                cache_lookups.inc(route=path, result="not_modified")
+                await self._send_not_modified(send, entry.etag, rule)
+            else:
+                cache_lookups.inc(route=path, result="hit")
+                await self._send_entry(send, entry, scope["method"] == "HEAD")
+            return
+
+        cache_lookups.inc(route=path, result="miss")
+        generation = self.cache.generation(rule.tags)
+        captured = {"status": None, "headers": None}
+        body_parts: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+                return
+            if message["type"] == "http.response.body":
+                body_parts.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                await self._finish(
+                    send, key, rule, generation, captured, b"".join(body_parts),
+                    if_none_match, scope["method"] == "HEAD"
+                )
+                return
+            await send(message)
+
+        await self.app(scope, receive, capture)
+
+    async def _finish(self, send, key, rule, generation, captured, body, if_none_match, head_only):
+        status = captured["status"]
+        headers = [
+            (k, v) for k, v in captured["headers"]
+            if k not in (b"content-length", b"etag", b"cache-control")
+        ]
+
+        if status != 200:
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = b'"' + hashlib.sha256(body).hexdigest()[:32].encode("latin-1") + b'"'
+        entry = _Entry(
+            status=status,
+            headers=headers + [(b"cache-control", rule.cache_control), (b"vary", b"Accept-Language")],
+            body=body,
+            etag=etag,
+            tags=rule.tags,
+            expires_at=time.monotonic() + rule.ttl,
+        )
+        self.cache.put(key, entry, generation)
+
+        if _etag_matches(if_none_match, etag):
+            await self._send_not_modified(send, etag, rule)
+        else:
+            await self._send_entry(send, entry, head_only)
+
+    @staticmethod
+    async def _send_entry(send, entry: _Entry, head_only: bool):
+        headers = entry.headers + [
+            (b"etag", entry.etag),
+            (b"content-length", str(len(entry.body)).encode("latin-1")),
+        ]
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head_only else entry.body})
+
+    @staticmethod
+    async def _send_not_modified(send, etag: bytes, rule: CacheRule):
+        await send({
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [
+                (b"etag", etag),
+                (b"cache-control", rule.cache_control),
+                (b"vary", b"Accept-Language"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
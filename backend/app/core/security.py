@@ -1,13 +1,20 @@
 """
 Security dependencies and middleware.
 """
+import time
+import uuid
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 
 from app.core.database import get_async_session
-from app.services.auth_service import auth_service, TokenData
+from app.core.metrics import metrics
+from app.core.tracing import traced
+from app.services.auth_service import (
+    auth_service, TokenData, TOKEN_KIND_LOCAL, TOKEN_KIND_FIREBASE
+)
 from app.models.database import User
 import structlog
 
@@ -16,45 +23,97 @@ logger = structlog.get_logger(__name__)
 # Bearer token scheme
 security = HTTPBearer(auto_error=False)
 
-async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: AsyncSession = Depends(get_async_session)
-) -> User:
-    """Get current authenticated user."""
-    if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+auth_verifications = metrics.counter(
+    "histora_auth_verifications_total",
+    "Bearer credential verifications by verifier path and outcome",
+    ["path", "result"],
+)
+auth_verify_seconds = metrics.histogram(
+    "histora_auth_verify_seconds",
+    "Time spent verifying a bearer credential, by verifier path",
+    ["path"],
+)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def _user_from_firebase_token(token: str, db: AsyncSession) -> User:
+    """Verify a Firebase ID token and load the matching user by email."""
+    from app.services.firebase_service import firebase_service
+    
+    firebase_user = await firebase_service.verify_firebase_token(token)
+    if not firebase_user:
+        raise _unauthorized("Invalid Firebase token")
+    
+    user_email = firebase_user.get("email")
+    if not user_email:
+        raise _unauthorized("Firebase token missing email")
+    
+    result = await db.execute(select(User).where(User.email == user_email))
+    user = result.scalar_one_or_none()
+    if not user:
+        logger.warning(f"User not found in database: {user_email}")
+        raise _unauthorized("User not found in database")
+    
+    return user
+
+async def _user_from_local_token(token: str, db: AsyncSession) -> User:
+    """Verify one of our own HS256 JWTs and load the user by id."""
+    token_data = auth_service.verify_token(token)
     
     try:
-        # Verify token
-        token_data = auth_service.verify_token(credentials.credentials)
-        
-        # Get user from database
-        user = await auth_service.get_user_by_id(token_data.user_id, db)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-            )
+        user_uuid = uuid.UUID(str(token_data.user_id))
+    except ValueError:
+        raise _unauthorized("Invalid user ID format")
+    
+    user = await auth_service.get_user_by_id(user_uuid, db)
+    if not user:
+        raise _unauthorized("User not found")
+    
+    return user
+
+@traced("auth")
+async def authenticate_token(token: str, db: AsyncSession) -> User:
+    """Route a bearer credential straight to its verifier and return the active user."""
+    path = auth_service.classify_token(token)
+    start_time = time.perf_counter()
+    
+    try:
+        if path == TOKEN_KIND_LOCAL:
+            user = await _user_from_local_token(token, db)
+        elif path == TOKEN_KIND_FIREBASE:
+            user = await _user_from_firebase_token(token, db)
+        else:
+            raise _unauthorized("Unrecognized authentication token")
         
         if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User account is inactive",
-            )
-        
-        return user
+            raise _unauthorized("User account is inactive")
     except HTTPException:
+        auth_verifications.inc(path=path, result="rejected")
         raise
     except Exception as e:
+        auth_verifications.inc(path=path, result="error")
         logger.error(f"Authentication error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        )
+        raise _unauthorized("Could not validate credentials")
+    finally:
+        auth_verify_seconds.observe(time.perf_counter() - start_time, path=path)
+    
+    auth_verifications.inc(path=path, result="ok")
+    return user
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_async_session)
+) -> User:
+    """Get current authenticated user."""
+    if not credentials:
+        raise _unauthorized("Authentication required")
+    
+    return await authenticate_token(credentials.credentials, db)
 
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user)
@@ -86,14 +145,13 @@ async def verify_admin_access(
             "role": "admin"
         }
     
-    # Method 2: JWT Token authentication
+    # Method 2: Bearer token authentication (JWT or Firebase)
     if credentials:
         try:
-            token_data = auth_service.verify_token(credentials.credentials)
-            user = await auth_service.get_user_by_id(token_data.user_id, db)
+            user = await authenticate_token(credentials.credentials, db)
             
-            if user and await auth_service.check_admin_permissions(user):
-                logger.info(f"Admin access granted via JWT token: {user.email}")
+            if await auth_service.check_admin_permissions(user):
+                logger.info(f"Admin access granted via bearer token: {user.email}")
                 return {
                     "method": "jwt",
                     "admin": True,
@@ -120,15 +178,9 @@ async def get_optional_user(
         return None
     
     try:
-        token_data = auth_service.verify_token(credentials.credentials)
-        user = await auth_service.get_user_by_id(token_data.user_id, db)
-        
-        if user and user.is_active:
-            return user
+        return await authenticate_token(credentials.credentials, db)
     except HTTPException:
-        pass
-    
-    return None
+        return None
 
 def require_roles(allowed_roles: list):
     """Decorator to require specific roles."""
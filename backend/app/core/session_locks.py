@@ -0,0 +1,166 @@
+"""
+Per-session turn serialization for chat.
+
+Only one turn (generation plus its message writes) may run per chat session
+at a time. The in-process backend is an ``asyncio.Lock`` per session id; the
+``advisory`` backend additionally takes a Postgres advisory lock so the rule
+holds across workers. Overlapping turns are rejected with 409 or queued
+behind the running one, depending on the configured policy.
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import text
+import structlog
+
+from app.core.config import get_settings
+from app.core.deadlines import bounded_timeout
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+POLICY_REJECT = "reject"
+POLICY_QUEUE = "queue"
+
+BACKEND_LOCAL = "local"
+BACKEND_ADVISORY = "advisory"
+
+# How often a queued turn retries the advisory lock
+ADVISORY_POLL_INTERVAL = 0.1
+
+overlapping_turns = metrics.counter(
+    "histora_chat_overlapping_turns_total",
+    "Chat turns that overlapped a running turn on the same session "
+    "(each would have been a wasted generation), by outcome",
+    ["result"],
+)
+
+
+class _SessionLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class SessionTurnLock:
+    """One in-flight turn per chat session."""
+
+    def __init__(self, policy: str = POLICY_REJECT, backend: str = BACKEND_LOCAL, queue_timeout: float = 30.0):
+        self.policy = policy
+        self.backend = backend
+        self.queue_timeout = queue_timeout
+        self._locks: Dict[str, _SessionLock] = {}
+
+    @staticmethod
+    def _busy(detail: str) -> HTTPException:
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+    @staticmethod
+    def _advisory_key(session_id: str) -> int:
+        try:
+            raw = uuid.UUID(session_id).bytes
+        except ValueError:
+            raw = session_id.encode().ljust(8, b"\0")
+        return int.from_bytes(raw[:8], "big", signed=True)
+
+    async def _acquire_local(self, entry: _SessionLock, policy: str) -> None:
+        if not entry.lock.locked():
+            await entry.lock.acquire()
+            return
+        if policy == POLICY_REJECT:
+            overlapping_turns.inc(result="rejected")
+            raise self._busy("A reply is already being generated for this session")
+        overlapping_turns.inc(result="queued")
+        try:
+            await asyncio.wait_for(entry.lock.acquire(), bounded_timeout(self.queue_timeout))
+        except asyncio.TimeoutError:
+            overlapping_turns.inc(result="timed_out")
+            raise self._busy("Timed out waiting for the previous reply in this session")
+
+    async def _acquire_advisory(self, session_id: str, policy: str):
+        """Take the cross-worker advisory lock on a dedicated connection."""
+        from app.core.database import db_manager
+
+        key = self._advisory_key(session_id)
+        conn = await db_manager.get_async_engine().connect()
+        try:
+            loop = asyncio.get_running_loop()
+            give_up_at = loop.time() + bounded_timeout(self.queue_timeout)
+            queued = False
+            while True:
+                result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+                if result.scalar():
+                    return conn
+                if policy == POLICY_REJECT:
+                    overlapping_turns.inc(result="rejected")
+                    raise self._busy("A reply is already being generated for this session")
+                if not queued:
+                    overlapping_turns.inc(result="queued")
+                    queued = True
+                if loop.time() >= give_up_at:
+                    overlapping_turns.inc(result="timed_out")
+                    raise self._busy("Timed out waiting for the previous reply in this session")
+                await asyncio.sleep(ADVISORY_POLL_INTERVAL)
+        except BaseException:
+            await conn.close()
+            raise
+
+    @staticmethod
+    async def _release_advisory(conn, session_id: str):
+        unlocked = False
+        try:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": SessionTurnLock._advisory_key(session_id)}
+            )
+            unlocked = True
+        except Exception as e:
+            logger.error("Failed to release session advisory lock", session_id=session_id, error=str(e))
+        finally:
+            if unlocked:
+                await conn.close()
+            else:
+                # Still holding a session-level lock: discard the connection so
+                # the server ends its session (and the lock) instead of pooling it
+                await conn.invalidate()
+
+    @asynccontextmanager
+    async def turn(self, session_id: str, policy: Optional[str] = None):
+        """Hold the session's turn for the duration of the block.
+        
+        ``policy`` overrides the configured overlap policy for this turn.
+        """
+        policy = policy or self.policy
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _SessionLock()
+        entry.users += 1
+        conn = None
+        try:
+            await self._acquire_local(entry, policy)
+            try:
+                if self.backend == BACKEND_ADVISORY:
+                    conn = await self._acquire_advisory(session_id, policy)
+                yield
+            finally:
+                if conn is not None:
+                    await self._release_advisory(conn, session_id)
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._locks.pop(session_id, None)
+
+
+_settings = get_settings()
+
+# Global session turn lock instance
+session_turn_lock = SessionTurnLock(
+    policy=_settings.chat_turn_overlap_policy,
+    backend=_settings.chat_turn_lock_backend,
+    queue_timeout=_settings.chat_turn_queue_timeout,
+)
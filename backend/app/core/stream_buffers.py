@@ -0,0 +1,209 @@
+"""
+Replay buffers for resumable Server-Sent Event streams.
+
+Each streamed generation writes its events into a ring buffer keyed by
+generation id. The generation runs independently of the connection that
+started it, so a client that drops mid-answer reconnects with
+``Last-Event-ID`` and gets the missed events replayed before the stream
+continues live, instead of resending (and paying for) the whole turn.
+Buffers are dropped a grace period after the generation completes, and the
+worker's total buffered bytes are capped: completed buffers are evicted
+first, and new streams are refused while the cap is still exceeded.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Optional, Tuple
+from fastapi import HTTPException, status
+import structlog
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+LAST_EVENT_ID_HEADER = "Last-Event-ID"
+GENERATION_ID_HEADER = "X-Generation-Id"
+
+buffered_bytes = metrics.gauge(
+    "histora_stream_buffer_bytes",
+    "Bytes held in SSE replay buffers on this worker",
+)
+stream_buffers_evicted = metrics.counter(
+    "histora_stream_buffers_evicted_total",
+    "SSE replay buffers dropped, by reason (expired, memory, discarded)",
+    ["reason"],
+)
+stream_resumes = metrics.counter(
+    "histora_stream_resumes_total",
+    "Reconnects to a buffered generation by result (resumed, gone, not_found)",
+    ["result"],
+)
+
+
+class BufferOverrun(Exception):
+    """The requested events have already left the ring buffer."""
+    pass
+
+
+class GenerationBuffer:
+    """Ring buffer of one generation's encoded SSE events."""
+
+    def __init__(self, generation_id: str, owner: str, max_events: int, registry: "StreamBufferRegistry"):
+        self.generation_id = generation_id
+        self.owner = owner
+        self.last_seq = 0
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self.size = 0
+        self._events: Deque[Tuple[int, bytes]] = deque()
+        self._max_events = max_events
+        self._registry = registry
+        self._signal = asyncio.Event()
+
+    def _notify(self):
+        self._signal.set()
+        self._signal = asyncio.Event()
+
+    def publish(self, event: str, data) -> int:
+        """Append an event; returns its sequence number."""
+        if self.closed:
+            raise RuntimeError(f"Generation {self.generation_id} is already complete")
+        self.last_seq += 1
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        encoded = (
+            f"id: {self.generation_id}:{self.last_seq}\n"
+            f"event: {event}\n"
+            f"data: {payload}\n\n"
+        ).encode()
+        self._events.append((self.last_seq, encoded))
+        delta = len(encoded)
+        if len(self._events) > self._max_events:
+            delta -= len(self._events.popleft()[1])
+        self.size += delta
+        self._registry._resize(delta)
+        self._notify()
+        return self.last_seq
+
+    def close(self, event: str, data):
+        """Publish the final event and start the expiry grace period."""
+        self.publish(event, data)
+        self.closed = True
+        self.closed_at = time.monotonic()
+        self._registry._completed(self)
+
+    async def wait_started(self):
+        """Wait for the generation's first event."""
+        while not self.last_seq:
+            await self._signal.wait()
+
+    def check_resumable(self, after: int):
+        """Raise ``BufferOverrun`` if events after ``after`` are no longer all held."""
+        if self._events and after + 1 < self._events[0][0]:
+            raise BufferOverrun()
+
+    async def events(self, after: int = 0, heartbeat: float = 15.0) -> AsyncIterator[bytes]:
+        """Events with sequence > ``after``, then live ones until the generation ends.
+
+        Emits SSE comments while idle so proxies keep the connection open.
+        """
+        seq = after
+        while True:
+            signal = self._signal
+            self.check_resumable(seq)
+            for event_seq, encoded in list(self._events):
+                if event_seq > seq:
+                    seq = event_seq
+                    yield encoded
+            if self.closed and seq >= self.last_seq:
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+
+
+class StreamBufferRegistry:
+    """Per-worker generation buffers with a grace period and a memory cap."""
+
+    def __init__(self, max_events: int = 4096, grace_seconds: float = 120.0, memory_limit: int = 64 * 1024 * 1024):
+        self.max_events = max_events
+        self.grace_seconds = grace_seconds
+        self.memory_limit = memory_limit
+        self.total_bytes = 0
+        self._buffers: "OrderedDict[str, GenerationBuffer]" = OrderedDict()
+        # Completed generations in completion order (eviction candidates)
+        self._completed_ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def _resize(self, delta: int):
+        self.total_bytes += delta
+        buffered_bytes.set(self.total_bytes)
+
+    def _completed(self, buffer: GenerationBuffer):
+        self._completed_ids[buffer.generation_id] = None
+        asyncio.get_running_loop().call_later(
+            self.grace_seconds, self._expire, buffer.generation_id, buffer
+        )
+
+    def _expire(self, generation_id: str, buffer: GenerationBuffer):
+        if self._buffers.get(generation_id) is buffer:
+            self._drop(generation_id, "expired")
+
+    def _drop(self, generation_id: str, reason: str):
+        buffer = self._buffers.pop(generation_id, None)
+        self._completed_ids.pop(generation_id, None)
+        if buffer is not None:
+            self._resize(-buffer.size)
+            stream_buffers_evicted.inc(reason=reason)
+
+    def _make_room(self):
+        while self.total_bytes >= self.memory_limit and self._completed_ids:
+            self._drop(next(iter(self._completed_ids)), "memory")
+
+    def create(self, generation_id: str, owner: str) -> GenerationBuffer:
+        """Register a new generation; 503 while the worker's buffers are full."""
+        self._make_room()
+        if self.total_bytes >= self.memory_limit:
+            logger.warning("Stream buffers full", total_bytes=self.total_bytes, active=len(self._buffers))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many streaming replies in progress, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+        buffer = GenerationBuffer(generation_id, owner, self.max_events, self)
+        self._buffers[generation_id] = buffer
+        return buffer
+
+    def discard(self, generation_id: str):
+        """Drop a generation nobody will read (e.g. it was rejected up front)."""
+        self._drop(generation_id, "discarded")
+
+    def get(self, generation_id: str, owner: str) -> Optional[GenerationBuffer]:
+        buffer = self._buffers.get(generation_id)
+        if buffer is None or buffer.owner != owner:
+            return None
+        return buffer
+
+
+def parse_last_event_id(value: Optional[str], generation_id: str) -> int:
+    """Sequence number from a ``Last-Event-ID`` (``<generation>:<seq>`` or ``<seq>``)."""
+    if not value:
+        return 0
+    prefix, _, seq = value.strip().rpartition(":")
+    if prefix and prefix != generation_id:
+        raise HTTPException(status_code=400, detail=f"{LAST_EVENT_ID_HEADER} belongs to another generation")
+    try:
+        return max(0, int(seq))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {LAST_EVENT_ID_HEADER}")
+
+
+_settings = get_settings()
+
+# Global stream buffer registry instance
+stream_buffers = StreamBufferRegistry(
+    max_events=_settings.stream_buffer_max_events,
+    grace_seconds=_settings.stream_buffer_grace_seconds,
+    memory_limit=_settings.stream_buffer_memory_limit_mb * 1024 * 1024,
+)
@@ -0,0 +1,28 @@
+"""
+Text normalization helpers.
+"""
+import unicodedata
+
+# Turkish letters (and circumflexed vowels) folded to their ASCII base.
+# Applied before lower(): str.lower() turns "İ" into "i" + combining dot.
+_TURKISH_FOLD = str.maketrans({
+    "ı": "i", "İ": "i", "I": "i",
+    "ş": "s", "Ş": "s",
+    "ğ": "g", "Ğ": "g",
+    "ü": "u", "Ü": "u",
+    "ö": "o", "Ö": "o",
+    "ç": "c", "Ç": "c",
+    "â": "a", "Â": "a",
+    "î": "i", "Î": "i",
+    "û": "u", "Û": "u",
+})
+
+
+def fold_turkish(value: str) -> str:
+    """Lowercase ASCII-folded form for matching ("Atatürk" == "ataturk")."""
+    folded = value.translate(_TURKISH_FOLD).lower()
+    if folded.isascii():
+        return folded
+    # Other accented Latin letters (é, ñ, ...): drop combining marks
+    decomposed = unicodedata.normalize("NFKD", folded)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
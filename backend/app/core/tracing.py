@@ -0,0 +1,332 @@
+"""
+Lightweight request tracing.
+
+``TracingMiddleware`` opens a root span per HTTP request; ``span`` and
+``traced`` open child spans around the stages of a request (auth, quota,
+session, LLM, persistence, billing). Spans live in context variables, so
+they follow the request into tasks it starts.
+
+Every response gets ``X-Process-Time`` and a ``Server-Timing`` header with
+the duration of each top-level stage, which browsers show in their network
+panel. Sampled traces are exported in batches to an OTLP/HTTP collector
+(JSON encoding) when ``OTEL_EXPORTER_OTLP_TRACES_ENDPOINT`` is set. An
+incoming W3C ``traceparent`` header joins the caller's trace.
+"""
+import asyncio
+import functools
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import httpx
+import structlog
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import get_settings
+from app.core.http_metrics import route_template
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+FLUSH_INTERVAL = 2.0
+MAX_PENDING = 20000
+MAX_BATCH = 2000
+EXPORT_TIMEOUT = 5.0
+# Server-Timing entries per response (stages beyond this are dropped)
+MAX_SERVER_TIMING_ENTRIES = 20
+
+TRACEPARENT_HEADER = b"traceparent"
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+exported_spans = metrics.counter(
+    "histora_trace_spans_exported_total",
+    "Spans sent to the OTLP collector, or dropped before sending",
+    ["result"],
+)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = (
+        "name", "trace", "span_id", "parent_id", "kind",
+        "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(self, name: str, trace: "Trace", parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL):
+        self.name = name
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end (or to now while running)."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        self.trace.finished(self)
+
+
+class Trace:
+    """Spans of one request: collects stage timings and queues sampled spans."""
+
+    __slots__ = ("trace_id", "sampled", "root", "stages")
+
+    def __init__(self, trace_id: Optional[str] = None, sampled: bool = True):
+        self.trace_id = trace_id or "%032x" % random.getrandbits(128)
+        self.sampled = sampled
+        self.root: Optional[Span] = None
+        # Stage name -> [total seconds, calls] for direct children of the root
+        self.stages: Dict[str, List[float]] = {}
+
+    def finished(self, span: Span):
+        if self.root is not None and span.parent_id == self.root.span_id:
+            stage = self.stages.setdefault(span.name, [0.0, 0])
+            stage[0] += span.duration
+            stage[1] += 1
+        if self.sampled:
+            span_exporter.export(span)
+
+    def server_timing(self, total: float) -> str:
+        """``Server-Timing`` header value for the stages finished so far."""
+        entries = [
+            f"{name};dur={seconds * 1000:.1f}" + (f';desc="x{calls}"' if calls > 1 else "")
+            for name, (seconds, calls) in list(self.stages.items())[:MAX_SERVER_TIMING_ENTRIES]
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the current request (None outside a request)."""
+    trace = _trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span; a no-op outside a request."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, trace, parent.span_id if parent else None)
+    if attributes:
+        current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited in another context (e.g. an abandoned async generator)
+            pass
+        current.finish()
+
+
+def traced(name: str):
+    """Decorator running an async function inside ``span(name)``."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    if span.error:
+        encoded["status"] = {"code": STATUS_ERROR, "message": span.error}
+    return encoded
+
+
+class SpanExporter:
+    """Buffers finished spans and posts them to an OTLP/HTTP collector."""
+
+    def __init__(self, endpoint: Optional[str], service_name: str):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._pending: List[Span] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def export(self, span: Span):
+        if self._task is None:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            exported_spans.inc(result="dropped")
+            return
+        self._pending.append(span)
+
+    async def start(self):
+        if self._task is not None or not self.endpoint:
+            return
+        self._client = httpx.AsyncClient(timeout=EXPORT_TIMEOUT)
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info("Trace export started", endpoint=self.endpoint)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self._flush()
+        except Exception as e:
+            logger.warning("Final trace export failed", error=str(e))
+        await self._client.aclose()
+        self._client = None
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.warning("Trace export failed", error=str(e))
+
+    async def _flush(self):
+        while self._pending:
+            batch, self._pending = self._pending[:MAX_BATCH], self._pending[MAX_BATCH:]
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [
+                        {"key": "service.name", "value": {"stringValue": self.service_name}},
+                    ]},
+                    "scopeSpans": [{
+                        "scope": {"name": "histora.tracing"},
+                        "spans": [_otlp_span(s) for s in batch],
+                    }],
+                }]
+            }
+            try:
+                response = await self._client.post(self.endpoint, json=payload)
+                response.raise_for_status()
+            except Exception:
+                exported_spans.inc(len(batch), result="failed")
+                raise
+            exported_spans.inc(len(batch), result="exported")
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span per request and timing headers.
+
+    Adds ``X-Process-Time`` (seconds until the response starts) and, with
+    ``server_timing``, a ``Server-Timing`` breakdown of the stages finished
+    by then. For streamed responses that is the work before the first byte.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0, server_timing: bool = True):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+
+    def _new_trace(self, scope):
+        """A trace for the request and the caller's span id from ``traceparent``."""
+        for key, value in scope.get("headers") or []:
+            if key == TRACEPARENT_HEADER:
+                match = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+                if match and match.group(1) != "0" * 32:
+                    sampled = span_exporter.running and bool(int(match.group(3), 16) & 1)
+                    return Trace(match.group(1), sampled=sampled), match.group(2)
+                break
+        sampled = span_exporter.running and random.random() < self.sample_rate
+        return Trace(sampled=sampled), None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, parent_id = self._new_trace(scope)
+        root = Span(scope["method"], trace, parent_id, kind=SPAN_KIND_SERVER)
+        trace.root = root
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start_time
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(elapsed))
+                if self.server_timing:
+                    headers.append("Server-Timing", trace.server_timing(elapsed))
+                root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        trace_token = _trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(span_token)
+            _trace.reset(trace_token)
+            route = route_template(scope)
+            root.name = f"{scope['method']} {route}"
+            root.attributes["http.method"] = scope["method"]
+            root.attributes["http.route"] = route
+            root.finish()
+
+
+_settings = get_settings()
+
+# Global span exporter instance
+span_exporter = SpanExporter(_settings.otel_exporter_otlp_traces_endpoint, _settings.app_name)
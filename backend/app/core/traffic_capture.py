@@ -0,0 +1,264 @@
+"""
+Anonymized traffic capture for deterministic replay.
+
+When enabled, every API request's *shape* is appended to a JSON Lines file:
+route template, status, timings, body sizes, and for chat routes the
+character, message length and history depth (demo chats) or session hash
+(session turns). The user, session and client
+are keyed by HMACs under a key derived from the server secret, so hashes
+agree across workers but cannot be reversed without that secret. No
+message text, tokens, ids or query strings are stored.
+``scripts/replay_traffic.py`` re-drives a capture against a staging
+instance.
+
+Records are buffered in memory and written by a background task once a
+second; if the writer falls behind, records are dropped rather than slowing
+requests down. A session's turns may land on different workers, so no
+worker knows a session's depth; the replay derives it from the merged
+capture by counting earlier turns with the same session hash.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Dict, List, Optional
+import structlog
+
+from app.core.config import get_settings
+from app.core.http_metrics import route_template
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+CAPTURE_VERSION = 1
+FLUSH_INTERVAL = 1.0
+MAX_PENDING = 10000
+# Request/response bodies larger than this are counted but not inspected
+MAX_PEEK_BYTES = 64 * 1024
+
+CHAT_PREFIX = "/api/v1/chat/"
+
+captured_requests = metrics.counter(
+    "histora_traffic_capture_requests_total",
+    "Requests recorded (written) or dropped by the traffic capture",
+    ["result"],
+)
+
+
+def _token_subject(authorization: bytes) -> Optional[str]:
+    """User id claim of a bearer JWT, read without verification (only hashed)."""
+    token = authorization.decode("latin-1").partition(" ")[2].strip()
+    parts = token.split(".")
+    if len(parts) != 3:
+        return token or None
+    try:
+        padded = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(padded))
+        return str(claims.get("user_id") or claims.get("sub") or token)
+    except (ValueError, AttributeError):
+        return token
+
+
+class TrafficRecorder:
+    """Buffers capture records and appends them to the capture file."""
+
+    def __init__(self, path: str, secret: str, sample_rate: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._salt = hmac.new(secret.encode(), b"traffic-capture", hashlib.sha256).digest()
+        self._pending: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def hash(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def sampled(self, user_hash: str) -> bool:
+        return self.sample_rate >= 1 or int(user_hash[:8], 16) / 0xFFFFFFFF < self.sample_rate
+
+    def record(self, entry: Dict):
+        if len(self._pending) >= MAX_PENDING:
+            captured_requests.inc(result="dropped")
+            return
+        self._pending.append(json.dumps(entry, separators=(",", ":"), ensure_ascii=False))
+
+    async def start(self):
+        if self._task is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.record({"v": CAPTURE_VERSION, "pid": os.getpid(), "started": round(time.time(), 3)})
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info("Traffic capture started", path=self.path, sample_rate=self.sample_rate)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error("Traffic capture write failed", error=str(e))
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        await asyncio.to_thread(self._write, "".join(line + "\n" for line in lines))
+        # One header line per process start is not a request
+        captured_requests.inc(sum(1 for line in lines if not line.startswith('{"v":')), result="written")
+
+    def _write(self, data: str):
+        # One O_APPEND write(2) per batch, so batches from several workers
+        # never interleave mid-line (a buffered file object may split them)
+        payload = data.encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            written = os.write(fd, payload)
+            while written < len(payload):
+                # Short writes only happen on full disks or signals; finish the batch
+                written += os.write(fd, payload[written:])
+        finally:
+            os.close(fd)
+
+
+def _json(body: bytearray) -> Optional[dict]:
+    if not body or len(body) > MAX_PEEK_BYTES:
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware recording anonymized request shapes."""
+
+    def __init__(self, app, recorder: TrafficRecorder, path_prefix: str = "/api/"):
+        self.app = app
+        self.recorder = recorder
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.recorder.running
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization")
+        subject = _token_subject(authorization) if authorization else None
+        client = scope.get("client")
+        user_hash = self.recorder.hash(subject or "ip:" + (client[0] if client else ""))
+        if not self.recorder.sampled(user_hash):
+            await self.app(scope, receive, send)
+            return
+
+        inspect = scope["path"].startswith(CHAT_PREFIX)
+        request_body = bytearray()
+        response_body = bytearray()
+        state = {"request_bytes": 0, "response_bytes": 0, "status": 0, "first_byte": None}
+        start_time = time.perf_counter()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                state["request_bytes"] += len(chunk)
+                if inspect and len(request_body) <= MAX_PEEK_BYTES:
+                    request_body.extend(chunk)
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if state["first_byte"] is None and chunk:
+                    state["first_byte"] = time.perf_counter() - start_time
+                state["response_bytes"] += len(chunk)
+                if inspect and len(response_body) <= MAX_PEEK_BYTES:
+                    response_body.extend(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            try:
+                self._record(scope, user_hash, authorization is not None, state, elapsed, request_body, response_body)
+            except Exception as e:
+                logger.warning("Traffic capture record failed", error=str(e))
+
+    def _record(self, scope, user_hash, authenticated, state, elapsed, request_body, response_body):
+        entry = {
+            "ts": round(time.time() - elapsed, 3),
+            "m": scope["method"],
+            "r": route_template(scope),
+            "s": state["status"],
+            "ms": round(elapsed * 1000, 1),
+            "qb": state["request_bytes"],
+            "rb": state["response_bytes"],
+            "u": user_hash,
+            "a": int(authenticated),
+        }
+        if state["first_byte"] is not None:
+            entry["fb"] = round(state["first_byte"] * 1000, 1)
+
+        body = _json(request_body)
+        if body is not None:
+            if body.get("character_id"):
+                entry["c"] = str(body["character_id"])[:50]
+            if isinstance(body.get("character_ids"), list):
+                entry["c"] = ",".join(str(c)[:50] for c in body["character_ids"])
+            text = body.get("message") or body.get("topic")
+            if isinstance(text, str):
+                entry["ml"] = len(text)
+            if isinstance(body.get("mode"), str):
+                entry["md"] = body["mode"][:20]
+            if isinstance(body.get("language"), str):
+                entry["lang"] = body["language"][:10]
+            if isinstance(body.get("history"), list):
+                entry["h"] = len(body["history"])
+            elif "character_id" in body or "character_ids" in body:
+                session_id = body.get("session_id")
+                if not session_id:
+                    # New session: its id is only in the response
+                    session_id = (_json(response_body) or {}).get("session_id")
+                if session_id and state["status"] < 400:
+                    # Depth is derived at replay time from earlier turns with this hash
+                    entry["sh"] = self.recorder.hash(str(session_id))
+                else:
+                    entry["h"] = 0
+        self.recorder.record(entry)
+
+
+_settings = get_settings()
+
+# Global traffic recorder instance
+traffic_recorder = TrafficRecorder(
+    _settings.traffic_capture_path,
+    _settings.jwt_secret_key,
+    _settings.traffic_capture_sample_rate,
+)
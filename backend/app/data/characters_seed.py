@@ -9,6 +9,8 @@ portraits); the frontend hides the photo gracefully if a URL ever 404s.
 
 from urllib.parse import quote
 
+from app.core.text import fold_turkish
+
 
 def _wiki(filename: str, width: int = 400) -> str:
     return f"https://commons.wikimedia.org/wiki/Special:FilePath/{quote(filename)}?width={width}"
@@ -505,6 +507,8 @@ KONUŞMA TARZIN: Mütevazı bir usta edası; büyük sözü değil sağlam temel
 
 
 CHARACTER_MAP = {c["id"]: c for c in CHARACTERS}
+# Same map keyed by the Turkish-folded id, for ids typed as "atatürk-001"
+_FOLDED_CHARACTER_MAP = {fold_turkish(c["id"]): c for c in CHARACTERS}
 
 
 def get_categories_with_counts():
@@ -518,8 +522,8 @@ def get_categories_with_counts():
 
 
 def get_character(character_id: str):
-    """Lookup with light normalization (Turkish chars, case)."""
-    if character_id in CHARACTER_MAP:
-        return CHARACTER_MAP[character_id]
-    normalized = character_id.lower().replace("ü", "u").replace("ç", "c").replace("ş", "s").replace("ı", "i").replace("ö", "o").replace("ğ", "g")
-    return CHARACTER_MAP.get(normalized)
+    """Lookup by id, falling back to the Turkish-folded id."""
+    character = CHARACTER_MAP.get(character_id)
+    if character is not None:
+        return character
+    return _FOLDED_CHARACTER_MAP.get(fold_turkish(character_id))
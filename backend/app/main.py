@@ -3,18 +3,45 @@ FastAPI main application for Histora backend.
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
-import time
+import secrets
 
 from app.core.config import get_settings
+from app.core.response_cache import (
+    ResponseCacheMiddleware, CacheRule,
+    TAG_CATALOGUE, TAG_CHAT_CHARACTERS, TAG_PRICING_PLANS, TAG_CREDIT_PACKAGES
+)
+from app.core.deadlines import DeadlineMiddleware
+from app.core.load_shedding import AdaptiveConcurrencyMiddleware, GradientLimiter
+from app.core.http_metrics import RequestMetricsMiddleware
+from app.core.metrics import metrics, SharedMetricsDir
+from app.core.query_log import QueryCountMiddleware, query_log
+from app.core.traffic_capture import TrafficCaptureMiddleware, traffic_recorder
+from app.core.tracing import TracingMiddleware, span_exporter
 from app.api.v1.router import api_router
 
 
 settings = get_settings()
 
+# Cross-worker metrics (None: this process's registry is served as is)
+shared_metrics = SharedMetricsDir(metrics, settings.metrics_multiprocess_dir) if settings.metrics_multiprocess_dir else None
+
+
+def _response_cache_rules():
+    """Cacheable routes and the tags that purge them."""
+    catalogue = CacheRule([TAG_CATALOGUE], max_age=300)
+    return {
+        "/api/v1/characters": catalogue,
+        "/api/v1/characters/": catalogue,
+        "/api/v1/characters/categories": catalogue,
+        "/api/v1/chat/characters": CacheRule([TAG_CHAT_CHARACTERS], max_age=60),
+        "/api/v1/pricing/plans": CacheRule([TAG_PRICING_PLANS], max_age=300),
+        "/api/v1/pricing/credits": CacheRule([TAG_CREDIT_PACKAGES], max_age=300),
+    }
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,10 +64,65 @@ async def lifespan(app: FastAPI):
         import traceback
         traceback.print_exc()
     
+    # Warm the in-memory character registry used on the chat hot path
+    from app.services.character_registry import character_registry
+    try:
+        from app.core.database import db_manager
+        await character_registry.start(db_manager.get_async_session_factory())
+        print("✅ Character registry loaded")
+    except Exception as e:
+        print(f"⚠️ Character registry using seed catalogue only: {e}")
+    
+    # Learn expected output sizes for quota admission
+    from app.services.admission_service import admission_estimator
+    try:
+        from app.core.database import db_manager
+        await admission_estimator.load(db_manager.get_async_session_factory())
+    except Exception as e:
+        print(f"⚠️ Admission estimator using defaults: {e}")
+    
+    # Background chat job workers; queued jobs from before a restart resume
+    from app.services.job_service import chat_job_service
+    try:
+        from app.api.v1.endpoints.chat import run_chat_job
+        await chat_job_service.start(run_chat_job)
+        print("✅ Chat job workers started")
+    except Exception as e:
+        print(f"⚠️ Chat job workers unavailable: {e}")
+    
+    # Cross-worker invalidation (character registry, response cache, chat jobs)
+    from app.core.notifications import notification_hub
+    try:
+        from app.core.database import db_manager
+        await notification_hub.start(db_manager.get_async_engine())
+    except Exception as e:
+        print(f"⚠️ Notification listener unavailable: {e}")
+    
+    if settings.traffic_capture_enabled:
+        await traffic_recorder.start()
+        print(f"🎥 Capturing traffic shapes to {settings.traffic_capture_path}")
+    
+    if settings.query_log_enabled:
+        await query_log.start()
+    
+    if shared_metrics is not None:
+        await shared_metrics.start()
+    
+    if settings.otel_exporter_otlp_traces_endpoint:
+        await span_exporter.start()
+        print(f"🔭 Exporting traces to {settings.otel_exporter_otlp_traces_endpoint}")
+    
     yield
     
     # Shutdown
     print("🛑 Shutting down Histora backend...")
+    await chat_job_service.stop()
+    await notification_hub.stop()
+    await traffic_recorder.stop()
+    await span_exporter.stop()
+    await query_log.stop()
+    if shared_metrics is not None:
+        await shared_metrics.stop()
     
     # Cleanup database connections
     try:
@@ -64,13 +146,52 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     
+    # Per-request deadlines (innermost, so they cover only handler time)
+    app.add_middleware(
+        DeadlineMiddleware,
+        route_defaults={
+            "/api/v1/chat/send": settings.chat_request_deadline,
+            "/api/v1/chat/demo": settings.chat_request_deadline,
+            "/api/v1/chat/stream": settings.chat_request_deadline,
+            "/api/v1/chat/debate": settings.chat_request_deadline,
+        },
+        default=settings.request_deadline_default,
+    )
+    
+    # Adaptive concurrency limit for chat generation: sheds load with
+    # 503 + Retry-After once latency shows upstream (LLM/DB) saturation.
+    # Session lists, history and job/stream polls are not limited.
+    if settings.chat_load_shedding_enabled:
+        app.add_middleware(
+            AdaptiveConcurrencyMiddleware,
+            paths={
+                "/api/v1/chat/send",
+                "/api/v1/chat/stream",
+                "/api/v1/chat/debate",
+                "/api/v1/chat/demo",
+                "/api/v1/chat/jobs",
+            },
+            limiter=GradientLimiter(
+                "chat",
+                initial_limit=settings.chat_concurrency_initial,
+                min_limit=settings.chat_concurrency_min,
+                max_limit=settings.chat_concurrency_max,
+            ),
+        )
+    
+    # Response cache for read-mostly public endpoints (added before CORS so
+    # cached responses still pass through the CORS middleware)
+    if settings.response_cache_enabled:
+        app.add_middleware(ResponseCacheMiddleware, rules=_response_cache_rules())
+    
     # CORS Middleware
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.cors_origins,
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-        allow_headers=["Authorization", "Content-Type", "X-Admin-API-Key"],
+        allow_headers=["Authorization", "Content-Type", "X-Admin-API-Key", "Idempotency-Key", "X-Request-Timeout", "Last-Event-ID", "traceparent"],
+        expose_headers=["Idempotent-Replayed", "Retry-After", "X-Generation-Id", "Server-Timing"],
     )
     
     # Trusted Host Middleware (production security)
@@ -88,14 +209,27 @@ def create_app() -> FastAPI:
             allowed_hosts=[backend_host, "backend", "localhost", "127.0.0.1"],
         )
     
-    # Request timing middleware
-    @app.middleware("http")
-    async def add_process_time_header(request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
+    # Anonymized request-shape capture for replay (outside CORS, the cache
+    # and load shedding, so it sees what clients saw)
+    if settings.traffic_capture_enabled:
+        app.add_middleware(TrafficCaptureMiddleware, recorder=traffic_recorder)
+    
+    # Per-route latency histograms (outside the cache and load shedding, so
+    # cached and shed responses are counted too)
+    if settings.metrics_enabled:
+        app.add_middleware(RequestMetricsMiddleware)
+    
+    # Statement counts per request for the query log (inside tracing, so
+    # records carry the request's trace id)
+    if settings.query_log_enabled:
+        app.add_middleware(QueryCountMiddleware, query_log=query_log)
+    
+    # Request tracing: root span, X-Process-Time and Server-Timing headers
+    app.add_middleware(
+        TracingMiddleware,
+        sample_rate=settings.tracing_sample_rate,
+        server_timing=settings.server_timing_enabled,
+    )
     
     # Include API routes
     app.include_router(api_router, prefix="/api/v1")
@@ -111,6 +245,22 @@ def create_app() -> FastAPI:
             "environment": settings.environment
         }
     
+    # Prometheus scrape endpoint; outside development only with a token
+    if settings.metrics_enabled and not (settings.metrics_token or settings.is_development):
+        print("⚠️ GET /metrics disabled: set METRICS_TOKEN to expose it outside development")
+    elif settings.metrics_enabled:
+        @app.get("/metrics", include_in_schema=False)
+        async def prometheus_metrics(request: Request):
+            """Prometheus text exposition of the metrics (all workers' with a multiprocess dir)."""
+            if settings.metrics_token:
+                authorization = request.headers.get("authorization", "")
+                if not secrets.compare_digest(authorization, f"Bearer {settings.metrics_token}"):
+                    raise HTTPException(status_code=401, detail="Invalid metrics token")
+            from app.core.database import db_manager
+            db_manager.record_pool_stats()
+            registry = shared_metrics or metrics
+            return Response(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+    
     # Root endpoint
     @app.get("/")
     async def root():
@@ -8,6 +8,7 @@ from .database import (
     Character,
     ChatSession,
     ChatMessage,
+    ChatJob,
     UserUsage,
     UserQuota,
     CreditTransaction,
@@ -23,6 +24,7 @@ __all__ = [
     "Character",
     "ChatSession",
     "ChatMessage",
+    "ChatJob",
     "UserUsage",
     "UserQuota", 
     "CreditTransaction",
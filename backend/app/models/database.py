@@ -308,6 +308,67 @@ class ChatMessage(Base):
     def __repr__(self):
         return f"<ChatMessage(id={self.id}, role='{self.role}', session_id={self.session_id})>"
 
+class ChatJob(Base):
+    """Queued chat turn processed asynchronously by the job worker pool."""
+    __tablename__ = "chat_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    
+    # Job state
+    status = Column(String(20), nullable=False, default="queued")  # "queued", "running", "succeeded", "failed"
+    request = Column(JSON, nullable=False)  # ChatRequest payload
+    webhook_url = Column(String(500), nullable=True)
+    
+    # Outcome
+    result = Column(JSON, nullable=True)  # ChatResponse payload
+    error = Column(Text, nullable=True)
+    error_status = Column(Integer, nullable=True)  # HTTP status the turn failed with
+    
+    # Execution tracking
+    attempts = Column(Integer, default=0)
+    claimed_by = Column(String(100), nullable=True)  # Worker that is running it
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Relationships
+    user = relationship("User")
+    
+    # Indexes
+    __table_args__ = (
+        Index("idx_chat_job_user", "user_id"),
+        Index("idx_chat_job_status_created", "status", "created_at"),
+    )
+    
+    def __repr__(self):
+        return f"<ChatJob(id={self.id}, status='{self.status}', user_id={self.user_id})>"
+
+class IdempotencyKey(Base):
+    """Idempotency-Key claimed by a request, shared by all workers."""
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # Hash of the request body
+    
+    status = Column(String(20), nullable=False, default="running")  # "running", "succeeded"
+    response = Column(JSON, nullable=True)  # Stored result, replayed to retries
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Running: lease after which a crashed owner's claim is abandoned;
+    # succeeded: end of the replay window
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    
+    # Indexes
+    __table_args__ = (
+        Index("idx_idempotency_key_expires", "expires_at"),
+    )
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key='{self.key}', status='{self.status}')>"
+
 class PricingPlan(Base):
     """Subscription pricing plans for the platform."""
     __tablename__ = "pricing_plans"
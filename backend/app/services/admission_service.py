@@ -0,0 +1,151 @@
+"""
+Pre-flight token estimation for quota and credit admission.
+
+A chat turn's cost is estimated before the model is called: the character's
+cached system prompt count, the message and any history, plus an expected
+output size learned per (character, model) from ``UserUsage`` and updated
+with every billed response. Everything is in-memory arithmetic, so an
+estimate costs a few microseconds.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy import select, func
+import structlog
+
+from app.core.config import get_settings
+from app.models.database import UserUsage
+from app.services.tokenizer_service import FALLBACK_CHARS_PER_TOKEN, MESSAGE_OVERHEAD_TOKENS
+
+logger = structlog.get_logger(__name__)
+
+# Expected output before any history exists for a character or model
+DEFAULT_EXPECTED_OUTPUT = 300
+
+# Weight of a new observation in the running output averages
+OUTPUT_EWMA_ALPHA = 0.1
+
+# How much history to learn from at startup
+HISTORY_DAYS = 30
+
+
+class AdmissionEstimate(NamedTuple):
+    input_tokens: int
+    output_tokens: int
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+class _Average:
+    """Exponentially weighted mean with a warm-up phase that is a plain mean."""
+
+    __slots__ = ("mean", "count")
+
+    def __init__(self, mean: float = 0.0, count: int = 0):
+        self.mean = mean
+        self.count = count
+
+    def add(self, value: float):
+        self.count += 1
+        weight = max(OUTPUT_EWMA_ALPHA, 1.0 / self.count)
+        self.mean += weight * (value - self.mean)
+
+
+class AdmissionEstimator:
+    """Estimates a chat turn's input and output tokens before dispatch."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._by_character_model: Dict[Tuple[str, str], _Average] = {}
+        self._by_character: Dict[str, _Average] = {}
+        self._by_model: Dict[str, _Average] = {}
+
+    @staticmethod
+    def _text_tokens(text: str) -> int:
+        # Character-based estimate: unique user text is never worth a BPE pass
+        # (or a cache slot) just to admit the request
+        return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN) if text else 0
+
+    def expected_output(self, character_id: str, model: Optional[str] = None) -> int:
+        """Learned output size, most specific history first."""
+        model = model or self.settings.default_ai_model
+        for average in (
+            self._by_character_model.get((character_id, model)),
+            self._by_character.get(character_id),
+            self._by_model.get(model),
+        ):
+            if average is not None and average.count:
+                return min(self.settings.ai_max_tokens, math.ceil(average.mean))
+        return min(self.settings.ai_max_tokens, DEFAULT_EXPECTED_OUTPUT)
+
+    def estimate(
+        self,
+        character_id: str,
+        prompt_tokens: int,
+        message: str,
+        history: Iterable[str] = (),
+        model: Optional[str] = None,
+    ) -> AdmissionEstimate:
+        """Estimate a turn from the character's cached prompt count, message and history."""
+        messages = 2
+        input_tokens = prompt_tokens + self._text_tokens(message)
+        for text in history:
+            input_tokens += self._text_tokens(text)
+            messages += 1
+        input_tokens += MESSAGE_OVERHEAD_TOKENS * messages
+        return AdmissionEstimate(input_tokens, self.expected_output(character_id, model))
+
+    def observe(self, character_id: Optional[str], model: Optional[str], output_tokens: int):
+        """Learn from a billed response."""
+        if not character_id or not model or output_tokens <= 0:
+            return
+        for store, key in (
+            (self._by_character_model, (character_id, model)),
+            (self._by_character, character_id),
+            (self._by_model, model),
+        ):
+            average = store.get(key)
+            if average is None:
+                average = store[key] = _Average()
+            average.add(output_tokens)
+
+    async def load(self, session_factory):
+        """Seed the output averages from recent chat usage."""
+        since = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+        async with session_factory() as session:
+            result = await session.execute(
+                select(
+                    UserUsage.character_id,
+                    UserUsage.model_name,
+                    func.avg(UserUsage.output_tokens),
+                    func.count(UserUsage.id),
+                )
+                .where(
+                    UserUsage.request_type == "chat",
+                    UserUsage.date >= since,
+                    UserUsage.output_tokens > 0,
+                    UserUsage.character_id.isnot(None),
+                    UserUsage.model_name.isnot(None),
+                )
+                .group_by(UserUsage.character_id, UserUsage.model_name)
+            )
+            rows = result.all()
+
+        by_character: Dict[str, Tuple[float, int]] = {}
+        by_model: Dict[str, Tuple[float, int]] = {}
+        for character_id, model, mean, count in rows:
+            mean = float(mean)
+            self._by_character_model[(character_id, model)] = _Average(mean, count)
+            for store, key in ((by_character, character_id), (by_model, model)):
+                total, n = store.get(key, (0.0, 0))
+                store[key] = (total + mean * count, n + count)
+
+        self._by_character = {key: _Average(total / n, n) for key, (total, n) in by_character.items()}
+        self._by_model = {key: _Average(total / n, n) for key, (total, n) in by_model.items()}
+        logger.info("Admission estimator loaded", pairs=len(self._by_character_model))
+
+
+# Global admission estimator instance
+admission_estimator = AdmissionEstimator()
@@ -3,13 +3,21 @@ AI Service for character chat using OpenRouter + Llama 3.1
 """
 
 import asyncio
+import hashlib
 import json
 import time
-import httpx
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from pydantic import BaseModel
 
 from app.core.config import get_settings
+from app.core.deadlines import bounded_timeout, check_deadline, upstream_timeout
+from app.core.metrics import metrics
+from app.core.tracing import span, traced
+from app.services.admission_service import admission_estimator
+from app.services.llm_providers import ProviderError, REQUEST_TIMEOUT, llm_providers
+from app.services.llm_scheduler import llm_scheduler
+from app.services.model_router import Route, model_router
+from app.services.tokenizer_service import tokenizer_service, FALLBACK_CHARS_PER_TOKEN
 
 
 class ChatMessage(BaseModel):
@@ -25,6 +33,59 @@ class AIResponse(BaseModel):
     response_time: float
 
 
+singleflight_requests = metrics.counter(
+    "histora_llm_singleflight_requests_total",
+    "Coalescable LLM requests by role (leader made the call, follower shared it)",
+    ["result"],
+)
+coalescing_ratio = metrics.gauge(
+    "histora_llm_coalescing_ratio",
+    "Share of coalescable LLM requests served by another request's call",
+)
+llm_request_duration = metrics.histogram(
+    "histora_llm_request_seconds",
+    "Upstream LLM call latency (after the scheduler slot is granted) by outcome",
+    ["provider", "model", "outcome"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0),
+)
+llm_ttft = metrics.histogram(
+    "histora_llm_ttft_seconds",
+    "Time to first streamed fragment of an upstream LLM call",
+    ["provider", "model"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0),
+)
+llm_tokens_per_second = metrics.histogram(
+    "histora_llm_tokens_per_second",
+    "Output tokens per second of successful upstream LLM calls",
+    ["provider", "model"],
+    buckets=(2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0, 320.0),
+)
+llm_fallbacks = metrics.counter(
+    "histora_llm_fallbacks_total",
+    "Failed routes that moved the request on to the next route in the chain",
+    ["reason"],
+)
+llm_retries = metrics.counter(
+    "histora_llm_retries_total",
+    "Second passes over the route chain after an upstream rate limit",
+)
+llm_mock_responses = metrics.counter(
+    "histora_llm_mock_responses_total",
+    "Responses served by the mock (no provider configured, or every route failed)",
+    ["reason"],
+)
+
+
+class _Flight:
+    """An in-flight coalesced generation and how many callers await it."""
+    
+    __slots__ = ("task", "waiters")
+    
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
 class CharacterPrompt(BaseModel):
     character_id: str
     system_prompt: str
@@ -34,20 +95,17 @@ class CharacterPrompt(BaseModel):
 
 
 class AIService:
-    """AI Service using OpenRouter for character conversations."""
+    """AI Service for character conversations over the configured LLM providers."""
+    
+    # Upper bound per upstream call; shortened to the request deadline
+    REQUEST_TIMEOUT = REQUEST_TIMEOUT
     
     def __init__(self):
         self.settings = get_settings()
-        self.client = httpx.AsyncClient(
-            base_url=self.settings.openrouter_base_url,
-            headers={
-                "Authorization": f"Bearer {self.settings.openrouter_api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": self.settings.backend_url,
-                "X-Title": "Histora - AI Historical Chat"
-            },
-            timeout=30.0
-        )
+        self.providers = llm_providers
+        self.router = model_router
+        # In-flight coalesced generations (see get_character_response)
+        self._flights: Dict[Tuple, _Flight] = {}
         
         # Character prompts
         self.character_prompts = {
@@ -152,61 +210,184 @@ Türkçe konuş ve karakterine uygun yanıtlar ver. Bazen Çince atasözleri çe
             )
         }
 
+    @traced("llm")
     async def get_character_response(
         self,
         character_id: str,
         user_message: str,
         chat_history: List[ChatMessage] = None,
         language: str = "tr",
-        system_prompt_override: Optional[str] = None
+        system_prompt_override: Optional[str] = None,
+        plan_type: Optional[str] = None,
+        user_key: str = "",
+        coalesce: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        mode: str = "chat"
     ) -> AIResponse:
-        """Get AI response for character chat with fallback handling."""
+        """Get AI response for character chat with fallback handling.
+        
+        ``plan_type`` and ``user_key`` place the call in the per-model
+        dispatch queue (plan tier first, then fair share per user). With
+        ``coalesce``, identical concurrent first-turn requests share one
+        upstream call. With ``on_delta``, the model is streamed and each
+        text fragment is passed to it as it arrives. ``mode`` feeds the
+        model router (lesson/advisor prompts go to stronger models).
+        """
+        generate = lambda: self._generate_response(
+            character_id, user_message, chat_history, system_prompt_override, plan_type, user_key, on_delta, mode
+        )
+        if not coalesce or chat_history or on_delta:
+            return await generate()
+        
+        prompt_hash = hashlib.sha256((system_prompt_override or "").encode()).hexdigest()
+        key = (character_id, prompt_hash, language, user_message)
+        return await self._single_flight(key, generate)
+    
+    async def _single_flight(self, key: Tuple, generate) -> AIResponse:
+        """Run ``generate`` once per key among concurrent callers and share the result."""
+        flight = self._flights.get(key)
+        if flight is None:
+            singleflight_requests.inc(result="leader")
+            flight = _Flight(asyncio.ensure_future(generate()))
+            self._flights[key] = flight
+            
+            def _landed(_task, key=key, flight=flight):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            
+            flight.task.add_done_callback(_landed)
+        else:
+            singleflight_requests.inc(result="follower")
+        
+        leaders = singleflight_requests.value(result="leader")
+        followers = singleflight_requests.value(result="follower")
+        coalescing_ratio.set(followers / (leaders + followers))
+        
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            # Last interested caller gone (disconnects): stop the upstream call
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+    
+    async def _generate_response(
+        self,
+        character_id: str,
+        user_message: str,
+        chat_history: Optional[List[ChatMessage]],
+        system_prompt_override: Optional[str],
+        plan_type: Optional[str],
+        user_key: str,
+        on_delta: Optional[Callable[[str], None]] = None,
+        mode: str = "chat"
+    ) -> AIResponse:
+        """Call the routed model chain (or the mock) for one response."""
         
-        import time
         start_time = time.time()
         
-        # Check if we have a real API key
-        if not self.settings.openrouter_api_key or self.settings.openrouter_api_key == "demo_openrouter_key":
+        # Once text has reached the client, switching models would splice two
+        # answers together, so only fall back before the first fragment
+        emitted = False
+        first_fragment_at = None
+        
+        def forward(text: str):
+            nonlocal emitted, first_fragment_at
+            if first_fragment_at is None:
+                first_fragment_at = time.perf_counter()
+            emitted = True
+            on_delta(text)
+        
+        # No usable provider configured
+        if not self.router.available:
             # Return mock response with realistic delay
             await asyncio.sleep(1.0 + (len(user_message) * 0.01))  # Realistic delay
-            return await self._get_mock_response(character_id, user_message, start_time)
+            llm_mock_responses.inc(reason="unconfigured")
+            return await self._stream_mock(
+                await self._get_mock_response(character_id, user_message, start_time), on_delta
+            )
         
-        # Try primary + backup, then a chain of free fallbacks.
-        # Free models get rate-limited upstream (429) often, so a wide chain
-        # plus one short retry keeps chat alive without paid usage.
-        # Note: nemotron models are excluded — they leak chain-of-thought
-        # into the response content, which breaks the in-character illusion.
-        free_fallbacks = [
-            "nousresearch/hermes-3-llama-3.1-405b:free",
-            "openai/gpt-oss-120b:free",
-            "google/gemma-4-31b-it:free",
-        ]
-        models_to_try = [self.settings.default_ai_model, self.settings.backup_ai_model]
-        models_to_try += [m for m in free_fallbacks if m not in models_to_try]
+        # Best route for this request first, the rest as fallbacks. Free
+        # models get rate-limited upstream (429) often, so a wide chain plus
+        # one short retry keeps chat alive without paid usage.
+        prompt_chars = len(system_prompt_override or "") + len(user_message)
+        prompt_chars += sum(len(m.content) for m in (chat_history or [])[-10:])
+        expected_output = admission_estimator.expected_output(character_id)
+        profile = self.router.classify(mode, user_message, expected_output)
+        routes = self.router.plan(profile, int(prompt_chars / FALLBACK_CHARS_PER_TOKEN), expected_output)
 
         saw_rate_limit = False
         for attempt in range(2):
             if attempt == 1:
                 if not saw_rate_limit:
                     break
-                await asyncio.sleep(8)  # let upstream limits cool off, then retry chain
-            for model in models_to_try:
+                llm_retries.inc()
+                await asyncio.sleep(bounded_timeout(8))  # let upstream limits cool off, then retry chain
+            for route in routes:
+                # Out of time: fail the request rather than start another call
+                check_deadline()
                 try:
-                    response = await self._make_api_call(
-                        character_id, user_message, chat_history,
-                        system_prompt_override, model, start_time
-                    )
-                    if response:
+                    with span("llm.call", **{"llm.provider": route.provider.name, "llm.model": route.model}) as call_span:
+                        slot_requested = time.perf_counter()
+                        async with llm_scheduler.slot(route.model, plan_type, user_key):
+                            call_start = time.perf_counter()
+                            if call_span is not None:
+                                call_span.set_attribute("llm.queue_ms", round((call_start - slot_requested) * 1000, 1))
+                            first_fragment_at = None
+                            try:
+                                response = await self._make_api_call(
+                                    character_id, user_message, chat_history,
+                                    system_prompt_override, route, start_time,
+                                    on_delta=forward if on_delta else None
+                                )
+                            except Exception as e:
+                                rate_limited = isinstance(e, ProviderError) and e.rate_limited
+                                self.router.observe_failure(
+                                    route,
+                                    rate_limited=rate_limited,
+                                    retry_after=getattr(e, "retry_after", None)
+                                )
+                                llm_request_duration.observe(
+                                    time.perf_counter() - call_start,
+                                    provider=route.provider.name, model=route.model,
+                                    outcome="rate_limited" if rate_limited else "error"
+                                )
+                                raise
+                        duration = time.perf_counter() - call_start
+                        # Non-streamed calls have no first fragment, so no TTFT
+                        ttft = first_fragment_at - call_start if first_fragment_at else None
+                        output_tokens = (response.usage or {}).get("completion_tokens") or tokenizer_service.count(
+                            response.content, response.model_used
+                        )
+                        self.router.observe_success(route, duration, output_tokens, ttft=ttft)
+                        labels = {"provider": route.provider.name, "model": route.model}
+                        llm_request_duration.observe(duration, outcome="ok", **labels)
+                        if ttft is not None:
+                            llm_ttft.observe(ttft, **labels)
+                        generation_time = duration - ttft if ttft is not None and duration - ttft > 0.05 else duration
+                        if output_tokens and generation_time > 0:
+                            llm_tokens_per_second.observe(output_tokens / generation_time, **labels)
+                        if call_span is not None:
+                            if ttft is not None:
+                                call_span.set_attribute("llm.ttft_ms", round(ttft * 1000, 1))
+                            call_span.set_attribute("llm.output_tokens", output_tokens)
                         return response
                 except Exception as e:
+                    if emitted:
+                        raise
                     if "429" in str(e):
                         saw_rate_limit = True
-                    print(f"Failed with model {model}: {e}")
+                    llm_fallbacks.inc(reason="rate_limited" if "429" in str(e) else "error")
+                    print(f"Failed with model {route.model} via {route.provider.name}: {e}")
                     continue
 
         # If all models fail, use mock response
         print("All AI models failed, falling back to mock response")
-        return await self._get_mock_response(character_id, user_message, start_time)
+        llm_mock_responses.inc(reason="exhausted")
+        return await self._stream_mock(
+            await self._get_mock_response(character_id, user_message, start_time), on_delta
+        )
 
     async def _make_api_call(
         self,
@@ -214,10 +395,12 @@ Türkçe konuş ve karakterine uygun yanıtlar ver. Bazen Çince atasözleri çe
         user_message: str,
         chat_history: List[ChatMessage],
         system_prompt_override: Optional[str],
-        model: str,
-        start_time: float
+        route: Route,
+        start_time: float,
+        on_delta: Optional[Callable[[str], None]] = None
     ) -> Optional[AIResponse]:
-        """Make API call to OpenRouter with specified model."""
+        """Make API call to the route's provider and model."""
+        model = route.model
         
         # Determine which system prompt to use
         if system_prompt_override:
@@ -239,22 +422,26 @@ Türkçe konuş ve karakterine uygun yanıtlar ver. Bazen Çince atasözleri çe
         # Add current user message
         messages.append({"role": "user", "content": user_message})
         
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": self.settings.ai_max_tokens,
+            "temperature": self.settings.ai_temperature,
+            "top_p": self.settings.ai_top_p,
+            "stream": on_delta is not None
+        }
+        if on_delta is not None:
+            return await self._stream_api_call(character_id, route, payload, on_delta, start_time)
+        
         # Make API call
-        response = await self.client.post(
+        response = await route.provider.client.post(
             "/chat/completions",
-            json={
-                "model": model,
-                "messages": messages,
-                "max_tokens": self.settings.ai_max_tokens,
-                "temperature": self.settings.ai_temperature,
-                "top_p": self.settings.ai_top_p,
-                "stream": False
-            }
+            json=payload,
+            timeout=upstream_timeout(self.REQUEST_TIMEOUT)
         )
         
         if response.status_code != 200:
-            error_text = response.text
-            raise Exception(f"OpenRouter API error for model {model}: {response.status_code} - {error_text}")
+            raise ProviderError.from_response(route.provider.name, model, response, response.text)
         
         data = response.json()
         
@@ -272,6 +459,69 @@ Türkçe konuş ve karakterine uygun yanıtlar ver. Bazen Çince atasözleri çe
             response_time=time.time() - start_time
         )
 
+    async def _stream_api_call(
+        self,
+        character_id: str,
+        route: Route,
+        payload: Dict[str, Any],
+        on_delta: Callable[[str], None],
+        start_time: float
+    ) -> AIResponse:
+        """Streaming variant of the provider call; usage arrives in the last chunk."""
+        model = payload["model"]
+        async with route.provider.client.stream(
+            "POST",
+            "/chat/completions",
+            json=payload,
+            timeout=upstream_timeout(self.REQUEST_TIMEOUT)
+        ) as response:
+            if response.status_code != 200:
+                error_text = (await response.aread()).decode(errors="replace")
+                raise ProviderError.from_response(route.provider.name, model, response, error_text)
+            
+            parts = []
+            usage = None
+            model_used = model
+            async for line in response.aiter_lines():
+                # Blank separators and ": OPENROUTER PROCESSING" comments
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise ProviderError(f"{route.provider.name} stream error for model {model}: {chunk['error']}")
+                usage = chunk.get("usage") or usage
+                model_used = chunk.get("model", model_used)
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        parts.append(text)
+                        on_delta(text)
+        
+        content = "".join(parts)
+        if not content:
+            raise Exception(f"Empty response from model {model}")
+        
+        return AIResponse(
+            content=content,
+            character_id=character_id,
+            usage=usage,
+            model_used=model_used,
+            response_time=time.time() - start_time
+        )
+
+    @staticmethod
+    async def _stream_mock(response: AIResponse, on_delta: Optional[Callable[[str], None]]) -> AIResponse:
+        """Emit a mock response word by word when streaming."""
+        if on_delta is not None:
+            words = response.content.split(" ")
+            for i, word in enumerate(words):
+                on_delta(word if i == len(words) - 1 else word + " ")
+                await asyncio.sleep(0.02)
+        return response
+
     async def _get_mock_response(self, character_id: str, user_message: str, start_time: float, system_prompt_override: Optional[str] = None) -> AIResponse:
         """Generate mock response for development."""
         
@@ -339,8 +589,8 @@ Türkçe konuş ve karakterine uygun yanıtlar ver. Bazen Çince atasözleri çe
         )
 
     async def close(self):
-        """Close HTTP client."""
-        await self.client.aclose()
+        """Close provider HTTP clients."""
+        await self.providers.close()
 
 
 # Global AI service instance
@@ -2,8 +2,10 @@
 Authentication and authorization service.
 """
 import os
+import asyncio
 import jwt
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
@@ -17,6 +19,14 @@ from sqlalchemy import select
 
 logger = structlog.get_logger(__name__)
 
+# Verifier paths a bearer credential can be routed to
+TOKEN_KIND_LOCAL = "local"
+TOKEN_KIND_FIREBASE = "firebase"
+TOKEN_KIND_UNKNOWN = "unknown"
+
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+FIREBASE_MOCK_PREFIX = "firebase-mock-"
+
 class TokenData(BaseModel):
     """Token data model."""
     user_id: str
@@ -35,21 +45,44 @@ class AuthService:
         self.secret_key = self.settings.jwt_secret_key
         self.algorithm = self.settings.jwt_algorithm
         self.token_expire_minutes = self.settings.jwt_expire_minutes
+        # bcrypt releases the GIL, so a small thread pool gives real parallelism
+        # while capping how many hashes can burn CPU at once.
+        self._password_executor = ThreadPoolExecutor(
+            max_workers=max(1, self.settings.password_hash_workers),
+            thread_name_prefix="bcrypt"
+        )
         
     def hash_password(self, password: str) -> str:
-        """Hash password using bcrypt."""
+        """Hash password using bcrypt (blocking; prefer hash_password_async)."""
         salt = bcrypt.gensalt()
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     
-    def verify_password(self, password: str, hashed_password: str) -> bool:
-        """Verify password against hash."""
+    def verify_password(self, password: str, hashed_password: Optional[str]) -> bool:
+        """Verify password against hash (blocking; prefer verify_password_async)."""
+        if not hashed_password:
+            # Federated (Firebase) accounts have no local password
+            return False
         try:
             return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
         except Exception as e:
             logger.error(f"Password verification error: {e}")
             return False
     
+    async def hash_password_async(self, password: str) -> str:
+        """Hash password on the bounded bcrypt worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._password_executor, self.hash_password, password)
+    
+    async def verify_password_async(self, password: str, hashed_password: Optional[str]) -> bool:
+        """Verify password on the bounded bcrypt worker pool."""
+        if not hashed_password:
+            return False
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._password_executor, self.verify_password, password, hashed_password
+        )
+    
     def create_access_token(self, user_data: Dict[str, Any]) -> str:
         """Create JWT access token."""
         to_encode = user_data.copy()
@@ -72,12 +105,39 @@ class AuthService:
                 detail="Could not create access token"
             )
     
+    def classify_token(self, token: str) -> str:
+        """Classify a bearer credential from its unverified header and claims.
+        
+        Nothing here is trusted; it only decides which verifier to run so our
+        own JWTs never pay for a failed Firebase verification (and vice versa).
+        """
+        if token.startswith(FIREBASE_MOCK_PREFIX):
+            return TOKEN_KIND_FIREBASE
+        
+        try:
+            header = jwt.get_unverified_header(token)
+            claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.PyJWTError:
+            return TOKEN_KIND_UNKNOWN
+        
+        alg = header.get("alg")
+        issuer = claims.get("iss")
+        # Client-supplied: a non-string issuer is ignored, not trusted
+        if not isinstance(issuer, str):
+            issuer = ""
+        
+        if issuer.startswith(FIREBASE_ISSUER_PREFIX) or (alg == "RS256" and header.get("kid")):
+            return TOKEN_KIND_FIREBASE
+        if alg == self.algorithm and not header.get("kid") and not issuer:
+            return TOKEN_KIND_LOCAL
+        return TOKEN_KIND_UNKNOWN
+    
     def verify_token(self, token: str) -> TokenData:
         """Verify and decode JWT token."""
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
             
-            user_id = payload.get("user_id")
+            user_id = payload.get("user_id") or payload.get("sub")
             email = payload.get("email")
             role = payload.get("role", "user")
             is_admin = payload.get("is_admin", False)
@@ -123,7 +183,7 @@ class AuthService:
                 return None
             
             # Verify password
-            if not self.verify_password(password, user.password_hash):
+            if not await self.verify_password_async(password, user.password_hash):
                 logger.warning(f"Authentication failed: Invalid password - {email}")
                 return None
             
@@ -141,12 +201,18 @@ class AuthService:
     async def create_user(
         self, 
         email: str, 
-        password: str, 
+        password: Optional[str], 
         full_name: str,
         role: str = "user",
-        db: AsyncSession = None
+        db: AsyncSession = None,
+        firebase_uid: Optional[str] = None,
+        email_verified: bool = False
     ) -> User:
-        """Create new user."""
+        """Create new user.
+        
+        Pass ``password=None`` for federated (Firebase) accounts; they are
+        stored without a password hash and skip bcrypt entirely.
+        """
         try:
             # Check if user already exists
             result = await db.execute(
@@ -160,18 +226,19 @@ class AuthService:
                     detail="User with this email already exists"
                 )
             
-            # Hash password
-            password_hash = self.hash_password(password)
+            # Hash password (federated accounts have none)
+            password_hash = await self.hash_password_async(password) if password else None
             
             # Create user
             new_user = User(
                 email=email,
                 password_hash=password_hash,
+                firebase_uid=firebase_uid,
                 full_name=full_name,
                 role=role,
                 is_active=True,
                 is_admin=(role == "admin"),
-                email_verified=False  # In production, implement email verification
+                email_verified=email_verified  # In production, implement email verification
             )
             
             db.add(new_user)
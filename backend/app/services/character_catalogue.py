@@ -0,0 +1,169 @@
+"""
+Indexed view of the public character catalogue.
+
+Built once from the seed data: characters are bucketed by category and
+featured flag so listing is a slice, and an n-gram (trigram) index over
+Turkish-folded names, bios and traits answers ``/characters/search`` by
+touching only the postings of the query's trigrams.
+"""
+import heapq
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.text import fold_turkish
+from app.data.characters_seed import CATEGORIES, CHARACTERS
+
+NGRAM = 3
+
+# Field weights: a hit on the name outranks one in a trait, which outranks the bio
+FIELD_WEIGHTS = (
+    ("name", 3.0),
+    ("name_en", 3.0),
+    ("personality_traits", 2.0),
+    ("era", 1.0),
+    ("birth_place", 1.0),
+    ("short_bio_tr", 1.0),
+    ("short_bio_en", 1.0),
+)
+
+# Fraction of the query's trigrams a character must contain to be returned
+MIN_SIMILARITY = 0.5
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _words(value: str) -> List[str]:
+    return _WORD_RE.findall(fold_turkish(value))
+
+
+def _ngrams(word: str) -> List[str]:
+    """Trigrams of a word padded with spaces, so prefixes and short words match."""
+    padded = f" {word} "
+    if len(padded) <= NGRAM:
+        return [padded]
+    return [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+
+
+def _field_text(character: Dict[str, Any], field: str) -> str:
+    value = character.get(field)
+    if not value:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(value)
+    return str(value)
+
+
+class CharacterCatalogue:
+    """Category/featured buckets plus a trigram search index."""
+
+    def __init__(self, characters: Iterable[Dict[str, Any]], categories: Iterable[Dict[str, Any]]):
+        self._characters: List[Dict[str, Any]] = list(characters)
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_folded_id: Dict[str, Dict[str, Any]] = {}
+        # (category or None, featured_only) -> characters in catalogue order
+        self._buckets: Dict[Tuple[Optional[str], bool], List[Dict[str, Any]]] = {}
+        # trigram -> {position: weight}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # position -> folded name words, for prefix bonuses
+        self._name_words: List[Tuple[str, ...]] = []
+
+        for position, character in enumerate(self._characters):
+            self._by_id[character["id"]] = character
+            self._by_folded_id[fold_turkish(character["id"])] = character
+            self._bucket(character)
+            self._index(position, character)
+
+        counts = {
+            category: len(bucket)
+            for (category, featured_only), bucket in self._buckets.items()
+            if category is not None and not featured_only
+        }
+        self._categories = [
+            {**category, "character_count": counts.get(category["id"], 0)}
+            for category in categories
+        ]
+
+    def _bucket(self, character: Dict[str, Any]):
+        keys = [(None, False), (character["category"], False)]
+        if character.get("is_featured"):
+            keys += [(None, True), (character["category"], True)]
+        for key in keys:
+            self._buckets.setdefault(key, []).append(character)
+
+    def _index(self, position: int, character: Dict[str, Any]):
+        for field, weight in FIELD_WEIGHTS:
+            for word in _words(_field_text(character, field)):
+                for gram in _ngrams(word):
+                    posting = self._postings.setdefault(gram, {})
+                    if posting.get(position, 0.0) < weight:
+                        posting[position] = weight
+        self._name_words.append(tuple(
+            _words(f"{character.get('name') or ''} {character.get('name_en') or ''}")
+        ))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._characters)
+
+    def get(self, character_id: str) -> Optional[Dict[str, Any]]:
+        """Character by id, falling back to the Turkish-folded id."""
+        character = self._by_id.get(character_id)
+        if character is not None:
+            return character
+        return self._by_folded_id.get(fold_turkish(character_id))
+
+    def list(self, category: Optional[str] = None, featured_only: bool = False) -> List[Dict[str, Any]]:
+        """Characters of one bucket, in catalogue order."""
+        return self._buckets.get((category or None, featured_only), [])
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """Categories with precomputed character counts."""
+        return self._categories
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        category: Optional[str] = None,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Ranked (character, score) pairs for a free-text query.
+
+        Score is the weighted share of query trigrams found in the character,
+        plus a bonus when a query word is a prefix of a name word.
+        """
+        words = _words(query)
+        grams = {gram for word in words for gram in _ngrams(word)}
+        if not grams:
+            return []
+
+        postings = [self._postings.get(gram, {}) for gram in grams]
+        hits: Counter = Counter()
+        for posting in postings:
+            hits.update(posting.keys())
+
+        required = len(grams) * MIN_SIMILARITY
+        max_weight = len(grams) * FIELD_WEIGHTS[0][1]
+        scored = []
+        for position, matched in hits.items():
+            if matched < required:
+                continue
+            character = self._characters[position]
+            if category and character["category"] != category:
+                continue
+            score = sum(posting.get(position, 0.0) for posting in postings) / max_weight
+            name_words = self._name_words[position]
+            for word in words:
+                if any(name_word.startswith(word) for name_word in name_words):
+                    score += 0.5 / len(words)
+            scored.append((score, -position))
+
+        best = heapq.nlargest(limit, scored)
+        return [(self._characters[-neg_position], round(score, 4)) for score, neg_position in best]
+
+
+# Global catalogue instance
+character_catalogue = CharacterCatalogue(CHARACTERS, CATEGORIES)
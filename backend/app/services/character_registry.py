@@ -0,0 +1,210 @@
+"""
+Process-local character registry for the chat hot path.
+
+Characters are loaded once at startup (seed catalogue overlaid with the
+database) with their system prompt and prompt token count precomputed, so
+chat requests never query the characters table. Admin writes publish a
+Postgres NOTIFY on ``CHARACTER_CHANNEL``; every worker LISTENs (through the
+shared notification hub) and reloads the affected character.
+"""
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from app.core.config import get_settings
+from app.core.notifications import notification_hub
+from app.core.response_cache import response_cache, TAG_CHAT_CHARACTERS
+from app.models.database import Character
+from app.data.characters_seed import CHARACTERS
+from app.services.tokenizer_service import tokenizer_service
+
+logger = structlog.get_logger(__name__)
+
+CHARACTER_CHANNEL = "histora_characters"
+DEFAULT_SYSTEM_PROMPT = "Sen bu karaktersin ve ona uygun şekilde konuş."
+
+
+class RegisteredCharacter(BaseModel):
+    """Immutable snapshot of a character as used by chat."""
+    id: str
+    name: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    birth_year: Optional[int] = None
+    death_year: Optional[int] = None
+    nationality: Optional[str] = None
+    category: str
+    personality_traits: List[str] = []
+    speaking_style: Optional[str] = None
+    is_published: bool = True
+    is_featured: bool = False
+    from_database: bool = False
+    system_prompt: str
+    prompt_tokens: int
+
+    def chat_listing(self) -> Dict[str, Any]:
+        """Entry shape served by /chat/characters."""
+        era = ""
+        if self.birth_year and self.death_year:
+            era = f"{self.birth_year}-{self.death_year}"
+        elif self.birth_year:
+            era = f"Born {self.birth_year}"
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "title": self.title,
+            "description": self.description or self.title,
+            "era": era,
+            "nationality": self.nationality,
+            "category": self.category,
+            "personality_traits": self.personality_traits,
+            "speaking_style": self.speaking_style,
+            "avatar_url": f"/avatars/{self.id}.svg",
+            "is_featured": self.is_featured,
+            # RAG system was removed; every published character is chat-ready
+            "ready_for_chat": True,
+            "knowledge_sources": 0,
+            "processed_chunks": 0
+        }
+
+
+class CharacterRegistry:
+    """In-memory character lookup with LISTEN/NOTIFY invalidation."""
+
+    def __init__(self):
+        self._seed: Dict[str, RegisteredCharacter] = {}
+        self._db: Dict[str, RegisteredCharacter] = {}
+        self._listing: Optional[List[Dict[str, Any]]] = None
+        self._loaded_from_db = False
+        self._load_seed()
+
+    # ------------------------------------------------------------------
+    # Building entries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _build(prompt: Optional[str], **fields) -> RegisteredCharacter:
+        system_prompt = prompt or DEFAULT_SYSTEM_PROMPT
+        return RegisteredCharacter(
+            system_prompt=system_prompt,
+            prompt_tokens=tokenizer_service.count(system_prompt, get_settings().default_ai_model),
+            **fields
+        )
+
+    def _load_seed(self):
+        for c in CHARACTERS:
+            self._seed[c["id"]] = self._build(
+                c.get("system_prompt"),
+                id=c["id"],
+                name=c["name"],
+                title=c.get("short_bio_tr"),
+                description=c.get("short_bio_tr"),
+                birth_year=c.get("birth_year"),
+                death_year=c.get("death_year"),
+                nationality=c.get("birth_place"),
+                category=c["category"],
+                personality_traits=c.get("personality_traits") or [],
+                is_featured=c.get("is_featured", False),
+            )
+
+    def _from_model(self, character: Character) -> RegisteredCharacter:
+        return self._build(
+            character.system_prompt,
+            id=character.id,
+            name=character.name,
+            title=character.title,
+            description=character.description,
+            birth_year=character.birth_year,
+            death_year=character.death_year,
+            nationality=character.nationality,
+            category=character.category,
+            personality_traits=character.personality_traits or [],
+            speaking_style=character.speaking_style,
+            is_published=bool(character.is_published),
+            is_featured=bool(character.is_featured),
+            from_database=True,
+        )
+
+    def upsert_from_model(self, character: Character):
+        """Replace one entry from an ORM row (used right after admin writes)."""
+        self._db[character.id] = self._from_model(character)
+        self._invalidate_listing()
+
+    def _invalidate_listing(self):
+        # The cached /chat/characters response is derived from this registry,
+        # so purge it only after the registry itself holds the new data.
+        self._listing = None
+        response_cache.purge_tags([TAG_CHAT_CHARACTERS])
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, character_id: str) -> Optional[RegisteredCharacter]:
+        """Published character by id: database entry first, seed catalogue second."""
+        entry = self._db.get(character_id)
+        if entry and entry.is_published:
+            return entry
+        return self._seed.get(character_id)
+
+    def name_for(self, character_id: str) -> str:
+        entry = self._db.get(character_id) or self._seed.get(character_id)
+        return entry.name if entry else "Unknown"
+
+    def chat_listing(self) -> List[Dict[str, Any]]:
+        """Pre-formatted published characters, featured first then by name."""
+        if self._listing is None:
+            source = self._db.values() if self._loaded_from_db else self._seed.values()
+            published = [c for c in source if c.is_published]
+            published.sort(key=lambda c: (not c.is_featured, c.name))
+            self._listing = [c.chat_listing() for c in published]
+        return self._listing
+
+    # ------------------------------------------------------------------
+    # Loading and invalidation
+    # ------------------------------------------------------------------
+
+    async def load(self, session_factory):
+        """Load every character row from the database."""
+        async with session_factory() as session:
+            result = await session.execute(select(Character))
+            rows = result.scalars().all()
+        self._db = {row.id: self._from_model(row) for row in rows}
+        self._loaded_from_db = True
+        self._invalidate_listing()
+        logger.info("Character registry loaded", database=len(self._db), seed=len(self._seed))
+
+    async def reload_character(self, session_factory, character_id: str):
+        """Reload one character (or drop it if it no longer exists)."""
+        async with session_factory() as session:
+            result = await session.execute(select(Character).where(Character.id == character_id))
+            row = result.scalar_one_or_none()
+        if row is None:
+            self._db.pop(character_id, None)
+        else:
+            self._db[character_id] = self._from_model(row)
+        self._invalidate_listing()
+        logger.info("Character registry entry reloaded", character_id=character_id)
+
+    async def start(self, session_factory):
+        """Subscribe to cross-worker invalidations and load the registry."""
+        async def _on_change(payload: str):
+            if payload:
+                await self.reload_character(session_factory, payload)
+            else:
+                await self.load(session_factory)
+
+        notification_hub.subscribe(CHARACTER_CHANNEL, _on_change)
+        await self.load(session_factory)
+
+    @staticmethod
+    async def publish_change(db: AsyncSession, character_id: str):
+        """Notify every worker that a character changed (delivered on commit)."""
+        await notification_hub.publish(db, CHARACTER_CHANNEL, character_id)
+
+
+# Global character registry instance
+character_registry = CharacterRegistry()
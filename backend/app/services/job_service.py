@@ -0,0 +1,384 @@
+"""
+Asynchronous chat jobs for long generations.
+
+``POST /chat/jobs`` stores the turn as a ``ChatJob`` row and returns at once;
+a bounded pool of worker tasks per process claims queued rows with
+``FOR UPDATE SKIP LOCKED`` and runs the normal chat turn (session writes,
+usage, billing) under a job-sized deadline. The table is the queue, so a
+restart loses nothing: queued rows are picked up by whichever worker starts
+next, a graceful shutdown hands its running jobs back, and jobs left running
+by a crashed worker are requeued once they go stale. Clients poll
+``GET /chat/jobs/{id}`` or get a webhook callback on completion.
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+import structlog
+
+from app.core.config import get_settings
+from app.core.database import async_session_scope
+from app.core.deadlines import deadline_scope
+from app.core.metrics import metrics
+from app.core.notifications import notification_hub
+from app.models.database import ChatJob, User
+
+logger = structlog.get_logger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# NOTIFY channel that wakes idle workers in every process
+JOB_CHANNEL = "histora_chat_jobs"
+
+# Failures worth another attempt: upstream unavailable, or the session still
+# busy with another turn after the queue wait. All are raised before the turn
+# writes anything; a 500 may come after messages were saved, so a retry
+# would store the turn twice
+RETRYABLE_STATUSES = {409, 502, 503}
+
+STALE_SWEEP_INTERVAL = 60.0
+WEBHOOK_TIMEOUT = 5.0
+WEBHOOK_ATTEMPTS = 3
+
+# Runs one chat turn from a stored request payload; returns the response payload
+JobRunner = Callable[[Dict[str, Any], User, AsyncSession], Awaitable[Dict[str, Any]]]
+
+jobs_total = metrics.counter(
+    "histora_chat_jobs_total",
+    "Chat jobs by lifecycle event (submitted, succeeded, failed, retried, requeued)",
+    ["event"],
+)
+jobs_running = metrics.gauge(
+    "histora_chat_jobs_running",
+    "Chat jobs currently executing in this process",
+)
+job_duration_seconds = metrics.histogram(
+    "histora_chat_job_duration_seconds",
+    "Chat job execution time by final status",
+    ["status"],
+)
+webhook_deliveries = metrics.counter(
+    "histora_chat_job_webhooks_total",
+    "Chat job webhook deliveries by result",
+    ["result"],
+)
+
+
+class ChatJobService:
+    """Database-backed chat job queue with an in-process worker pool."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._runner: Optional[JobRunner] = None
+        self._workers: Set[asyncio.Task] = set()
+        self._webhooks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._running = 0
+        notification_hub.subscribe(JOB_CHANNEL, self._on_notify)
+
+    # ------------------------------------------------------------------
+    # Submission and lookup
+    # ------------------------------------------------------------------
+
+    def validate_webhook_url(self, url: str) -> str:
+        """Only http(s) callbacks to configured hosts are allowed."""
+        parsed = urlparse(url)
+        allowed = {host.strip().lower() for host in self.settings.chat_job_webhook_hosts.split(",") if host.strip()}
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError("webhook_url must be an absolute http(s) URL")
+        if parsed.hostname.lower() not in allowed:
+            raise ValueError(f"webhook_url host '{parsed.hostname}' is not allowed")
+        return url
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        payload: Dict[str, Any],
+        webhook_url: Optional[str] = None
+    ) -> ChatJob:
+        """Store a queued job and wake a worker once it commits."""
+        pending = await db.scalar(
+            select(func.count(ChatJob.id)).where(
+                ChatJob.user_id == user_id,
+                ChatJob.status.in_((JOB_QUEUED, JOB_RUNNING))
+            )
+        )
+        if pending >= self.settings.chat_job_max_pending_per_user:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many pending chat jobs ({pending}); wait for one to finish"
+            )
+
+        job = ChatJob(user_id=user_id, status=JOB_QUEUED, request=payload, webhook_url=webhook_url)
+        db.add(job)
+        await db.flush()
+        await notification_hub.publish(db, JOB_CHANNEL, str(job.id))
+        await db.commit()
+        await db.refresh(job)
+
+        jobs_total.inc(event="submitted")
+        self._wakeup.set()
+        return job
+
+    async def get(self, db: AsyncSession, job_id: uuid.UUID, user_id: uuid.UUID) -> Optional[ChatJob]:
+        """A job, if it belongs to ``user_id``."""
+        result = await db.execute(
+            select(ChatJob).where(ChatJob.id == job_id, ChatJob.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    # ------------------------------------------------------------------
+    # Worker pool
+    # ------------------------------------------------------------------
+
+    async def start(self, runner: JobRunner):
+        """Start the worker pool; queued jobs from before a restart are picked up."""
+        if self._workers:
+            return
+        self._runner = runner
+        for n in range(self.settings.chat_job_workers):
+            self._spawn(self._worker(n))
+        self._spawn(self._sweep_stale())
+        self._wakeup.set()
+        logger.info("Chat job workers started", workers=self.settings.chat_job_workers, worker_id=self.worker_id)
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._workers.add(task)
+        task.add_done_callback(self._workers.discard)
+
+    async def stop(self):
+        """Cancel workers and hand this process's running jobs back to the queue."""
+        tasks = list(self._workers) + list(self._webhooks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            async with async_session_scope() as db:
+                result = await db.execute(
+                    update(ChatJob)
+                    .where(ChatJob.status == JOB_RUNNING, ChatJob.claimed_by == self.worker_id)
+                    .values(status=JOB_QUEUED, claimed_by=None, started_at=None)
+                )
+                await db.commit()
+            if result.rowcount:
+                jobs_total.inc(result.rowcount, event="requeued")
+                logger.info("Requeued running chat jobs on shutdown", count=result.rowcount)
+        except Exception as e:
+            logger.error("Failed to requeue running chat jobs", error=str(e))
+
+    async def _on_notify(self, payload: str):
+        self._wakeup.set()
+
+    async def _worker(self, n: int):
+        while True:
+            # Cleared before claiming: a submit that commits after this point
+            # sets it again, so no wakeup is lost
+            self._wakeup.clear()
+            try:
+                job_id = await self._claim()
+            except Exception as e:
+                logger.error("Failed to claim chat job", worker=n, error=str(e))
+                job_id = None
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.settings.chat_job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Another job may be waiting behind this one
+            self._wakeup.set()
+            await self._execute(job_id)
+
+    async def _claim(self) -> Optional[uuid.UUID]:
+        """Atomically move the oldest queued job to running for this worker."""
+        next_job = (
+            select(ChatJob.id)
+            .where(ChatJob.status == JOB_QUEUED)
+            .order_by(ChatJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with async_session_scope() as db:
+            result = await db.execute(
+                update(ChatJob)
+                .where(ChatJob.id == next_job)
+                .values(
+                    status=JOB_RUNNING,
+                    claimed_by=self.worker_id,
+                    started_at=func.now(),
+                    attempts=ChatJob.attempts + 1,
+                )
+                .returning(ChatJob.id)
+                .execution_options(synchronize_session=False)
+            )
+            job_id = result.scalar_one_or_none()
+            await db.commit()
+        return job_id
+
+    async def _execute(self, job_id: uuid.UUID):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self._running += 1
+        jobs_running.set(self._running)
+        try:
+            status, result, error, error_status = await self._run(job_id)
+        finally:
+            self._running -= 1
+            jobs_running.set(self._running)
+
+        try:
+            job = await self._finish(job_id, status, result, error, error_status)
+        except Exception as e:
+            logger.error("Failed to record chat job outcome", job_id=str(job_id), error=str(e))
+            return
+        if job is None:
+            logger.warning("Chat job was re-claimed by another worker; outcome dropped", job_id=str(job_id))
+            return
+
+        jobs_total.inc(event="retried" if status == JOB_QUEUED else status)
+        if status != JOB_QUEUED:
+            job_duration_seconds.observe(loop.time() - start, status=status)
+            logger.info("Chat job finished", job_id=str(job_id), status=status, error_status=error_status)
+            if job.webhook_url:
+                task = asyncio.ensure_future(self._deliver_webhook(job))
+                self._webhooks.add(task)
+                task.add_done_callback(self._webhooks.discard)
+
+    async def _run(self, job_id: uuid.UUID):
+        """Run the job's turn; returns ``(status, result, error, error_status)``."""
+        deadline = self.settings.chat_job_deadline
+        with deadline_scope(deadline, upstream_timeout=deadline):
+            async with async_session_scope() as db:
+                job = await db.get(ChatJob, job_id)
+                user = await db.get(User, job.user_id) if job else None
+                if job is None or user is None or not user.is_active:
+                    return JOB_FAILED, None, "User not found or inactive", 401
+
+                try:
+                    result = await self._runner(job.request, user, db)
+                    return JOB_SUCCEEDED, result, None, None
+                except HTTPException as e:
+                    await db.rollback()
+                    detail = e.detail if isinstance(e.detail, str) else json.dumps(e.detail, default=str)
+                    retry = (
+                        e.status_code in RETRYABLE_STATUSES
+                        and job.attempts < self.settings.chat_job_max_attempts
+                    )
+                    return (JOB_QUEUED if retry else JOB_FAILED), None, detail, e.status_code
+                except Exception as e:
+                    await db.rollback()
+                    logger.error("Chat job crashed", job_id=str(job_id), error=str(e))
+                    return JOB_FAILED, None, f"Chat error: {str(e)}", 500
+
+    async def _finish(self, job_id, status, result, error, error_status) -> Optional[ChatJob]:
+        """Settle a job this worker still owns; ``None`` if another worker has it."""
+        values = {"status": status, "result": result, "error": error, "error_status": error_status}
+        if status == JOB_QUEUED:
+            values.update(claimed_by=None, started_at=None)
+        else:
+            values["completed_at"] = func.now()
+
+        async with async_session_scope() as db:
+            # Only the claiming worker may settle the job (a stale sweep may
+            # have handed it to someone else meanwhile)
+            settled = await db.execute(
+                update(ChatJob)
+                .where(ChatJob.id == job_id, ChatJob.claimed_by == self.worker_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if not settled.rowcount:
+                await db.rollback()
+                return None
+            if status == JOB_QUEUED:
+                await notification_hub.publish(db, JOB_CHANNEL, str(job_id))
+            await db.commit()
+            return await db.get(ChatJob, job_id)
+
+    async def _sweep_stale(self):
+        """Requeue jobs whose worker died mid-run; fail them after too many attempts."""
+        while True:
+            try:
+                cutoff = datetime.now(timezone.utc) - timedelta(
+                    seconds=max(self.settings.chat_job_stale_after, self.settings.chat_job_deadline * 2)
+                )
+                stale = (ChatJob.status == JOB_RUNNING, ChatJob.started_at < cutoff)
+                async with async_session_scope() as db:
+                    await db.execute(
+                        update(ChatJob)
+                        .where(*stale, ChatJob.attempts >= self.settings.chat_job_max_attempts)
+                        .values(status=JOB_FAILED, error="Worker lost", completed_at=func.now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    result = await db.execute(
+                        update(ChatJob)
+                        .where(*stale)
+                        .values(status=JOB_QUEUED, claimed_by=None, started_at=None)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+                if result.rowcount:
+                    jobs_total.inc(result.rowcount, event="requeued")
+                    logger.warning("Requeued stale chat jobs", count=result.rowcount)
+                    self._wakeup.set()
+            except Exception as e:
+                logger.error("Stale chat job sweep failed", error=str(e))
+            await asyncio.sleep(STALE_SWEEP_INTERVAL)
+
+    # ------------------------------------------------------------------
+    # Webhooks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def to_payload(job: ChatJob) -> Dict[str, Any]:
+        return {
+            "job_id": str(job.id),
+            "status": job.status,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "completed_at": job.completed_at,
+            "attempts": job.attempts or 0,
+            "result": job.result,
+            "error": job.error,
+            "error_status": job.error_status,
+        }
+
+    async def _deliver_webhook(self, job: ChatJob):
+        body = json.dumps(self.to_payload(job), default=str)
+        async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT) as client:
+            for attempt in range(WEBHOOK_ATTEMPTS):
+                try:
+                    response = await client.post(
+                        job.webhook_url,
+                        content=body,
+                        headers={"Content-Type": "application/json"}
+                    )
+                    if response.status_code < 500:
+                        webhook_deliveries.inc(result="delivered" if response.is_success else "rejected")
+                        return
+                except httpx.HTTPError as e:
+                    logger.warning("Chat job webhook failed", job_id=str(job.id), attempt=attempt + 1, error=str(e))
+                await asyncio.sleep(2 ** attempt)
+        webhook_deliveries.inc(result="failed")
+
+
+# Global chat job service instance
+chat_job_service = ChatJobService()
@@ -0,0 +1,172 @@
+"""
+OpenAI-compatible LLM providers.
+
+Every backend we call speaks the OpenAI chat-completions API, so a provider
+is just a base URL, credentials, extra headers and the models it serves:
+
+- ``openrouter``: OpenRouter (the default, with its attribution headers)
+- ``openai``: any other OpenAI-compatible endpoint (vLLM, Together, ...)
+- ``local``: the local stand-in server used for load and chaos tests
+
+Providers without credentials are skipped, so with nothing configured the
+service falls back to mock responses as before.
+"""
+from typing import Dict, List, Optional
+import httpx
+import structlog
+
+from app.core.config import get_settings
+
+logger = structlog.get_logger(__name__)
+
+# Placeholder key shipped in example env files
+DEMO_API_KEY = "demo_openrouter_key"
+
+# Free OpenRouter models tried after the configured default and backup.
+# Free models get rate-limited upstream (429) often, so a wide chain keeps
+# chat alive without paid usage. Note: nemotron models are excluded — they
+# leak chain-of-thought into the response content, which breaks the
+# in-character illusion.
+OPENROUTER_FREE_FALLBACKS = [
+    "nousresearch/hermes-3-llama-3.1-405b:free",
+    "openai/gpt-oss-120b:free",
+    "google/gemma-4-31b-it:free",
+]
+
+# Upper bound per upstream call; shortened to the request deadline per call
+# (chat jobs replace it with their own deadline, see deadlines.upstream_timeout)
+REQUEST_TIMEOUT = 30.0
+
+
+class ProviderError(Exception):
+    """Non-success response from a provider."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429
+
+    @classmethod
+    def from_response(cls, provider: str, model: str, response: httpx.Response, body: str) -> "ProviderError":
+        retry_after = None
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            pass
+        return cls(
+            f"{provider} API error for model {model}: {response.status_code} - {body}",
+            status_code=response.status_code,
+            retry_after=retry_after
+        )
+
+
+def _split(raw: str) -> List[str]:
+    return [item.strip() for item in (raw or "").split(",") if item.strip()]
+
+
+class LLMProvider:
+    """One OpenAI-compatible chat-completions endpoint."""
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        base_url: str,
+        models: List[str],
+        api_key: str = "",
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.name = name
+        self.kind = kind
+        self.base_url = base_url
+        self.models = models
+        self.api_key = api_key
+        self.headers = headers or {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Content-Type": "application/json", **self.headers}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=REQUEST_TIMEOUT
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def __repr__(self):
+        return f"<LLMProvider(name='{self.name}', kind='{self.kind}', models={len(self.models)})>"
+
+
+class ProviderRegistry:
+    """Configured providers, in preference order."""
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers = providers
+
+    @classmethod
+    def from_settings(cls, settings=None) -> "ProviderRegistry":
+        settings = settings or get_settings()
+        providers = []
+
+        if settings.openrouter_api_key and settings.openrouter_api_key != DEMO_API_KEY:
+            models = [settings.default_ai_model, settings.backup_ai_model]
+            models += [m for m in OPENROUTER_FREE_FALLBACKS if m not in models]
+            providers.append(LLMProvider(
+                name="openrouter",
+                kind="openrouter",
+                base_url=settings.openrouter_base_url,
+                models=models,
+                api_key=settings.openrouter_api_key,
+                headers={
+                    "HTTP-Referer": settings.backend_url,
+                    "X-Title": "Histora - AI Historical Chat"
+                }
+            ))
+
+        if settings.openai_compatible_base_url and settings.openai_compatible_models:
+            providers.append(LLMProvider(
+                name=settings.openai_compatible_name,
+                kind="openai",
+                base_url=settings.openai_compatible_base_url,
+                models=_split(settings.openai_compatible_models),
+                api_key=settings.openai_compatible_api_key
+            ))
+
+        if settings.local_llm_base_url:
+            providers.append(LLMProvider(
+                name="local",
+                kind="local",
+                base_url=settings.local_llm_base_url,
+                models=_split(settings.local_llm_models) or [settings.default_ai_model]
+            ))
+
+        if providers:
+            logger.info("LLM providers configured", providers=[p.name for p in providers])
+        return cls(providers)
+
+    def get(self, name: str) -> Optional[LLMProvider]:
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    async def close(self):
+        for provider in self.providers:
+            await provider.close()
+
+
+# Global LLM provider registry instance
+llm_providers = ProviderRegistry.from_settings()
@@ -0,0 +1,174 @@
+"""
+Dispatch scheduler for outbound LLM calls.
+
+Each model gets a bulkhead: at most N calls in flight, the rest wait in a
+priority queue. Waiters are served by plan tier first (paying plans ahead
+of free, anonymous demo last) and round-robin across users within a tier,
+so one user's burst cannot starve others on the same plan. Queue waits are
+recorded per model and plan.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+import structlog
+
+from app.core.config import get_settings
+from app.core.deadlines import bounded_timeout
+from app.core.metrics import metrics
+
+logger = structlog.get_logger(__name__)
+
+# Lower value is served first
+PLAN_PRIORITY = {
+    "unlimited": 0,
+    "premium": 1,
+    "basic": 2,
+    "free": 3,
+    "demo": 4,
+}
+DEFAULT_PLAN = "free"
+
+queue_wait_seconds = metrics.histogram(
+    "histora_llm_queue_wait_seconds",
+    "Time LLM calls waited for a model slot",
+    ["model", "plan"],
+)
+queue_depth = metrics.gauge(
+    "histora_llm_queue_depth",
+    "LLM calls waiting for a model slot",
+    ["model"],
+)
+in_flight_calls = metrics.gauge(
+    "histora_llm_in_flight",
+    "LLM calls currently holding a model slot",
+    ["model"],
+)
+queue_timeouts = metrics.counter(
+    "histora_llm_queue_timeouts_total",
+    "LLM calls that gave up waiting for a model slot",
+    ["model", "plan"],
+)
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a call waits longer than the configured maximum for a slot."""
+    pass
+
+
+class _ModelLane:
+    """Concurrency limit and waiting queue for one model."""
+
+    def __init__(self, model: str, limit: int):
+        self.model = model
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        # priority -> user -> that user's waiters, users kept in round-robin order
+        self._tiers: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+
+    def enqueue(self, priority: int, user_key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        tier = self._tiers.setdefault(priority, OrderedDict())
+        tier.setdefault(user_key, deque()).append(future)
+        self.waiting += 1
+        return future
+
+    def discard(self, priority: int, user_key: str, future: asyncio.Future):
+        tier = self._tiers.get(priority)
+        waiters = tier.get(user_key) if tier else None
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self.waiting -= 1
+            if not waiters:
+                del tier[user_key]
+
+    def grant_next(self):
+        """Hand free slots to the next waiters: best tier, then next user in turn."""
+        while self.in_flight < self.limit and self.waiting:
+            for priority in sorted(self._tiers):
+                tier = self._tiers[priority]
+                if tier:
+                    break
+            else:
+                return
+            user_key, waiters = next(iter(tier.items()))
+            future = waiters.popleft()
+            self.waiting -= 1
+            if waiters:
+                tier.move_to_end(user_key)
+            else:
+                del tier[user_key]
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+
+class LLMScheduler:
+    """Per-model bulkheads with plan-aware, per-user fair queuing."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._limits = self._parse_overrides(self.settings.llm_model_concurrency_overrides)
+
+    @staticmethod
+    def _parse_overrides(raw: str) -> Dict[str, int]:
+        limits = {}
+        for item in (raw or "").split(","):
+            if "=" in item:
+                model, limit = item.rsplit("=", 1)
+                limits[model.strip()] = int(limit)
+        return limits
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            limit = self._limits.get(model, self.settings.llm_model_concurrency)
+            lane = self._lanes[model] = _ModelLane(model, limit)
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str, plan_type: Optional[str] = None, user_key: str = ""):
+        """Hold one of ``model``'s concurrency slots for the duration of the block."""
+        plan = plan_type if plan_type in PLAN_PRIORITY else DEFAULT_PLAN
+        lane = self._lane(model)
+        start = time.perf_counter()
+
+        if lane.in_flight < lane.limit and not lane.waiting:
+            lane.in_flight += 1
+        else:
+            priority = PLAN_PRIORITY[plan]
+            future = lane.enqueue(priority, user_key)
+            queue_depth.set(lane.waiting, model=model)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), bounded_timeout(self.settings.llm_queue_max_wait))
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as we gave up: pass the slot on
+                    lane.in_flight -= 1
+                    lane.grant_next()
+                else:
+                    future.cancel()
+                    lane.discard(priority, user_key, future)
+                queue_depth.set(lane.waiting, model=model)
+                if isinstance(e, asyncio.TimeoutError):
+                    queue_timeouts.inc(model=model, plan=plan)
+                    raise QueueTimeoutError(f"Timed out waiting for a {model} slot") from None
+                raise
+            queue_depth.set(lane.waiting, model=model)
+
+        queue_wait_seconds.observe(time.perf_counter() - start, model=model, plan=plan)
+        in_flight_calls.set(lane.in_flight, model=model)
+        try:
+            yield
+        finally:
+            lane.in_flight -= 1
+            lane.grant_next()
+            in_flight_calls.set(lane.in_flight, model=model)
+            queue_depth.set(lane.waiting, model=model)
+
+
+# Global LLM scheduler instance
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,307 @@
+"""
+Latency- and cost-aware routing across providers and models.
+
+Every (provider, model) pair keeps a rolling window of recent calls: time to
+first token and output throughput for streamed calls, whole-call time per
+output token for non-streamed ones, and failures. A request is classified as
+``light`` (short casual chat) or ``heavy`` (lesson/advisor mode, long
+prompts or long expected answers), and each route is scored in seconds:
+
+    expected latency (p90 TTFT + output tokens / median tokens/s, or for
+                      routes only called without streaming, output tokens
+                      x p90 whole-call seconds per token)
+    + expected cost in cents, converted at the profile's rate
+    - model quality, converted at the profile's rate
+    + error-rate penalty
+    - configured-order bonus (unmeasured routes only)
+
+Light requests weigh latency and price; heavy requests weigh quality.
+The lowest score goes first and the rest form the fallback chain. Routes
+rate-limited recently (429) move to the end until their cooldown ends.
+Routes without enough samples are scored with the fleet's median stats and
+get a bonus for their place in the configured order (DEFAULT_AI_MODEL, then
+BACKUP_AI_MODEL, then the free fallbacks), so before anything is measured the
+configured default wins light requests. A small share of requests goes to a random route first so stale or unknown
+routes keep getting measured.
+"""
+import random
+import statistics
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+import structlog
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.services.llm_providers import LLMProvider, ProviderRegistry, llm_providers
+from app.services.usage_service import UsageService
+
+logger = structlog.get_logger(__name__)
+
+PROFILE_LIGHT = "light"
+PROFILE_HEAVY = "heavy"
+
+HEAVY_MODES = {"lesson", "advisor"}
+LONG_MESSAGE_CHARS = 400
+LONG_ANSWER_TOKENS = 600
+
+# Seconds-equivalents per unit, by profile
+PROFILE_WEIGHTS = {
+    PROFILE_LIGHT: {"latency": 1.0, "cents": 10.0, "quality": 0.5},
+    PROFILE_HEAVY: {"latency": 0.25, "cents": 2.0, "quality": 5.0},
+}
+ERROR_PENALTY_SECONDS = 20.0
+DEFAULT_QUALITY = 2.0
+
+# Seconds-equivalent bonus for the first configured route while unmeasured;
+# the route at position i gets CONFIGURED_ORDER_BONUS / (i + 1)
+CONFIGURED_ORDER_BONUS = 3.0
+
+# Assumed for routes without enough samples when no route has any yet
+DEFAULT_TTFT = 1.5
+DEFAULT_TOKENS_PER_SECOND = 40.0
+MIN_SAMPLES = 3
+
+# Share of requests whose first choice is a random route (exploration)
+EXPLORE_RATE = 0.05
+
+# Assumed price for paid models missing from UsageService.model_pricing
+UNKNOWN_PRICE_PER_1K = 1.0
+
+RATE_LIMIT_COOLDOWN = 30.0
+WINDOW_SIZE = 200
+OUTCOME_WINDOW = 50
+
+route_decisions = metrics.counter(
+    "histora_llm_route_decisions_total",
+    "First-choice route picked by the model router",
+    ["profile", "provider", "model"],
+)
+route_ttft_p90 = metrics.gauge(
+    "histora_llm_route_ttft_p90_seconds",
+    "Rolling p90 time to first token per route",
+    ["provider", "model"],
+)
+route_throughput_p50 = metrics.gauge(
+    "histora_llm_route_tokens_per_second_p50",
+    "Rolling median output tokens per second per route",
+    ["provider", "model"],
+)
+route_error_rate = metrics.gauge(
+    "histora_llm_route_error_rate",
+    "Share of failed calls among recent calls per route",
+    ["provider", "model"],
+)
+
+
+class Route(NamedTuple):
+    provider: LLMProvider
+    model: str
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class RouteStats:
+    """Rolling latency, throughput and outcome window for one route."""
+
+    def __init__(self):
+        self.ttft: Deque[float] = deque(maxlen=WINDOW_SIZE)
+        self.throughput: Deque[float] = deque(maxlen=WINDOW_SIZE)
+        # Non-streamed calls: no first fragment, so only total time per output token
+        self.call_seconds_per_token: Deque[float] = deque(maxlen=WINDOW_SIZE)
+        self.outcomes: Deque[bool] = deque(maxlen=OUTCOME_WINDOW)
+        self.cooldown_until = 0.0
+
+    @property
+    def streamed(self) -> bool:
+        return len(self.ttft) >= MIN_SAMPLES and len(self.throughput) >= MIN_SAMPLES
+
+    @property
+    def measured(self) -> bool:
+        return self.streamed or len(self.call_seconds_per_token) >= MIN_SAMPLES
+
+    def ttft_p90(self, prior: float = DEFAULT_TTFT) -> float:
+        if len(self.ttft) < MIN_SAMPLES:
+            return prior
+        return _percentile(list(self.ttft), 0.9)
+
+    def throughput_p50(self, prior: float = DEFAULT_TOKENS_PER_SECOND) -> float:
+        if len(self.throughput) < MIN_SAMPLES:
+            return prior
+        return max(1.0, _percentile(list(self.throughput), 0.5))
+
+    def latency(self, output_tokens: int, ttft_prior: float, throughput_prior: float) -> float:
+        """Expected seconds until the whole answer has arrived."""
+        if not self.streamed and len(self.call_seconds_per_token) >= MIN_SAMPLES:
+            return max(1, output_tokens) * _percentile(list(self.call_seconds_per_token), 0.9)
+        return self.ttft_p90(ttft_prior) + output_tokens / self.throughput_p50(throughput_prior)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class ModelRouter:
+    """Orders (provider, model) routes per request from live stats and price."""
+
+    def __init__(self, registry: ProviderRegistry):
+        self.registry = registry
+        self.settings = get_settings()
+        self.pricing = UsageService().model_pricing
+        self.quality = self._parse_quality(self.settings.llm_model_quality)
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+
+    @staticmethod
+    def _parse_quality(raw: str) -> Dict[str, float]:
+        scores = {}
+        for item in (raw or "").split(","):
+            if "=" in item:
+                model, score = item.rsplit("=", 1)
+                scores[model.strip()] = float(score)
+        return scores
+
+    def _route_stats(self, route: Route) -> RouteStats:
+        key = (route.provider.name, route.model)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = RouteStats()
+        return stats
+
+    @property
+    def available(self) -> bool:
+        return bool(self.registry.providers)
+
+    def routes(self) -> List[Route]:
+        return [Route(p, m) for p in self.registry.providers for m in p.models]
+
+    @staticmethod
+    def classify(mode: str, message: str, expected_output_tokens: int = 0) -> str:
+        if (
+            mode in HEAVY_MODES
+            or len(message) >= LONG_MESSAGE_CHARS
+            or expected_output_tokens >= LONG_ANSWER_TOKENS
+        ):
+            return PROFILE_HEAVY
+        return PROFILE_LIGHT
+
+    def price_cents(self, route: Route, input_tokens: int, output_tokens: int) -> float:
+        """Expected cost of one call in cents (local and ``:free`` models cost nothing)."""
+        if route.provider.kind == "local" or route.model.endswith(":free"):
+            return 0.0
+        pricing = self.pricing.get(route.model)
+        if pricing is None:
+            rate_in = rate_out = UNKNOWN_PRICE_PER_1K
+        else:
+            rate_in, rate_out = pricing["input_cost_per_1k"], pricing["output_cost_per_1k"]
+        return input_tokens / 1000 * rate_in + output_tokens / 1000 * rate_out
+
+    def _priors(self) -> Tuple[float, float]:
+        """Median TTFT and throughput across streamed routes, for unmeasured ones."""
+        measured = [stats for stats in self._stats.values() if stats.streamed]
+        if not measured:
+            return DEFAULT_TTFT, DEFAULT_TOKENS_PER_SECOND
+        return (
+            statistics.median(stats.ttft_p90() for stats in measured),
+            statistics.median(stats.throughput_p50() for stats in measured),
+        )
+
+    def score(
+        self,
+        route: Route,
+        profile: str,
+        input_tokens: int,
+        output_tokens: int,
+        priors: Optional[Tuple[float, float]] = None,
+        position: Optional[int] = None
+    ) -> float:
+        """Lower is better; in seconds-equivalents.
+        
+        ``position`` is the route's place in the configured order, rewarded
+        until the route has enough samples to be scored on its own.
+        """
+        weights = PROFILE_WEIGHTS[profile]
+        stats = self._route_stats(route)
+        latency = stats.latency(output_tokens, *(priors or self._priors()))
+        bonus = 0.0
+        if position is not None and not stats.measured:
+            bonus = CONFIGURED_ORDER_BONUS / (position + 1)
+        return (
+            weights["latency"] * latency
+            + weights["cents"] * self.price_cents(route, input_tokens, output_tokens)
+            - weights["quality"] * self.quality.get(route.model, DEFAULT_QUALITY)
+            + ERROR_PENALTY_SECONDS * stats.error_rate()
+            - bonus
+        )
+
+    def plan(self, profile: str, input_tokens: int, output_tokens: int) -> List[Route]:
+        """All routes, best first; routes cooling down after a 429 go last."""
+        now = time.monotonic()
+        priors = self._priors()
+        routes = self.routes()
+        positions = {route: position for position, route in enumerate(routes)}
+        ranked = sorted(
+            routes,
+            key=lambda route: (
+                self._route_stats(route).cooldown_until > now,
+                self.score(route, profile, input_tokens, output_tokens, priors, positions[route]),
+            )
+        )
+        ready = [route for route in ranked if self._route_stats(route).cooldown_until <= now]
+        if len(ready) > 1 and random.random() < EXPLORE_RATE:
+            explored = random.choice(ready[1:])
+            ranked.remove(explored)
+            ranked.insert(0, explored)
+        if ranked:
+            route_decisions.inc(profile=profile, provider=ranked[0].provider.name, model=ranked[0].model)
+        return ranked
+
+    def observe_success(self, route: Route, duration: float, output_tokens: int, ttft: Optional[float] = None):
+        """Record a completed call; ``ttft`` only when a first fragment was streamed."""
+        stats = self._route_stats(route)
+        if ttft is not None:
+            stats.ttft.append(ttft)
+            if output_tokens and duration - ttft > 0.05:
+                stats.throughput.append(output_tokens / (duration - ttft))
+        elif output_tokens:
+            stats.call_seconds_per_token.append(duration / output_tokens)
+        stats.outcomes.append(True)
+        self._export(route, stats)
+
+    def observe_failure(self, route: Route, rate_limited: bool = False, retry_after: Optional[float] = None):
+        stats = self._route_stats(route)
+        stats.outcomes.append(False)
+        if rate_limited:
+            stats.cooldown_until = time.monotonic() + (retry_after or RATE_LIMIT_COOLDOWN)
+        self._export(route, stats)
+
+    @staticmethod
+    def _export(route: Route, stats: RouteStats):
+        labels = {"provider": route.provider.name, "model": route.model}
+        route_ttft_p90.set(stats.ttft_p90(), **labels)
+        route_throughput_p50.set(stats.throughput_p50(), **labels)
+        route_error_rate.set(stats.error_rate(), **labels)
+
+    def snapshot(self) -> List[Dict]:
+        """Current per-route stats, for diagnostics."""
+        return [
+            {
+                "provider": provider,
+                "model": model,
+                "samples": len(stats.ttft),
+                "non_streamed_samples": len(stats.call_seconds_per_token),
+                "ttft_p90": round(stats.ttft_p90(), 3),
+                "tokens_per_second_p50": round(stats.throughput_p50(), 1),
+                "error_rate": round(stats.error_rate(), 3),
+                "cooling_down": stats.cooldown_until > time.monotonic(),
+            }
+            for (provider, model), stats in self._stats.items()
+        ]
+
+
+# Global model router instance
+model_router = ModelRouter(llm_providers)
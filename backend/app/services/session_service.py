@@ -4,11 +4,12 @@ Chat session management service.
 
 import uuid
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, func, and_, desc
 from sqlalchemy.orm import selectinload
 
+from app.core.tracing import traced
 from app.models.database import ChatSession, ChatMessage as DBChatMessage, User, Character
 import structlog
 
@@ -17,6 +18,7 @@ logger = structlog.get_logger(__name__)
 class SessionService:
     """Service for managing chat sessions and messages."""
     
+    @traced("session.create_session")
     async def create_session(
         self,
         db_session: AsyncSession,
@@ -68,6 +70,7 @@ class SessionService:
             logger.error("Failed to create chat session", error=str(e))
             raise
     
+    @traced("session.get_session")
     async def get_session(
         self,
         db_session: AsyncSession,
@@ -93,6 +96,7 @@ class SessionService:
             logger.error("Failed to get chat session", error=str(e))
             return None
     
+    @traced("session.get_user_sessions")
     async def get_user_sessions(
         self,
         db_session: AsyncSession,
@@ -104,11 +108,8 @@ class SessionService:
         """Get user's chat sessions."""
         
         try:
-            query = (
-                select(ChatSession)
-                .options(selectinload(ChatSession.character))
-                .where(ChatSession.user_id == user_id)
-            )
+            # Character names come from the in-memory registry, no join needed
+            query = select(ChatSession).where(ChatSession.user_id == user_id)
             
             if active_only:
                 query = query.where(ChatSession.is_active == True)
@@ -126,6 +127,7 @@ class SessionService:
             logger.error("Failed to get user sessions", error=str(e))
             return []
     
+    @traced("session.add_message")
     async def add_message(
         self,
         db_session: AsyncSession,
@@ -181,6 +183,91 @@ class SessionService:
             logger.error("Failed to add message", error=str(e))
             raise
     
+    @traced("session.add_messages")
+    async def add_messages(
+        self,
+        db_session: AsyncSession,
+        session_id: uuid.UUID,
+        messages: List[Dict[str, Any]]
+    ) -> List[DBChatMessage]:
+        """Add several messages to a session in one transaction.
+        
+        Each dict takes ``add_message``'s keyword arguments (``role``,
+        ``content``, ...). Messages keep their list order.
+        """
+        
+        try:
+            # One transaction would give every row the same now(); space the
+            # timestamps so ordering by created_at keeps the list order
+            base_time = datetime.now(timezone.utc)
+            rows = [
+                DBChatMessage(
+                    id=uuid.uuid4(),
+                    session_id=session_id,
+                    role=message["role"],
+                    content=message["content"],
+                    model_used=message.get("model_used"),
+                    response_time=message.get("response_time"),
+                    context_used=message.get("context_used"),
+                    message_metadata=message.get("metadata"),
+                    created_at=base_time + timedelta(microseconds=i)
+                )
+                for i, message in enumerate(messages)
+            ]
+            
+            db_session.add_all(rows)
+            
+            await db_session.execute(
+                update(ChatSession)
+                .where(ChatSession.id == session_id)
+                .values(
+                    message_count=ChatSession.message_count + len(rows),
+                    updated_at=func.now()
+                )
+            )
+            
+            await db_session.commit()
+            
+            logger.info(
+                "Added messages to session",
+                session_id=str(session_id),
+                count=len(rows)
+            )
+            
+            return rows
+        
+        except Exception as e:
+            await db_session.rollback()
+            logger.error("Failed to add messages", error=str(e))
+            raise
+    
+    @traced("session.get_recent_messages")
+    async def get_recent_messages(
+        self,
+        db_session: AsyncSession,
+        session_id: uuid.UUID,
+        limit: int = 10
+    ) -> List[DBChatMessage]:
+        """Get a session's newest messages, oldest first.
+        
+        The caller must have checked that the session belongs to the user.
+        """
+        
+        try:
+            result = await db_session.execute(
+                select(DBChatMessage)
+                .where(DBChatMessage.session_id == session_id)
+                .order_by(desc(DBChatMessage.created_at))
+                .limit(limit)
+            )
+            
+            return list(reversed(result.scalars().all()))
+            
+        except Exception as e:
+            logger.error("Failed to get recent messages", error=str(e))
+            return []
+    
+    @traced("session.get_session_messages")
     async def get_session_messages(
         self,
         db_session: AsyncSession,
@@ -212,6 +299,7 @@ class SessionService:
             logger.error("Failed to get session messages", error=str(e))
             return []
     
+    @traced("session.update_session_title")
     async def update_session_title(
         self,
         db_session: AsyncSession,
@@ -250,6 +338,7 @@ class SessionService:
             logger.error("Failed to update session title", error=str(e))
             return False
     
+    @traced("session.deactivate_session")
     async def deactivate_session(
         self,
         db_session: AsyncSession,
@@ -283,6 +372,7 @@ class SessionService:
             logger.error("Failed to deactivate session", error=str(e))
             return False
     
+    @traced("session.delete_session")
     async def delete_session(
         self,
         db_session: AsyncSession,
@@ -320,6 +410,7 @@ class SessionService:
             logger.error("Failed to delete session", error=str(e))
             return False
     
+    @traced("session.get_session_stats")
     async def get_session_stats(
         self,
         db_session: AsyncSession,
@@ -2,6 +2,7 @@
 Token counting and credit management service.
 """
 import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,10 +14,18 @@ from app.models.database import (
     ChatSession, ChatMessage
 )
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.tokenizer_service import tokenizer_service
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+credit_deduction_seconds = metrics.histogram(
+    "histora_credit_deduction_seconds",
+    "Latency of recording usage and deducting credits, including the commit",
+    ["outcome"],
+)
+
 class TokenCreditService:
     """Service for managing tokens and credits."""
     
@@ -36,9 +45,8 @@ class TokenCreditService:
         self.db = db_session
     
     async def count_tokens(self, text: str, model: str = "gemini-2.0-flash") -> int:
-        """Count tokens in text (simplified approximation)."""
-        # Simple token counting - in production, use tiktoken or model-specific tokenizer
-        return len(text.split()) * 1.3  # Rough approximation
+        """Count tokens in text with the model family's tokenizer."""
+        return tokenizer_service.count(text, model)
     
     async def calculate_credits_needed(
         self, 
@@ -65,70 +73,85 @@ class TokenCreditService:
         session_id: Optional[str] = None,
         message_id: Optional[str] = None,
         user_message_length: Optional[int] = None,
-        ai_response_length: Optional[int] = None
+        ai_response_length: Optional[int] = None,
+        credits: Optional[int] = None
     ) -> UserUsage:
-        """Record token usage and deduct credits."""
-        
-        total_tokens = input_tokens + output_tokens
-        credits_needed = await self.calculate_credits_needed(input_tokens, output_tokens, model)
-        
-        # Check user's credit balance
-        user = await self.db.execute(select(User).where(User.id == user_id))
-        user = user.scalar_one_or_none()
-        
-        if not user:
-            raise ValueError(f"User {user_id} not found")
-        
-        if user.credits < credits_needed:
-            raise ValueError(f"Insufficient credits. Need {credits_needed}, have {user.credits}")
-        
-        # Deduct credits from user
-        user.credits -= credits_needed
-        user.total_credits_used += credits_needed
-        user.total_tokens += total_tokens
-        
-        # Record usage
-        usage = UserUsage(
-            user_id=user_id,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            total_tokens=total_tokens,
-            credits_used=credits_needed,
-            model_name=model,
-            request_type=request_type,
-            character_id=character_id,
-            session_id=session_id,
-            message_id=message_id,
-            user_message_length=user_message_length,
-            ai_response_length=ai_response_length
-        )
+        """Record token usage and deduct credits.
         
-        self.db.add(usage)
+        ``credits`` replaces the price at ``model``'s rates, for usage that
+        spans several models (a debate round).
+        """
         
-        # Record credit transaction
-        credit_transaction = CreditTransaction(
-            user_id=user_id,
-            transaction_type="usage",
-            amount=-credits_needed,
-            balance_after=user.credits,
-            chat_session_id=session_id,
-            character_id=character_id,
-            tokens_consumed=total_tokens,
-            description=f"Token usage: {total_tokens} tokens ({model})"
-        )
-        
-        self.db.add(credit_transaction)
-        await self.db.commit()
-        
-        logger.info(
-            "Usage recorded",
-            user_id=user_id,
-            tokens=total_tokens,
-            credits_used=credits_needed,
-            remaining_credits=user.credits
-        )
-        
-        return usage
+        start_time = time.perf_counter()
+        outcome = "error"
+        try:
+            total_tokens = input_tokens + output_tokens
+            if credits is None:
+                credits_needed = await self.calculate_credits_needed(input_tokens, output_tokens, model)
+            else:
+                credits_needed = credits
+            
+            # Check user's credit balance
+            user = await self.db.execute(select(User).where(User.id == user_id))
+            user = user.scalar_one_or_none()
+            
+            if not user:
+                raise ValueError(f"User {user_id} not found")
+            
+            if user.credits < credits_needed:
+                outcome = "insufficient"
+                raise ValueError(f"Insufficient credits. Need {credits_needed}, have {user.credits}")
+            
+            # Deduct credits from user
+            user.credits -= credits_needed
+            user.total_credits_used += credits_needed
+            user.total_tokens += total_tokens
+            
+            # Record usage
+            usage = UserUsage(
+                user_id=user_id,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=total_tokens,
+                credits_used=credits_needed,
+                model_name=model,
+                request_type=request_type,
+                character_id=character_id,
+                session_id=session_id,
+                message_id=message_id,
+                user_message_length=user_message_length,
+                ai_response_length=ai_response_length
+            )
+            
+            self.db.add(usage)
+            
+            # Record credit transaction
+            credit_transaction = CreditTransaction(
+                user_id=user_id,
+                transaction_type="usage",
+                amount=-credits_needed,
+                balance_after=user.credits,
+                chat_session_id=session_id,
+                character_id=character_id,
+                tokens_consumed=total_tokens,
+                description=f"Token usage: {total_tokens} tokens ({model})"
+            )
+            
+            self.db.add(credit_transaction)
+            await self.db.commit()
+            
+            logger.info(
+                "Usage recorded",
+                user_id=user_id,
+                tokens=total_tokens,
+                credits_used=credits_needed,
+                remaining_credits=user.credits
+            )
+            
+            outcome = "ok"
+            return usage
+        finally:
+            credit_deduction_seconds.observe(time.perf_counter() - start_time, outcome=outcome)
     
     async def add_credits(
         self,
@@ -0,0 +1,178 @@
+"""
+Token counting with the model family's own BPE vocabulary.
+
+Tokenizers are loaded lazily from local Hugging Face ``tokenizer.json``
+files (``<tokenizer_directory>/<family>.json``), so counting never touches
+the network. Counts are kept in an LRU cache because the same strings
+(system prompts above all) are counted on every request. Without the
+``tokenizers`` package or a vocab file, a character-based estimate is used;
+it is far closer than a word count for agglutinative Turkish text.
+"""
+import math
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import structlog
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # optional dependency
+    Tokenizer = None
+
+logger = structlog.get_logger(__name__)
+
+# Model id substring -> tokenizer family, first match wins
+# ("hermes-3-llama" is a llama model, so llama is checked first)
+MODEL_FAMILIES = (
+    ("llama", "llama"),
+    ("deepseek", "deepseek"),
+    ("qwen", "qwen"),
+    ("mistral", "mistral"),
+    ("gemma", "gemma"),
+    ("gemini", "gemma"),
+    ("gpt", "gpt"),
+)
+DEFAULT_FAMILY = "default"
+
+# Fallback estimate when no vocabulary is available
+FALLBACK_CHARS_PER_TOKEN = 3.3
+
+# Chat template overhead per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+billing_token_source = metrics.counter(
+    "histora_billing_token_source_total",
+    "Billed requests by where their token counts came from (provider, local)",
+    ["source"],
+)
+
+
+class TokenizerService:
+    """Per-family BPE token counter with an LRU count cache."""
+
+    def __init__(self, directory: str, cache_size: int = 4096):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._tokenizers: Dict[str, Optional[Any]] = {}
+        self._cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Tokenizer loading
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def family_for(model: Optional[str]) -> str:
+        name = (model or "").lower()
+        for pattern, family in MODEL_FAMILIES:
+            if pattern in name:
+                return family
+        return DEFAULT_FAMILY
+
+    def _load(self, family: str):
+        if Tokenizer is None:
+            return None
+        for candidate in (family, DEFAULT_FAMILY):
+            path = os.path.join(self.directory, f"{candidate}.json")
+            if os.path.exists(path):
+                try:
+                    tokenizer = Tokenizer.from_file(path)
+                    logger.info("Tokenizer loaded", family=family, path=path)
+                    return tokenizer
+                except Exception as e:
+                    logger.error("Failed to load tokenizer", family=family, path=path, error=str(e))
+        return None
+
+    def _tokenizer(self, family: str):
+        if family not in self._tokenizers:
+            self._tokenizers[family] = self._load(family)
+            if self._tokenizers[family] is None:
+                logger.warning("No tokenizer vocabulary; estimating token counts", family=family)
+        return self._tokenizers[family]
+
+    # ------------------------------------------------------------------
+    # Counting
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _estimate(text: str) -> int:
+        return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN) if text else 0
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[int]:
+        count = self._cache.get(key)
+        if count is not None:
+            self._cache.move_to_end(key)
+        return count
+
+    def _store(self, key: Tuple[str, str], count: int):
+        self._cache[key] = count
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        """Number of tokens ``text`` encodes to for ``model``."""
+        if not text:
+            return 0
+        family = self.family_for(model)
+        key = (family, text)
+        count = self._cached(key)
+        if count is None:
+            tokenizer = self._tokenizer(family)
+            if tokenizer is None:
+                count = self._estimate(text)
+            else:
+                count = len(tokenizer.encode(text, add_special_tokens=False).ids)
+            self._store(key, count)
+        return count
+
+    def count_batch(self, texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+        """Token counts for many strings; cache misses are encoded in one batch."""
+        family = self.family_for(model)
+        counts: List[Optional[int]] = [0 if not text else self._cached((family, text)) for text in texts]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            tokenizer = self._tokenizer(family)
+            if tokenizer is None:
+                encoded = [self._estimate(texts[i]) for i in missing]
+            else:
+                batch = tokenizer.encode_batch([texts[i] for i in missing], add_special_tokens=False)
+                encoded = [len(encoding.ids) for encoding in batch]
+            for i, count in zip(missing, encoded):
+                counts[i] = count
+                self._store((family, texts[i]), count)
+        return counts
+
+    def count_messages(self, texts: Iterable[str], model: Optional[str] = None) -> int:
+        """Prompt size of a chat request (message contents plus template overhead)."""
+        texts = list(texts)
+        return sum(self.count_batch(texts, model)) + MESSAGE_OVERHEAD_TOKENS * len(texts)
+
+    def resolve_usage(
+        self,
+        usage: Optional[Dict[str, Any]],
+        model: Optional[str],
+        prompt_texts: Iterable[str],
+        completion: str,
+    ) -> Tuple[int, int, str]:
+        """(input_tokens, output_tokens, source) for billing.
+
+        Provider-reported usage is authoritative; local counts of what was
+        sent and received are the fallback.
+        """
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens")
+            completion_tokens = usage.get("completion_tokens")
+            if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+                billing_token_source.inc(source="provider")
+                return prompt_tokens, completion_tokens, "provider"
+
+        billing_token_source.inc(source="local")
+        return self.count_messages(prompt_texts, model), self.count(completion, model), "local"
+
+
+_settings = get_settings()
+
+# Global tokenizer service instance
+tokenizer_service = TokenizerService(_settings.tokenizer_directory, _settings.tokenizer_cache_size)
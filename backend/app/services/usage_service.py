@@ -3,7 +3,7 @@ Token usage tracking and billing service.
 """
 import uuid
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
@@ -31,6 +31,10 @@ class UsageService:
                 "input_cost_per_1k": 0,  # Free model
                 "output_cost_per_1k": 0
             },
+            "google/gemini-2.0-flash-001": {
+                "input_cost_per_1k": 0.01,  # $0.10 per 1M tokens
+                "output_cost_per_1k": 0.04
+            },
             "meta-llama/llama-3.1-70b-instruct": {
                 "input_cost_per_1k": 88,  # $0.88 per 1K tokens
                 "output_cost_per_1k": 88
@@ -73,6 +77,17 @@ class UsageService:
             }
         }
     
+    def calculate_cost(self, model_name: str, input_tokens: int, output_tokens: int) -> Tuple[int, int]:
+        """Input and output cost in cents at the model's pricing."""
+        pricing = self.model_pricing.get(model_name, {
+            "input_cost_per_1k": 0,
+            "output_cost_per_1k": 0
+        })
+        
+        input_cost = int((input_tokens / 1000) * pricing["input_cost_per_1k"])
+        output_cost = int((output_tokens / 1000) * pricing["output_cost_per_1k"])
+        return input_cost, output_cost
+    
     async def track_usage(
         self,
         db_session: AsyncSession,
@@ -82,20 +97,18 @@ class UsageService:
         model_name: str,
         request_type: str = "chat",
         character_id: Optional[str] = None,
-        session_id: Optional[uuid.UUID] = None
+        session_id: Optional[uuid.UUID] = None,
+        cost: Optional[Tuple[int, int]] = None
     ) -> Dict[str, Any]:
-        """Track token usage for a user."""
+        """Track token usage for a user.
+        
+        ``cost`` is a precomputed ``(input_cost, output_cost)`` for usage that
+        spans several models; otherwise ``model_name``'s pricing is used.
+        """
         try:
             total_tokens = input_tokens + output_tokens
             
-            # Calculate costs
-            pricing = self.model_pricing.get(model_name, {
-                "input_cost_per_1k": 0,
-                "output_cost_per_1k": 0
-            })
-            
-            input_cost = int((input_tokens / 1000) * pricing["input_cost_per_1k"])
-            output_cost = int((output_tokens / 1000) * pricing["output_cost_per_1k"])
+            input_cost, output_cost = cost or self.calculate_cost(model_name, input_tokens, output_tokens)
             total_cost = input_cost + output_cost
             
             # Create usage record
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Data-layer micro-benchmarks with data-size scaling curves.
+
+For each scale N a fresh user is seeded with N chat sessions (each with
+``--messages-per-session`` messages), one deep session of N x
+``--deep-factor`` messages, and matching usage and credit-transaction rows.
+Each service method is then timed against that user:
+
+    SessionService.add_message / get_session_messages (offset 0, middle, end)
+    SessionService.get_user_sessions (first and last page) / get_session_stats
+    SessionService.delete_session
+    TokenCreditService.record_usage / UsageService.get_user_usage_stats
+
+Scales are seeded cumulatively into the same tables, so larger scales also
+run against bigger tables. The slope of log(time) against log(N) is reported
+per method: ~0 means the query is index-bound, ~1 means it scans the user's
+data. ``--baseline`` compares with an earlier run and exits non-zero on a
+regression.
+
+Runs against TEST_DATABASE_URL unless ``--database-url`` is given; use a
+disposable database.
+
+Usage:
+    python scripts/bench_data_layer.py --scales 100,1000,10000 --messages-per-session 100
+    python scripts/bench_data_layer.py --output bench.json --baseline bench-main.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import get_settings
+from app.data.characters_seed import CHARACTERS
+from app.models.database import (
+    Base, Character, ChatMessage, ChatSession, CreditTransaction, User, UserUsage
+)
+from app.services.session_service import SessionService
+from app.services.token_service import TokenCreditService
+from app.services.usage_service import UsageService
+
+INSERT_CHUNK = 5000
+MODEL = "google/gemini-2.0-flash-001"
+TEXTS = [
+    "Merhaba, bugün sizinle tarih hakkında konuşmak istiyorum.",
+    "Cumhuriyetin kuruluş yıllarında en büyük zorluk neydi?",
+    "Bilim, bir milletin ilerlemesi için en önemli rehberdir.",
+    "What advice would you give to young people today?",
+    "Education is the most powerful tool for changing society.",
+]
+
+# Slope increase or top-scale slowdown that counts as a regression
+MAX_SLOPE_INCREASE = 0.25
+MAX_SLOWDOWN = 1.5
+
+
+def as_url(raw: str) -> str:
+    if raw.startswith("postgresql://"):
+        return raw.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return raw
+
+
+async def bulk_insert(db: AsyncSession, model, rows: List[dict]):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        await db.execute(insert(model), rows[start:start + INSERT_CHUNK])
+
+
+async def ensure_characters(db: AsyncSession) -> List[str]:
+    existing = set((await db.execute(select(Character.id))).scalars())
+    missing = [
+        {"id": c["id"], "name": c["name"], "category": c["category"], "is_published": True}
+        for c in CHARACTERS if c["id"] not in existing
+    ]
+    if missing:
+        await bulk_insert(db, Character, missing)
+        await db.commit()
+    return [c["id"] for c in CHARACTERS]
+
+
+async def seed_scale(db: AsyncSession, scale: int, args, characters: List[str]) -> Dict:
+    """Seed one user at ``scale`` sessions; returns the ids the benchmarks need."""
+    now = datetime.now(timezone.utc)
+    user_id = uuid.uuid4()
+    await bulk_insert(db, User, [{
+        "id": user_id,
+        "email": f"bench-{scale}-{user_id.hex[:8]}@example.com",
+        "full_name": f"Bench {scale}",
+        "credits": 10 ** 9,
+    }])
+
+    # Scale sessions, the deep session, and victims for delete_session
+    victims = args.repeat + args.warmup
+    session_ids = [uuid.uuid4() for _ in range(scale + 1 + victims)]
+    deep_session_id = session_ids[scale]
+    victim_ids = session_ids[scale + 1:]
+    message_counts = {sid: args.messages_per_session for sid in session_ids}
+    message_counts[deep_session_id] = scale * args.deep_factor
+
+    sessions, messages, usage, transactions = [], [], [], []
+    for i, session_id in enumerate(session_ids):
+        character_id = random.choice(characters)
+        started = now - timedelta(days=random.uniform(0, 90))
+        sessions.append({
+            "id": session_id, "user_id": user_id, "character_id": character_id,
+            "title": f"Session {i}", "message_count": message_counts[session_id],
+            "created_at": started, "updated_at": started,
+        })
+        for j in range(message_counts[session_id]):
+            messages.append({
+                "id": uuid.uuid4(), "session_id": session_id,
+                "role": "user" if j % 2 == 0 else "assistant",
+                "content": random.choice(TEXTS),
+                "created_at": started + timedelta(seconds=j * 30),
+            })
+            if j % 2:
+                used_at = started + timedelta(seconds=j * 30)
+                usage.append({
+                    "id": uuid.uuid4(), "user_id": user_id, "date": used_at, "created_at": used_at,
+                    "input_tokens": 400, "output_tokens": 150, "total_tokens": 550,
+                    "credits_used": 70, "total_cost": 1, "model_name": MODEL,
+                    "character_id": character_id, "session_id": session_id,
+                })
+                transactions.append({
+                    "id": uuid.uuid4(), "user_id": user_id, "transaction_type": "usage",
+                    "amount": -70, "balance_after": 10 ** 9, "chat_session_id": session_id,
+                    "character_id": character_id, "tokens_consumed": 550, "created_at": used_at,
+                })
+        if len(messages) >= INSERT_CHUNK * 10:
+            await flush_seed(db, sessions, messages, usage, transactions)
+
+    await flush_seed(db, sessions, messages, usage, transactions)
+    await db.commit()
+    return {
+        "user_id": user_id,
+        "session_ids": session_ids[:scale],
+        "deep_session_id": deep_session_id,
+        "deep_messages": message_counts[deep_session_id],
+        "victim_ids": victim_ids,
+    }
+
+
+async def flush_seed(db: AsyncSession, sessions, messages, usage, transactions):
+    """Insert buffered rows in FK order and clear the buffers."""
+    for model, rows in ((ChatSession, sessions), (ChatMessage, messages), (UserUsage, usage), (CreditTransaction, transactions)):
+        await bulk_insert(db, model, rows)
+        rows.clear()
+
+
+def benchmarks(ctx: Dict, scale: int) -> Dict[str, Callable[[AsyncSession, int], Awaitable]]:
+    sessions = SessionService()
+    usage = UsageService()
+    user_id = ctx["user_id"]
+    deep, deep_messages = ctx["deep_session_id"], ctx["deep_messages"]
+    target = ctx["session_ids"][0]
+
+    return {
+        "add_message": lambda db, i: sessions.add_message(db, target, "user", random.choice(TEXTS)),
+        "get_session_messages@0": lambda db, i: sessions.get_session_messages(db, deep, user_id, limit=50),
+        "get_session_messages@mid": lambda db, i: sessions.get_session_messages(
+            db, deep, user_id, limit=50, offset=deep_messages // 2
+        ),
+        "get_session_messages@end": lambda db, i: sessions.get_session_messages(
+            db, deep, user_id, limit=50, offset=max(0, deep_messages - 50)
+        ),
+        "get_user_sessions@first": lambda db, i: sessions.get_user_sessions(db, user_id, limit=20),
+        "get_user_sessions@last": lambda db, i: sessions.get_user_sessions(
+            db, user_id, limit=20, offset=max(0, scale - 20)
+        ),
+        "get_session_stats": lambda db, i: sessions.get_session_stats(db, user_id),
+        "record_usage": lambda db, i: TokenCreditService(db).record_usage(
+            str(user_id), 400, 150, MODEL, session_id=str(target)
+        ),
+        "get_user_usage_stats": lambda db, i: usage.get_user_usage_stats(db, user_id),
+        "delete_session": lambda db, i: sessions.delete_session(db, ctx["victim_ids"][i], user_id),
+    }
+
+
+async def time_method(session_factory, method: Callable, repeat: int, warmup: int) -> Dict:
+    timings = []
+    for i in range(warmup + repeat):
+        async with session_factory() as db:
+            start_time = time.perf_counter()
+            await method(db, i)
+            elapsed = time.perf_counter() - start_time
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[min(len(timings) - 1, math.ceil(0.95 * len(timings)) - 1)] * 1000, 3),
+    }
+
+
+def slope(scales: List[int], times: List[float]) -> float:
+    """Least-squares slope of log(time) against log(scale)."""
+    xs = [math.log(s) for s in scales]
+    ys = [math.log(max(t, 1e-6)) for t in times]
+    x_mean, y_mean = statistics.mean(xs), statistics.mean(ys)
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    if not denominator:
+        return 0.0
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / denominator
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    regressions = []
+    for name, curve in results["methods"].items():
+        previous = baseline.get("methods", {}).get(name)
+        if not previous:
+            continue
+        if curve["slope"] - previous["slope"] > MAX_SLOPE_INCREASE:
+            regressions.append(f"{name}: slope {previous['slope']} -> {curve['slope']}")
+        top = str(max(results["scales"]))
+        if top in curve["points"] and top in previous["points"]:
+            before, after = previous["points"][top]["median_ms"], curve["points"][top]["median_ms"]
+            if before and after / before > MAX_SLOWDOWN:
+                regressions.append(f"{name}: {before}ms -> {after}ms at N={top}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None, help="Target database (default: TEST_DATABASE_URL)")
+    parser.add_argument("--scales", default="100,1000,10000", help="Sessions per benchmark user, comma-separated")
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--deep-factor", type=int, default=10, help="Deep session holds N x this many messages")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per method and scale")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to check for regressions")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scales = sorted(int(s) for s in args.scales.split(","))
+    database_url = as_url(args.database_url or get_settings().test_database_url)
+    engine = create_async_engine(database_url, pool_size=5)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    print(f"🗄️  Target: {database_url.split('@')[-1]}")
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as db:
+        characters = await ensure_characters(db)
+
+    points: Dict[str, Dict[str, Dict]] = {}
+    for scale in scales:
+        start_time = time.perf_counter()
+        async with session_factory() as db:
+            ctx = await seed_scale(db, scale, args, characters)
+        print(f"🌱 N={scale}: seeded in {time.perf_counter() - start_time:.1f}s "
+              f"({scale} sessions, deep session {ctx['deep_messages']} messages)")
+
+        for name, method in benchmarks(ctx, scale).items():
+            result = await time_method(session_factory, method, args.repeat, args.warmup)
+            points.setdefault(name, {})[str(scale)] = result
+            print(f"   {name:<28} median {result['median_ms']:>9}ms  p95 {result['p95_ms']:>9}ms")
+
+    await engine.dispose()
+
+    results = {
+        "scales": scales,
+        "messages_per_session": args.messages_per_session,
+        "deep_factor": args.deep_factor,
+        "methods": {
+            name: {
+                "points": curve,
+                "slope": round(slope(scales, [curve[str(s)]["median_ms"] for s in scales]), 2),
+            }
+            for name, curve in points.items()
+        },
+    }
+
+    print("\n📈 Scaling (slope of log time vs log N; ~0 index-bound, ~1 linear):")
+    for name, curve in results["methods"].items():
+        line = "  ".join(f"{curve['points'][str(s)]['median_ms']:>9}" for s in scales)
+        print(f"   {name:<28} {line}   slope {curve['slope']:+.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No scaling regressions against baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Login-throughput benchmark: bcrypt on the event loop vs. the bounded worker pool.
+
+Simulates a burst of concurrent logins (one bcrypt verification each) and
+reports throughput plus how long the event loop was stalled, which is what
+every other request on the worker experiences during the burst.
+
+Usage:
+    python scripts/bench_password_hashing.py --logins 64 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+from app.services.auth_service import auth_service
+
+
+async def _heartbeat(interval: float, lags: list, stop: asyncio.Event):
+    """Measure event-loop responsiveness while logins are running."""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_mode(mode: str, password: str, hashed: str, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            if mode == "inline":
+                ok = auth_service.verify_password(password, hashed)
+            else:
+                ok = await auth_service.verify_password_async(password, hashed)
+            assert ok
+
+    lags: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_heartbeat(0.005, lags, stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_s": round(logins / elapsed, 1),
+        "loop_lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1) if lags else 0.0,
+        "loop_lag_max_ms": round(lags[-1] * 1000, 1) if lags else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=64, help="Total logins to simulate")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent login requests")
+    args = parser.parse_args()
+
+    password = "benchmark-password"
+    hashed = auth_service.hash_password(password)
+
+    print(f"🔐 bcrypt workers: {auth_service.settings.password_hash_workers}")
+    for mode in ("inline", "pooled"):
+        result = await run_mode(mode, password, hashed, args.logins, args.concurrency)
+        print(
+            f"   {result['mode']:>6}: {result['logins_per_s']:>7} logins/s  "
+            f"elapsed {result['elapsed_s']}s  "
+            f"loop lag p50 {result['loop_lag_p50_ms']}ms / max {result['loop_lag_max_ms']}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenRouter chat-completions API.
+
+Serves ``POST /api/v1/chat/completions`` (plain JSON and SSE streaming) with
+configurable latency, throughput and fault injection, so the whole stack
+can be load- and chaos-tested with no network. The ``usage`` block is
+counted with the backend's own tokenizers, so billing sees the same numbers
+a real provider would report for the generated text.
+
+Point the backend at it with:
+    LOCAL_LLM_BASE_URL=http://localhost:8787/api/v1 LOCAL_LLM_MODELS=local/fast,local/strong
+
+Usage:
+    python scripts/fake_openrouter.py --port 8787 --ttft-ms 600 --tps 45 \\
+        --rate-429 0.05 --rate-5xx 0.02 --retry-after 3
+
+Fault rates can be changed while it runs (for chaos tests):
+    curl -X POST localhost:8787/_control -d '{"rate_5xx": 0.5}'
+and counters are at ``GET /_stats``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List, Optional
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "fake-openrouter-secret")
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+from app.services.tokenizer_service import tokenizer_service
+
+WORDS = (
+    "tarih bilgi devlet millet halk bilim akıl sevgi hoşgörü erdem eğitim gençler "
+    "cumhuriyet özgürlük barış yol hikmet kalp insan toplum gelecek geçmiş düşünce "
+    "adalet vatan kültür sanat dil kitap öğretmen öğrenci zaman emek umut, ve ile "
+    "için ama çünkü bu şu her daima asla belki elbette gerçekten."
+).split()
+
+
+@dataclass
+class FaultConfig:
+    """Latency, throughput and fault settings (all changeable at runtime)."""
+    ttft_ms: float = 600.0            # median time to first token
+    latency_dist: str = "lognormal"   # fixed | uniform | exponential | lognormal
+    latency_sigma: float = 0.5        # lognormal sigma / uniform half-width ratio
+    tps: float = 45.0                 # output tokens per second
+    output_tokens: int = 180          # mean completion length
+    rate_429: float = 0.0             # share of requests rejected with 429
+    rate_5xx: float = 0.0             # share of requests failing with 500/502/503
+    rate_stream_abort: float = 0.0    # share of streams cut off mid-answer
+    retry_after: float = 2.0          # Retry-After seconds sent with 429/503
+
+
+class FakeOpenRouter:
+    """Request handling and counters for the fake API."""
+
+    def __init__(self, config: FaultConfig, seed: Optional[int] = None):
+        self.config = config
+        self.random = random.Random(seed)
+        self.stats: Dict[str, int] = {
+            "requests": 0, "streams": 0, "ok": 0, "rate_limited": 0,
+            "server_errors": 0, "stream_aborts": 0, "completion_tokens": 0,
+        }
+
+    def sample_ttft(self) -> float:
+        median = self.config.ttft_ms / 1000
+        dist = self.config.latency_dist
+        if dist == "fixed":
+            return median
+        if dist == "uniform":
+            spread = median * self.config.latency_sigma
+            return max(0.0, self.random.uniform(median - spread, median + spread))
+        if dist == "exponential":
+            return self.random.expovariate(math.log(2) / median) if median > 0 else 0.0
+        return self.random.lognormvariate(math.log(max(median, 1e-6)), self.config.latency_sigma)
+
+    def completion_words(self, messages: List[dict], max_tokens: int) -> List[str]:
+        """Deterministic per prompt, about ``output_tokens`` tokens long."""
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).digest()
+        rng = random.Random(digest)
+        target = max(1, int(rng.gauss(self.config.output_tokens, self.config.output_tokens / 4)))
+        # Stop at the requested max_tokens as a real model would
+        target = min(target, max_tokens)
+        words = [rng.choice(WORDS).capitalize()]
+        tokens = tokenizer_service.count(words[0])
+        while tokens < target:
+            words.append(rng.choice(WORDS))
+            tokens += tokenizer_service.count(" " + words[-1])
+        return words
+
+    def usage(self, messages: List[dict], content: str, model: str) -> dict:
+        prompt_tokens = tokenizer_service.count_messages([m.get("content") or "" for m in messages], model)
+        completion_tokens = tokenizer_service.count(content, model)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def injected_fault(self) -> Optional[JSONResponse]:
+        roll = self.random.random()
+        if roll < self.config.rate_429:
+            self.stats["rate_limited"] += 1
+            return self._error(429, "Rate limit exceeded: free-models-per-min")
+        if roll < self.config.rate_429 + self.config.rate_5xx:
+            self.stats["server_errors"] += 1
+            code = self.random.choice((500, 502, 503))
+            return self._error(code, "Provider returned error")
+        return None
+
+    def _error(self, code: int, message: str) -> JSONResponse:
+        headers = {}
+        if code in (429, 503):
+            headers["Retry-After"] = str(int(math.ceil(self.config.retry_after)))
+        return JSONResponse({"error": {"code": code, "message": message}}, status_code=code, headers=headers)
+
+    async def complete(self, body: dict):
+        self.stats["requests"] += 1
+        fault = self.injected_fault()
+        if fault is not None:
+            return fault
+
+        model = body.get("model") or "local/fake"
+        messages = body.get("messages") or []
+        words = self.completion_words(messages, int(body.get("max_tokens") or 2048))
+        completion_id = f"gen-{uuid.uuid4().hex[:24]}"
+        ttft = self.sample_ttft()
+
+        if body.get("stream"):
+            self.stats["streams"] += 1
+            return StreamingResponse(
+                self._stream(completion_id, model, messages, words, ttft),
+                media_type="text/event-stream",
+            )
+
+        content = " ".join(words)
+        usage = self.usage(messages, content, model)
+        await asyncio.sleep(ttft + usage["completion_tokens"] / self.config.tps)
+        self.stats["ok"] += 1
+        self.stats["completion_tokens"] += usage["completion_tokens"]
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    async def _stream(self, completion_id: str, model: str, messages: List[dict], words: List[str], ttft: float):
+        def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        # OpenRouter sends keep-alive comments while the model warms up
+        waited = 0.0
+        while waited + 1.0 < ttft:
+            await asyncio.sleep(1.0)
+            waited += 1.0
+            yield ": OPENROUTER PROCESSING\n\n"
+        await asyncio.sleep(ttft - waited)
+
+        abort_at = None
+        if self.random.random() < self.config.rate_stream_abort:
+            abort_at = self.random.randrange(len(words))
+
+        sent = []
+        for i, word in enumerate(words):
+            if i == abort_at:
+                self.stats["stream_aborts"] += 1
+                error = {"error": {"code": 502, "message": "Upstream connection lost"}}
+                yield f"data: {json.dumps(error)}\n\n"
+                return
+            text = word if i == 0 else " " + word
+            sent.append(text)
+            yield chunk({"role": "assistant", "content": text} if i == 0 else {"content": text})
+            await asyncio.sleep(tokenizer_service.count(text, model) / self.config.tps)
+
+        content = "".join(sent)
+        usage = self.usage(messages, content, model)
+        self.stats["ok"] += 1
+        self.stats["completion_tokens"] += usage["completion_tokens"]
+        yield chunk({}, finish_reason="stop", usage=usage)
+        yield "data: [DONE]\n\n"
+
+
+def create_app(fake: FakeOpenRouter) -> FastAPI:
+    app = FastAPI(title="Fake OpenRouter", docs_url=None, redoc_url=None)
+
+    @app.post("/api/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        return await fake.complete(await request.json())
+
+    @app.get("/api/v1/models")
+    async def models():
+        return {"data": [{"id": "local/fast"}, {"id": "local/strong"}]}
+
+    @app.get("/_stats")
+    async def stats():
+        return {"stats": fake.stats, "config": asdict(fake.config)}
+
+    @app.post("/_control")
+    async def control(request: Request):
+        """Change fault settings at runtime; unknown keys are rejected."""
+        updates = await request.json()
+        known = {f.name: f.type for f in fields(FaultConfig)}
+        unknown = set(updates) - set(known)
+        if unknown:
+            return JSONResponse({"detail": f"Unknown settings: {sorted(unknown)}"}, status_code=422)
+        for key, value in updates.items():
+            setattr(fake.config, key, value if key == "latency_dist" else float(value))
+        return asdict(fake.config)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and fault sampling")
+    defaults = FaultConfig()
+    for f in fields(FaultConfig):
+        parser.add_argument(
+            f"--{f.name.replace('_', '-')}",
+            type=str if f.name == "latency_dist" else type(getattr(defaults, f.name)),
+            default=getattr(defaults, f.name),
+        )
+    args = parser.parse_args()
+
+    config = FaultConfig(**{f.name: getattr(args, f.name) for f in fields(FaultConfig)})
+    print(f"🧪 Fake OpenRouter on http://{args.host}:{args.port}/api/v1  {asdict(config)}")
+    uvicorn.run(create_app(FakeOpenRouter(config, seed=args.seed)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+High-volume synthetic dataset generator for benchmarks.
+
+Produces realistic users, chat sessions, messages (Turkish and English),
+usage records and credit transactions, streamed into Postgres with COPY
+from parallel worker processes. Activity is skewed the way production is:
+sessions per user follow a Pareto distribution (a few power users hold most
+of the history), characters are picked by Zipf popularity with featured
+characters first, and session lengths are log-normal.
+
+Each worker owns disjoint batches of users and copies a batch's rows in
+foreign-key order, so batches commit independently. ``--defer-indexes``
+drops secondary indexes first and rebuilds them once at the end, which is
+much faster for large loads. Row contents are deterministic for a given
+``--seed``; emails get a per-run suffix so several runs can be stacked.
+
+Runs against TEST_DATABASE_URL unless ``--database-url`` is given.
+
+Usage:
+    python scripts/generate_dataset.py --users 200000 --messages 50000000 --workers 8 --defer-indexes
+    python scripts/generate_dataset.py --users 1000 --messages 100000 --truncate
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "dataset-generator-secret")
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import get_settings
+from app.data.characters_seed import CHARACTERS
+from app.models.database import (
+    ChatMessage, ChatSession, CreditTransaction, User, UserUsage
+)
+from app.services.token_service import TokenCreditService
+from app.services.usage_service import UsageService
+
+MODEL = "google/gemini-2.0-flash-001"
+PRICING = UsageService().model_pricing[MODEL]
+CREDIT_RATES = TokenCreditService.TOKEN_TO_CREDIT_RATIO["default"]
+SYSTEM_PROMPT_TOKENS = 320
+CHARS_PER_TOKEN = 4
+SIGNUP_CREDITS = 100
+CREDIT_PACK = 1000
+
+TABLES = [User, ChatSession, ChatMessage, UserUsage, CreditTransaction]
+
+USER_COLUMNS = (
+    "id", "email", "display_name", "full_name", "role", "is_admin", "is_active", "email_verified",
+    "credits", "total_credits_purchased", "total_credits_used", "total_tokens",
+    "language_preference", "timezone", "created_at", "updated_at",
+)
+SESSION_COLUMNS = (
+    "id", "user_id", "character_id", "title", "language", "mode", "is_active",
+    "message_count", "created_at", "updated_at",
+)
+MESSAGE_COLUMNS = ("id", "session_id", "role", "content", "model_used", "response_time", "created_at")
+USAGE_COLUMNS = (
+    "id", "user_id", "date", "input_tokens", "output_tokens", "total_tokens", "credits_used",
+    "input_cost", "output_cost", "total_cost", "model_name", "request_type", "request_duration",
+    "character_id", "session_id", "message_id", "user_message_length", "ai_response_length",
+    "context_chunks_used", "created_at",
+)
+TRANSACTION_COLUMNS = (
+    "id", "user_id", "transaction_type", "amount", "balance_after", "payment_amount",
+    "payment_provider", "chat_session_id", "character_id", "tokens_consumed", "package_name",
+    "description", "created_at",
+)
+
+FIRST_NAMES = {
+    "tr": ["Ayşe", "Mehmet", "Zeynep", "Mustafa", "Elif", "Ahmet", "Fatma", "Emre", "Selin", "Burak"],
+    "en": ["Emma", "James", "Olivia", "Liam", "Sophia", "Noah", "Ava", "Lucas", "Mia", "Ethan"],
+}
+LAST_NAMES = {
+    "tr": ["Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Aydın", "Öztürk", "Arslan", "Doğan"],
+    "en": ["Smith", "Johnson", "Brown", "Taylor", "Wilson", "Davies", "Evans", "Clarke", "Hughes", "Wright"],
+}
+QUESTIONS = {
+    "tr": [
+        "Hayatınızın en zor dönemi hangisiydi?",
+        "Gençlere ne tavsiye edersiniz?",
+        "Bu kararı verirken neler hissettiniz?",
+        "Bilim ile sanat arasındaki ilişkiyi nasıl görüyorsunuz?",
+        "Sizi en çok kim etkiledi?",
+        "Bugünün dünyasını görseydiniz ne düşünürdünüz?",
+        "Başarının sırrı nedir sizce?",
+        "Bana o günleri biraz anlatır mısınız?",
+    ],
+    "en": [
+        "What was the hardest period of your life?",
+        "What advice would you give to young people?",
+        "How did you feel when you made that decision?",
+        "How do you see the relationship between science and art?",
+        "Who influenced you the most?",
+        "What would you think of today's world?",
+        "What is the secret of success, in your view?",
+        "Could you tell me more about those days?",
+    ],
+}
+ANSWER_SENTENCES = {
+    "tr": [
+        "Bu soruyu sormanız beni çok mutlu etti.",
+        "O yıllar hem zor hem de umut doluydu.",
+        "İnsan ancak bilgiyle ve emekle ilerleyebilir.",
+        "Gençliğe güvenim her zaman sonsuzdu.",
+        "Her büyük iş, küçük ama kararlı adımlarla başlar.",
+        "Hata yapmaktan korkmamak gerekir, önemli olan ondan ders almaktır.",
+        "Hayatta en hakiki mürşit ilimdir.",
+        "Kendi yolunuzu bulmak için önce kendinizi tanımalısınız.",
+        "O dönemde pek çok insanın desteğini gördüm.",
+        "Zorluklar insanı olgunlaştırır ve güçlendirir.",
+    ],
+    "en": [
+        "I am glad you asked me that question.",
+        "Those years were both difficult and full of hope.",
+        "Progress only comes through knowledge and hard work.",
+        "I always had great faith in the young.",
+        "Every great undertaking starts with small but determined steps.",
+        "One should not fear mistakes; what matters is learning from them.",
+        "Curiosity has always been my most faithful companion.",
+        "To find your own path, you must first know yourself.",
+        "Many people supported me during that time.",
+        "Hardship shapes a person and makes them stronger.",
+    ],
+}
+MODES = (("chat", 0.85), ("advisor", 0.1), ("lesson", 0.05))
+CHARACTER_NAMES = {c["id"]: c["name"] for c in CHARACTERS}
+
+# Per-process state set up by the pool initializer
+_worker: Dict = {}
+
+
+def as_dsn(raw: str) -> str:
+    return raw.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def fast_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def zipf_weights(n: int, exponent: float) -> List[float]:
+    return [1 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+def plan_sessions(users: int, sessions: int, alpha: float, seed: int) -> List[int]:
+    """Sessions per user, Pareto-skewed, summing to about ``sessions``."""
+    rng = random.Random(seed)
+    weights = [rng.paretovariate(alpha) for _ in range(users)]
+    scale = sessions / sum(weights)
+    return [max(1, round(w * scale)) for w in weights]
+
+
+def credits_for(input_tokens: int, output_tokens: int) -> int:
+    return max(1, int(input_tokens * CREDIT_RATES["input"] + output_tokens * CREDIT_RATES["output"]))
+
+
+def generate_batch(batch_index: int, first_user: int, session_counts: List[int], config: Dict) -> Dict[str, List[Tuple]]:
+    """All rows for one batch of users, ready for COPY."""
+    rng = random.Random(config["seed"] * 1_000_003 + batch_index)
+    now = config["now"]
+    characters, character_weights = config["characters"], config["character_weights"]
+    rows: Dict[str, List[Tuple]] = {"users": [], "sessions": [], "messages": [], "usage": [], "transactions": []}
+
+    for offset, session_count in enumerate(session_counts):
+        index = first_user + offset
+        language = "tr" if rng.random() < config["tr_share"] else "en"
+        user_id = fast_uuid(rng)
+        joined = now - timedelta(days=rng.uniform(1, config["days"]))
+        first, last = rng.choice(FIRST_NAMES[language]), rng.choice(LAST_NAMES[language])
+
+        used_credits = total_tokens = 0
+        user_usage, user_spend = [], []
+        for _ in range(session_count):
+            session_id = fast_uuid(rng)
+            character_id = rng.choices(characters, character_weights)[0]
+            mode = rng.choices([m for m, _ in MODES], [w for _, w in MODES])[0]
+            started = joined + timedelta(seconds=rng.uniform(0, (now - joined).total_seconds()))
+            turns = max(1, min(config["max_turns"], int(rng.lognormvariate(config["turn_mu"], 0.8))))
+            at = started
+            for turn in range(turns):
+                question = rng.choice(QUESTIONS[language])
+                answer = " ".join(rng.choices(ANSWER_SENTENCES[language], k=rng.randint(2, 6)))
+                at += timedelta(seconds=rng.uniform(10, 120))
+                rows["messages"].append((fast_uuid(rng), session_id, "user", question, None, None, at))
+                response_ms = rng.randint(600, 6000)
+                at += timedelta(milliseconds=response_ms)
+                message_id = fast_uuid(rng)
+                rows["messages"].append((message_id, session_id, "assistant", answer, MODEL, response_ms, at))
+
+                if rng.random() < config["billing_share"]:
+                    input_tokens = SYSTEM_PROMPT_TOKENS + turn * 60 + len(question) // CHARS_PER_TOKEN
+                    output_tokens = max(1, len(answer) // CHARS_PER_TOKEN)
+                    credits = credits_for(input_tokens, output_tokens)
+                    input_cost = int(input_tokens / 1000 * PRICING["input_cost_per_1k"])
+                    output_cost = int(output_tokens / 1000 * PRICING["output_cost_per_1k"])
+                    used_credits += credits
+                    total_tokens += input_tokens + output_tokens
+                    user_usage.append((
+                        fast_uuid(rng), user_id, at, input_tokens, output_tokens, input_tokens + output_tokens,
+                        credits, input_cost, output_cost, input_cost + output_cost, MODEL, "chat", response_ms,
+                        character_id, session_id, message_id, len(question), len(answer), 0, at,
+                    ))
+                    user_spend.append((at, -credits, session_id, character_id, input_tokens + output_tokens))
+
+            rows["sessions"].append((
+                session_id, user_id, character_id, f"{CHARACTER_NAMES[character_id]} ile Sohbet"
+                if language == "tr" else f"Chat with {CHARACTER_NAMES[character_id]}",
+                language, mode, rng.random() < 0.3, turns * 2, started, at,
+            ))
+
+        # Credits: signup bonus, packs bought as needed, then usage in time order
+        packs = max(0, math.ceil((used_credits - SIGNUP_CREDITS) / CREDIT_PACK))
+        purchased = packs * CREDIT_PACK
+        balance = SIGNUP_CREDITS
+        rows["transactions"].append((
+            fast_uuid(rng), user_id, "bonus", SIGNUP_CREDITS, balance, None, None, None, None, None, None,
+            "Signup bonus", joined,
+        ))
+        if purchased:
+            balance += purchased
+            rows["transactions"].append((
+                fast_uuid(rng), user_id, "purchase", purchased, balance, packs * 9900, "stripe",
+                None, None, None, "Popular", f"{packs} x {CREDIT_PACK} credits", joined + timedelta(minutes=5),
+            ))
+        for at, amount, session_id, character_id, tokens in sorted(user_spend, key=lambda spend: spend[0]):
+            balance += amount
+            rows["transactions"].append((
+                fast_uuid(rng), user_id, "usage", amount, balance, None, None, session_id, character_id,
+                tokens, None, f"Token usage: {tokens} tokens ({MODEL})", at,
+            ))
+        rows["usage"].extend(user_usage)
+
+        rows["users"].append((
+            user_id, f"user{index}-{config['tag']}@example.com", first, f"{first} {last}", "user", False,
+            True, rng.random() < 0.7, balance, purchased, used_credits, total_tokens, language,
+            "Europe/Istanbul" if language == "tr" else "Europe/London", joined, now,
+        ))
+    return rows
+
+
+def _init_worker(dsn: str):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    connection = loop.run_until_complete(asyncpg.connect(dsn))
+    loop.run_until_complete(connection.execute("SET synchronous_commit = off"))
+    _worker.update(loop=loop, connection=connection)
+
+
+async def _copy_batch(connection, rows: Dict[str, List[Tuple]]):
+    async with connection.transaction():
+        for table, key, columns in (
+            ("users", "users", USER_COLUMNS),
+            ("chat_sessions", "sessions", SESSION_COLUMNS),
+            ("chat_messages", "messages", MESSAGE_COLUMNS),
+            ("user_usage", "usage", USAGE_COLUMNS),
+            ("credit_transactions", "transactions", TRANSACTION_COLUMNS),
+        ):
+            if rows[key]:
+                await connection.copy_records_to_table(table, records=rows[key], columns=columns)
+
+
+def run_batch(task) -> Dict[str, int]:
+    batch_index, first_user, session_counts, config = task
+    rows = generate_batch(batch_index, first_user, session_counts, config)
+    _worker["loop"].run_until_complete(_copy_batch(_worker["connection"], rows))
+    return {key: len(value) for key, value in rows.items()}
+
+
+def secondary_indexes():
+    return [index for model in TABLES for index in model.__table__.indexes]
+
+
+async def prepare(dsn: str, args) -> List[str]:
+    """Check tables, make sure characters exist, optionally truncate and drop indexes."""
+    connection = await asyncpg.connect(dsn)
+    try:
+        for model in TABLES:
+            if not await connection.fetchval("SELECT to_regclass($1)", model.__tablename__):
+                raise SystemExit(f"Table {model.__tablename__} is missing; run the app once (or migrations) first")
+        existing = {row["id"] for row in await connection.fetch("SELECT id FROM characters")}
+        missing = [(c["id"], c["name"], c["category"], True, c.get("is_featured", False))
+                   for c in CHARACTERS if c["id"] not in existing]
+        if missing:
+            await connection.copy_records_to_table(
+                "characters", records=missing, columns=("id", "name", "category", "is_published", "is_featured")
+            )
+        if args.truncate:
+            tables = ", ".join(model.__tablename__ for model in TABLES)
+            await connection.execute(f"TRUNCATE {tables} CASCADE")
+            print("🧹 Truncated target tables")
+        if args.defer_indexes:
+            for index in secondary_indexes():
+                await connection.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+            print("⏸️  Dropped secondary indexes")
+    finally:
+        await connection.close()
+    # Featured characters first, so they get the largest Zipf weights
+    ordered = sorted(CHARACTERS, key=lambda c: not c.get("is_featured", False))
+    return [c["id"] for c in ordered]
+
+
+async def finish(dsn: str, args):
+    connection = await asyncpg.connect(dsn)
+    try:
+        if args.defer_indexes:
+            start_time = time.perf_counter()
+            for index in secondary_indexes():
+                await connection.execute(str(CreateIndex(index).compile(dialect=postgresql.dialect())))
+            print(f"🔨 Rebuilt secondary indexes in {time.perf_counter() - start_time:.1f}s")
+        for model in TABLES:
+            await connection.execute(f"ANALYZE {model.__tablename__}")
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=None, help="Target database (default: TEST_DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Approximate total chat messages")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-users", type=int, default=500, help="Users per COPY transaction")
+    parser.add_argument("--mean-turns", type=float, default=6.0, help="Mean user/assistant pairs per session")
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--power-alpha", type=float, default=1.3, help="Pareto shape for sessions per user (lower = more skew)")
+    parser.add_argument("--character-skew", type=float, default=1.1, help="Zipf exponent for character popularity")
+    parser.add_argument("--tr-share", type=float, default=0.8, help="Share of Turkish-speaking users")
+    parser.add_argument("--billing-share", type=float, default=1.0, help="Share of replies with usage/credit rows")
+    parser.add_argument("--days", type=int, default=365, help="History span")
+    parser.add_argument("--truncate", action="store_true", help="Empty the target tables first")
+    parser.add_argument("--defer-indexes", action="store_true", help="Drop secondary indexes and rebuild after loading")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    dsn = as_dsn(args.database_url or get_settings().test_database_url)
+    print(f"🗄️  Target: {dsn.split('@')[-1]}")
+    characters = asyncio.run(prepare(dsn, args))
+
+    # Log-normal with sigma 0.8: mu chosen so the mean is --mean-turns
+    turn_mu = math.log(args.mean_turns) - 0.8 ** 2 / 2
+    sessions = max(args.users, round(args.messages / (2 * args.mean_turns)))
+    session_counts = plan_sessions(args.users, sessions, args.power_alpha, args.seed)
+    config = {
+        "seed": args.seed,
+        "tag": f"{args.seed}-{uuid.uuid4().hex[:6]}",
+        "now": datetime.now(timezone.utc),
+        "characters": characters,
+        "character_weights": zipf_weights(len(characters), args.character_skew),
+        "tr_share": args.tr_share,
+        "billing_share": args.billing_share,
+        "days": args.days,
+        "turn_mu": turn_mu,
+        "max_turns": args.max_turns,
+    }
+    tasks = [
+        (i, start, session_counts[start:start + args.batch_users], config)
+        for i, start in enumerate(range(0, args.users, args.batch_users))
+    ]
+    top = sorted(session_counts, reverse=True)[:max(1, args.users // 100)]
+    print(f"🎲 {args.users} users, ~{sessions} sessions (top 1% hold {sum(top) / sum(session_counts):.0%}), "
+          f"{len(tasks)} batches on {args.workers} workers")
+
+    totals = {"users": 0, "sessions": 0, "messages": 0, "usage": 0, "transactions": 0}
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(dsn,)) as pool:
+        for done, counts in enumerate(pool.imap_unordered(run_batch, tasks), start=1):
+            for key, value in counts.items():
+                totals[key] += value
+            elapsed = time.perf_counter() - start_time
+            rows = sum(totals.values())
+            print(f"\r   {done}/{len(tasks)} batches, {totals['messages']:,} messages, "
+                  f"{rows / elapsed:,.0f} rows/s", end="", flush=True)
+    print()
+
+    asyncio.run(finish(dsn, args))
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Done in {elapsed:.1f}s: " + ", ".join(f"{value:,} {key}" for key, value in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the chat API with per-route latency percentiles.
+
+Virtual users loop over a weighted mix of scenarios for a fixed duration:
+
+- ``demo``: anonymous demo chat, history kept client-side
+- ``chat``: authenticated multi-turn chat in one session
+- ``browse``: session list, message history, usage stats and quota
+- ``admin``: admin dashboard stats and the user list
+
+By default the app runs in-process (httpx ASGI transport, real lifespan)
+against the configured Postgres, with the LLM upstream pointed at
+``scripts/fake_openrouter.py``; that mode also reports DB pool wait time
+and checked-out connections. ``--base-url`` drives a running instance
+instead. Results are written as JSON so runs can be compared across commits.
+
+Usage:
+    python scripts/fake_openrouter.py --ttft-ms 400 --tps 60 &
+    python scripts/load_test.py --users 50 --duration 60 --mix demo=4,chat=3,browse=2,admin=1
+    python scripts/load_test.py --users 50 --duration 60 --compare load-results/<previous>.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "load-test-secret")
+
+import httpx
+
+API = "/api/v1"
+DEMO_API_KEY = "demo_openrouter_key"
+DEFAULT_ADMIN_KEY = "load-test-admin-key"
+PASSWORD = "load-test-password"
+
+MESSAGES = [
+    "Merhaba, bugün neler düşünüyorsunuz?",
+    "Gençlere en önemli tavsiyeniz nedir?",
+    "Hayatınızdaki en zor karar hangisiydi?",
+    "Bilim ve sanat hakkında ne düşünüyorsunuz?",
+    "What would you change about the world today?",
+    "Tell me about the people who influenced you the most.",
+    "Eğitim neden bu kadar önemli?",
+    "Bana kısa bir hikaye anlatır mısınız?",
+]
+
+
+class Recorder:
+    """Per-route latencies and status codes."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = True
+
+    def record(self, route: str, elapsed: float, status: str, failed: bool):
+        if not self.recording:
+            return
+        self.latencies[route].append(elapsed)
+        self.statuses[route][status] += 1
+        if failed:
+            self.errors[route] += 1
+
+
+class VirtualUser:
+    """One simulated client; holds its own auth token and demo identity."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, args, characters: List[str]):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.characters = characters
+        self.token: Optional[str] = None
+        self.session_ids: List[str] = []
+        self.forwarded_for = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+    async def call(self, method: str, route: str, path: str, auth: bool = False, admin: bool = False, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if auth and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if admin:
+            headers["X-Admin-API-Key"] = self.args.admin_key
+        # Only honoured when the target trusts proxy headers; in-process users get their own client IP
+        headers.setdefault("X-Forwarded-For", self.forwarded_for)
+
+        start_time = time.perf_counter()
+        try:
+            response = await self.client.request(method, API + path, headers=headers, **kwargs)
+        except Exception as e:
+            self.recorder.record(route, time.perf_counter() - start_time, type(e).__name__, True)
+            return None
+        self.recorder.record(route, time.perf_counter() - start_time, str(response.status_code), response.status_code >= 400)
+        return response
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+
+    async def register(self) -> bool:
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        response = await self.call("POST", "POST /auth/register", "/auth/register", json={
+            "email": email, "password": PASSWORD, "full_name": f"Load Test {self.index}"
+        })
+        if response is not None and response.status_code == 200:
+            self.token = response.json()["access_token"]
+            return True
+        return False
+
+    async def scenario_demo(self):
+        character_id = random.choice(self.characters)
+        history = []
+        for _ in range(self.args.turns):
+            message = random.choice(MESSAGES)
+            response = await self.call("POST", "POST /chat/demo", "/chat/demo", json={
+                "character_id": character_id, "message": message, "history": history
+            })
+            if response is None or response.status_code != 200:
+                return
+            history += [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": response.json()["response"]},
+            ]
+            await self.think()
+
+    async def scenario_chat(self):
+        character_id = random.choice(self.characters)
+        session_id = None
+        for _ in range(self.args.turns):
+            response = await self.call("POST", "POST /chat/send", "/chat/send", auth=True, json={
+                "character_id": character_id, "message": random.choice(MESSAGES), "session_id": session_id
+            })
+            if response is None or response.status_code != 200:
+                return
+            session_id = response.json()["session_id"]
+            await self.think()
+        if session_id and session_id not in self.session_ids:
+            self.session_ids.append(session_id)
+
+    async def scenario_browse(self):
+        response = await self.call("GET", "GET /chat/sessions", "/chat/sessions", auth=True, params={"limit": 20})
+        if response is not None and response.status_code == 200:
+            sessions = [s["id"] for s in response.json()] or self.session_ids
+            if sessions:
+                await self.think()
+                await self.call(
+                    "GET", "GET /chat/sessions/{id}/messages",
+                    f"/chat/sessions/{random.choice(sessions)}/messages", auth=True
+                )
+        await self.think()
+        await self.call("GET", "GET /usage/stats", "/usage/stats", auth=True)
+        await self.call("GET", "GET /usage/quota", "/usage/quota", auth=True)
+
+    async def scenario_admin(self):
+        await self.call("GET", "GET /admin/stats", "/admin/stats", admin=True)
+        await self.think()
+        await self.call("GET", "GET /admin/users", "/admin/users", admin=True, params={
+            "limit": 20, "offset": random.randrange(0, 200, 20)
+        })
+
+    async def run(self, mix: Dict[str, float], deadline: float):
+        names, weights = list(mix), list(mix.values())
+        while time.monotonic() < deadline:
+            await getattr(self, f"scenario_{random.choices(names, weights)[0]}")()
+            await self.think()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(q * len(ordered)))) - 1]
+
+
+def histogram_percentile(buckets, counts: List[float], q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-th observation (``None`` if past the last bound)."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    cumulative = 0.0
+    for bound, count in zip(list(buckets) + [None], counts):
+        cumulative += count
+        if cumulative >= q * total:
+            return bound
+    return None
+
+
+class PoolSampler:
+    """Samples the in-process engine's pool and the pool-wait histogram."""
+
+    def __init__(self, interval: float = 0.25):
+        from app.core.database import db_pool_wait_seconds, engine
+        self.histogram = db_pool_wait_seconds
+        self.pool = engine.pool
+        self.interval = interval
+        self.checked_out: List[int] = []
+        self.overflow: List[int] = []
+        self._baseline = self._state()
+
+    def _state(self) -> List[float]:
+        samples = dict(self.histogram.samples())
+        return samples.get((), [0.0] * (len(self.histogram.buckets) + 2))
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            self.checked_out.append(self.pool.checkedout())
+            self.overflow.append(max(0, self.pool.overflow()))
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> dict:
+        state = self._state()
+        delta = [after - before for after, before in zip(state, self._baseline)]
+        counts, total_wait = delta[:-1], delta[-1]
+        checkouts = sum(counts)
+        to_ms = lambda seconds: None if seconds is None else round(seconds * 1000, 2)
+        return {
+            "pool_size": self.pool.size(),
+            "checkouts": int(checkouts),
+            "wait_mean_ms": round(total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_p50_ms": to_ms(histogram_percentile(self.histogram.buckets, counts, 0.50)),
+            "wait_p95_ms": to_ms(histogram_percentile(self.histogram.buckets, counts, 0.95)),
+            "wait_p99_ms": to_ms(histogram_percentile(self.histogram.buckets, counts, 0.99)),
+            "checked_out_max": max(self.checked_out, default=0),
+            "checked_out_mean": round(sum(self.checked_out) / len(self.checked_out), 2) if self.checked_out else 0.0,
+            "overflow_max": max(self.overflow, default=0),
+        }
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if not hasattr(VirtualUser, f"scenario_{name}"):
+            raise SystemExit(f"Unknown scenario: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def build_report(
+    args, mix: Dict[str, float], recorder: Recorder, started_at: datetime, elapsed: float, pool: Optional[dict]
+) -> dict:
+    routes = {}
+    for route in sorted(recorder.latencies):
+        latencies = recorder.latencies[route]
+        routes[route] = {
+            "count": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "errors": recorder.errors[route],
+            "error_rate": round(recorder.errors[route] / len(latencies), 4),
+            "statuses": dict(recorder.statuses[route]),
+        }
+    total = sum(r["count"] for r in routes.values())
+    errors = sum(r["errors"] for r in routes.values())
+    return {
+        "run": {
+            "started_at": started_at.isoformat(),
+            "commit": git_commit(),
+            "target": args.base_url or "in-process",
+            "llm_base_url": args.llm_base_url or "mock",
+            "users": args.users,
+            "duration_s": round(elapsed, 1),
+            "think_time_s": args.think_time,
+            "turns": args.turns,
+            "mix": mix,
+        },
+        "totals": {
+            "requests": total,
+            "rps": round(total / elapsed, 2),
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+        },
+        "routes": routes,
+        "db_pool": pool,
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict]):
+    totals = report["totals"]
+    print(f"\n📊 {totals['requests']} requests, {totals['rps']} req/s, error rate {totals['error_rate']:.2%}")
+    print(f"   {'route':<36}{'count':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>8}")
+    for route, stats in report["routes"].items():
+        line = (
+            f"   {route:<36}{stats['count']:>7}{stats['rps']:>8}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['error_rate']:>8.1%}"
+        )
+        previous = (baseline or {}).get("routes", {}).get(route)
+        if previous and previous["p95_ms"]:
+            change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+            line += f"   p95 {change:+.0%} vs {baseline['run']['commit']}"
+        print(line)
+    pool = report["db_pool"]
+    if pool:
+        print(
+            f"🗄️  DB pool: {pool['checkouts']} checkouts, wait mean {pool['wait_mean_ms']}ms "
+            f"p95 ≤{pool['wait_p95_ms']}ms p99 ≤{pool['wait_p99_ms']}ms, "
+            f"checked out max {pool['checked_out_max']}/{pool['pool_size']} (+{pool['overflow_max']} overflow)"
+        )
+    else:
+        print("🗄️  DB pool: not measured (remote target)")
+
+
+async def run_load(args, mix: Dict[str, float]) -> dict:
+    recorder = Recorder()
+    pool_sampler = None
+    lifespan = None
+
+    if args.base_url:
+        clients = [httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)]
+    else:
+        from app.main import app
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        # One transport per user so per-IP limits (demo chat) see distinct clients
+        clients = [
+            httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app, client=(f"10.0.{i // 256 % 256}.{i % 256}", 40000)),
+                base_url="http://localhost",
+                timeout=args.timeout,
+            )
+            for i in range(args.users)
+        ]
+        pool_sampler = PoolSampler()
+
+    try:
+        probe = VirtualUser(0, clients[0], recorder, args, [])
+        response = await probe.call("GET", "GET /characters/", "/characters/")
+        characters = [c["id"] for c in response.json()] if response is not None and response.status_code == 200 else []
+        if not characters:
+            from app.data.characters_seed import CHARACTERS
+            characters = [c["id"] for c in CHARACTERS]
+
+        users = [VirtualUser(i, clients[i % len(clients)], recorder, args, characters) for i in range(args.users)]
+
+        # Accounts are created before the timed phase (bcrypt would dominate it otherwise)
+        if {"chat", "browse"} & set(mix):
+            print(f"👤 Registering {len(users)} load-test accounts...")
+            recorder.recording = False
+            registered = await asyncio.gather(*(user.register() for user in users))
+            recorder.recording = True
+            if not any(registered):
+                print("⚠️ Registration failed; dropping authenticated scenarios")
+                mix = {name: weight for name, weight in mix.items() if name not in ("chat", "browse")}
+        if "admin" in mix and not args.admin_key:
+            print("⚠️ No --admin-key; dropping the admin scenario")
+            mix.pop("admin")
+        if not mix:
+            raise SystemExit("No runnable scenarios left")
+
+        print(f"🚀 {args.users} users for {args.duration}s, mix {mix}")
+        stop = asyncio.Event()
+        sampler_task = asyncio.create_task(pool_sampler.run(stop)) if pool_sampler else None
+        started_at = datetime.now(timezone.utc)
+        start_time = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(user.run(mix, deadline) for user in users))
+        elapsed = time.perf_counter() - start_time
+        stop.set()
+        if sampler_task:
+            await sampler_task
+
+        return build_report(args, mix, recorder, started_at, elapsed, pool_sampler.report() if pool_sampler else None)
+    finally:
+        for client in clients:
+            await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default=None, help="Drive a running instance instead of the in-process app")
+    parser.add_argument("--llm-base-url", default="http://127.0.0.1:8787/api/v1",
+                        help="In-process only: LLM upstream (fake_openrouter.py); empty for built-in mock replies")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Timed phase length in seconds")
+    parser.add_argument("--mix", default="demo=4,chat=3,browse=2,admin=1", help="Scenario weights")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per chat conversation")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between requests (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout (s)")
+    parser.add_argument("--admin-key", default=None, help="X-Admin-API-Key (in-process default: generated)")
+    parser.add_argument("--output", default=None, help="Result JSON path (default: load-results/<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result JSON to compare p95s against")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+
+    if not args.base_url:
+        # Settings are read at import: never call a real paid upstream from a load test
+        os.environ["OPENROUTER_API_KEY"] = DEMO_API_KEY
+        os.environ["OPENAI_COMPATIBLE_BASE_URL"] = ""
+        os.environ["LOCAL_LLM_BASE_URL"] = args.llm_base_url
+        args.admin_key = args.admin_key or os.environ.setdefault("ADMIN_API_KEY", DEFAULT_ADMIN_KEY)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = asyncio.run(run_load(args, mix))
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(
+        "load-results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['run']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Replay a captured traffic trace against a staging instance.
+
+Reads a capture written by the traffic capture middleware
+(TRAFFIC_CAPTURE_ENABLED=true) and re-issues each request at its original
+offset divided by ``--speed``. The capture only holds request shapes, so
+bodies are rebuilt: same route, character, mode, language and message
+length, with synthetic text. Demo chats get a synthetic history of the
+captured depth, and turns that shared a session in the capture share one
+in the replay. Turns in one session run in order, as they did for the real
+user. Captured users are mapped to load-test accounts registered before the
+replay starts, and anonymous users to distinct ``X-Forwarded-For``
+addresses.
+
+Point the staging instance's LLM at ``scripts/fake_openrouter.py`` so the
+replay measures our stack, not the upstream. Routes that cannot be rebuilt
+from a shape (login, ids unknown to staging, admin without a key) are
+skipped and counted.
+
+Usage:
+    python scripts/replay_traffic.py logs/traffic.jsonl --base-url http://staging:8000 --speed 4
+    python scripts/replay_traffic.py logs/traffic.jsonl --base-url http://localhost:8000 --speed 1 --limit 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from load_test import MESSAGES, PASSWORD, Recorder, git_commit, percentile
+
+API = "/api/v1"
+CHAT_TURN_ROUTES = {f"{API}/chat/send", f"{API}/chat/stream", f"{API}/chat/jobs"}
+SKIPPED_PREFIXES = (f"{API}/auth/",)
+
+
+def load_trace(path: str, limit: Optional[int], route_filter: Optional[str]) -> List[Dict]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "v" in record:
+                continue  # per-process header
+            records.append(record)
+    records.sort(key=lambda record: record["ts"])
+
+    # Session turns carry no depth (each worker sees only some of them);
+    # count the earlier turns of the session across the whole capture
+    depths: Dict[str, int] = defaultdict(int)
+    for record in records:
+        session_key = record.get("sh")
+        if session_key:
+            record.setdefault("h", depths[session_key])
+            depths[session_key] += 1
+
+    if route_filter:
+        records = [record for record in records if record["r"].startswith(route_filter)]
+    return records[:limit] if limit else records
+
+
+def synthetic_text(length: int) -> str:
+    """Text of about ``length`` characters built from sample chat messages."""
+    text = ""
+    while len(text) < length:
+        text += random.choice(MESSAGES) + " "
+    return text[:max(1, length)].strip() or "Merhaba"
+
+
+class Replayer:
+    """Maps captured users and sessions onto staging and issues requests."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, args):
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.tokens: Dict[str, str] = {}
+        self.account_tokens: List[str] = []
+        self.sessions: Dict[str, str] = {}
+        self.user_sessions: Dict[str, List[str]] = defaultdict(list)
+        self.session_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.addresses: Dict[str, str] = {}
+        self.skipped: Dict[str, int] = defaultdict(int)
+        self.lags: List[float] = []
+        self.characters: List[str] = []
+
+    async def setup(self, records: List[Dict]):
+        response = await self.client.get(f"{API}/characters/")
+        if response.status_code == 200:
+            self.characters = [c["id"] for c in response.json()]
+
+        users = sorted({record["u"] for record in records if record.get("a")})
+        accounts = min(len(users), self.args.max_accounts)
+        print(f"👤 Registering {accounts} accounts for {len(users)} captured users...")
+        semaphore = asyncio.Semaphore(16)
+
+        async def register(i: int):
+            async with semaphore:
+                response = await self.client.post(f"{API}/auth/register", json={
+                    "email": f"replay-{uuid.uuid4().hex[:12]}@example.com",
+                    "password": PASSWORD,
+                    "full_name": f"Replay {i}",
+                })
+                if response.status_code == 200:
+                    self.account_tokens.append(response.json()["access_token"])
+
+        await asyncio.gather(*(register(i) for i in range(accounts)))
+        if users and not self.account_tokens:
+            print("⚠️ Registration failed; authenticated requests will be skipped")
+        for i, user in enumerate(users):
+            if self.account_tokens:
+                self.tokens[user] = self.account_tokens[i % len(self.account_tokens)]
+
+    def headers(self, record: Dict) -> Optional[Dict[str, str]]:
+        user = record["u"]
+        headers = {}
+        if record.get("a"):
+            token = self.tokens.get(user)
+            if token is None:
+                return None
+            headers["Authorization"] = f"Bearer {token}"
+        else:
+            if user not in self.addresses:
+                n = len(self.addresses) + 1
+                self.addresses[user] = f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"
+            # Only honoured when staging trusts proxy headers (uvicorn --proxy-headers)
+            headers["X-Forwarded-For"] = self.addresses[user]
+        if record["r"].startswith(f"{API}/admin/"):
+            if not self.args.admin_key:
+                return None
+            headers["X-Admin-API-Key"] = self.args.admin_key
+        return headers
+
+    def character(self, record: Dict) -> str:
+        character_id = record.get("c")
+        if character_id and (not self.characters or character_id in self.characters):
+            return character_id
+        return random.choice(self.characters) if self.characters else (character_id or "state")
+
+    def build(self, record: Dict):
+        """(method, path, json body, session key) for a record, or None to skip."""
+        route, method = record["r"], record["m"]
+        if route == "<unmatched>" or route.startswith(SKIPPED_PREFIXES):
+            return None
+        language = record.get("lang", "tr")
+
+        if method == "POST" and route in CHAT_TURN_ROUTES:
+            session_key = record.get("sh")
+            body = {
+                "character_id": self.character(record),
+                "message": synthetic_text(record.get("ml", 60)),
+                "session_id": self.sessions.get(session_key) if session_key else None,
+                "mode": record.get("md", "chat"),
+                "language": language,
+            }
+            return method, route, body, session_key
+        if method == "POST" and route == f"{API}/chat/demo":
+            history = [
+                {"role": "user" if i % 2 == 0 else "assistant", "content": synthetic_text(120)}
+                for i in range(record.get("h", 0))
+            ]
+            return method, route, {
+                "character_id": self.character(record),
+                "message": synthetic_text(record.get("ml", 60)),
+                "history": history,
+                "language": language,
+            }, None
+        if method == "POST" and route == f"{API}/chat/debate":
+            captured = (record.get("c") or "").split(",")
+            characters = [c for c in captured if c in self.characters] or random.sample(
+                self.characters, min(len(captured) or 2, len(self.characters))
+            )
+            return method, route, {
+                "character_ids": characters,
+                "topic": synthetic_text(record.get("ml", 80)),
+                "language": language,
+            }, None
+        if method != "GET":
+            return None
+        if "{session_id}" in route:
+            known = self.user_sessions.get(record["u"])
+            if not known:
+                return None
+            return method, route.replace("{session_id}", random.choice(known)), None, None
+        if "{" in route:
+            return None
+        return method, route, None, None
+
+    async def issue(self, record: Dict, scheduled: float, started: float):
+        request = self.build(record)
+        headers = self.headers(record) if request else None
+        if request is None or headers is None:
+            self.skipped[f"{record['m']} {record['r']}"] += 1
+            return
+        method, path, body, session_key = request
+        route = f"{method} {record['r'][len(API):]}"
+
+        lock = self.session_locks[session_key] if session_key else None
+        if lock:
+            await lock.acquire()
+        try:
+            if session_key and body is not None:
+                # A previous turn in this session may have created it meanwhile
+                body["session_id"] = self.sessions.get(session_key)
+            self.lags.append(max(0.0, time.monotonic() - started - scheduled))
+            await self.send(route, method, path, body, headers, record, session_key)
+        finally:
+            if lock:
+                lock.release()
+
+    async def send(self, route, method, path, body, headers, record, session_key):
+        start_time = time.perf_counter()
+        try:
+            if path.endswith("/stream") or path.endswith("/debate"):
+                result = None
+                async with self.client.stream(method, path, json=body, headers=headers) as response:
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[7:]
+                        elif line.startswith("data: ") and event == "done":
+                            result = json.loads(line[6:])
+                    status_code = response.status_code
+            else:
+                response = await self.client.request(method, path, json=body, headers=headers)
+                status_code = response.status_code
+                result = response.json() if status_code < 300 and "json" in response.headers.get("content-type", "") else None
+        except Exception as e:
+            self.recorder.record(route, time.perf_counter() - start_time, type(e).__name__, True)
+            return
+        self.recorder.record(route, time.perf_counter() - start_time, str(status_code), status_code >= 400)
+
+        session_id = (result or {}).get("session_id") if isinstance(result, dict) else None
+        if session_id and session_id != "demo":
+            if session_key:
+                self.sessions[session_key] = session_id
+            if session_id not in self.user_sessions[record["u"]]:
+                self.user_sessions[record["u"]].append(session_id)
+
+
+def captured_latencies(records: List[Dict]) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    for record in records:
+        latencies[f"{record['m']} {record['r'][len(API):]}"].append(record["ms"] / 1000)
+    return latencies
+
+
+async def replay(args, records: List[Dict]) -> Dict:
+    recorder = Recorder()
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        replayer = Replayer(client, recorder, args)
+        await replayer.setup(records)
+
+        t0 = records[0]["ts"]
+        span = (records[-1]["ts"] - t0) / args.speed
+        print(f"▶️  Replaying {len(records)} requests over {span:.0f}s at {args.speed}x")
+        started_at = datetime.now()
+        started = time.monotonic()
+        tasks = []
+        for record in records:
+            scheduled = (record["ts"] - t0) / args.speed
+            delay = scheduled - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(replayer.issue(record, scheduled, started)))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    captured = captured_latencies(records)
+    routes = {}
+    for route in sorted(recorder.latencies):
+        latencies = recorder.latencies[route]
+        original = captured.get(route) or [0.0]
+        routes[route] = {
+            "count": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "captured_p50_ms": round(percentile(original, 0.50) * 1000, 1),
+            "captured_p95_ms": round(percentile(original, 0.95) * 1000, 1),
+            "errors": recorder.errors[route],
+            "error_rate": round(recorder.errors[route] / len(latencies), 4),
+            "statuses": dict(recorder.statuses[route]),
+        }
+    lags = replayer.lags or [0.0]
+    total = sum(route["count"] for route in routes.values())
+    return {
+        "run": {
+            "started_at": started_at.isoformat(),
+            "commit": git_commit(),
+            "trace": args.trace,
+            "target": args.base_url,
+            "speed": args.speed,
+            "duration_s": round(elapsed, 1),
+        },
+        "totals": {
+            "captured": len(records),
+            "replayed": total,
+            "skipped": sum(replayer.skipped.values()),
+            "rps": round(total / elapsed, 2),
+            "errors": sum(route["errors"] for route in routes.values()),
+            "schedule_lag_p95_ms": round(percentile(lags, 0.95) * 1000, 1),
+            "schedule_lag_max_ms": round(max(lags) * 1000, 1),
+        },
+        "routes": routes,
+        "skipped": dict(replayer.skipped),
+    }
+
+
+def print_report(report: Dict):
+    totals = report["totals"]
+    print(
+        f"\n📊 {totals['replayed']}/{totals['captured']} requests replayed ({totals['skipped']} skipped), "
+        f"{totals['rps']} req/s, {totals['errors']} errors, schedule lag p95 {totals['schedule_lag_p95_ms']}ms"
+    )
+    print(f"   {'route':<36}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>8}   captured p50/p95")
+    for route, stats in report["routes"].items():
+        print(
+            f"   {route:<36}{stats['count']:>7}{stats['p50_ms']:>9}{stats['p95_ms']:>9}"
+            f"{stats['p99_ms']:>9}{stats['error_rate']:>8.1%}   {stats['captured_p50_ms']}/{stats['captured_p95_ms']}"
+        )
+    for route, count in sorted(report["skipped"].items(), key=lambda item: -item[1]):
+        print(f"   ⏭️  {route}: {count} skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("trace", help="Capture file (JSON Lines)")
+    parser.add_argument("--base-url", required=True, help="Staging instance to replay against")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N requests")
+    parser.add_argument("--route", default=None, help="Replay only routes starting with this prefix")
+    parser.add_argument("--max-accounts", type=int, default=500, help="Accounts to register for captured users")
+    parser.add_argument("--admin-key", default=None, help="X-Admin-API-Key for admin routes")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None, help="Result JSON path (default: replay-results/<time>-<commit>.json)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic text and id choices")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    records = load_trace(args.trace, args.limit, args.route)
+    if not records:
+        raise SystemExit("No requests in trace")
+
+    report = asyncio.run(replay(args, records))
+    print_report(report)
+
+    output = args.output or os.path.join(
+        "replay-results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['run']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
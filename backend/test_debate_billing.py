@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test debate billing: a round answered by several models is priced at each
+model's own rates and recorded once; mock fallbacks are free. The LLM,
+session store and usage writes are replaced by recording stand-ins.
+"""
+import os
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+
+import app.api.v1.endpoints.chat as chat_module
+from app.core.config import get_settings
+from app.models.database import User
+from app.services.ai_service import AIResponse
+from app.services.token_service import TokenCreditService
+from app.services.usage_service import UsageService
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+# (model, prompt tokens, completion tokens) each character answers with
+ANSWERS = {
+    "einstein-001": ("gpt-4", 1200, 300),
+    "fatih-001": ("google/gemini-2.0-flash-001", 1000, 250),
+    "frida-001": ("gpt-4", 800, 150),
+}
+
+recorded = {}
+
+
+class RecordingTokenCreditService(TokenCreditService):
+    async def record_usage(self, **kwargs):
+        recorded["record_usage"] = kwargs
+        return SimpleNamespace(credits_used=kwargs["credits"])
+
+
+class RecordingUsageService(UsageService):
+    async def track_usage(self, **kwargs):
+        recorded["track_usage"] = kwargs
+
+
+class SessionStore:
+    async def create_session(self, **kwargs):
+        return SimpleNamespace(id=uuid.uuid4())
+
+    async def add_messages(self, db, session_id, messages):
+        recorded["messages"] = messages
+
+
+class ScriptedAIService:
+    def __init__(self, answers):
+        self.answers = answers
+
+    async def get_character_response(self, character_id, **kwargs):
+        model, prompt_tokens, completion_tokens = self.answers[character_id]
+        usage = None
+        if not model.startswith("mock-"):
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        return AIResponse(
+            content=f"{character_id} says hello",
+            character_id=character_id,
+            usage=usage,
+            model_used=model,
+            response_time=0.1
+        )
+
+
+async def allow_quota(request, current_user, db, tokens_needed=100):
+    return {"allowed": True, "quota": {}}
+
+
+chat_module.check_user_quota = allow_quota
+chat_module.session_service = SessionStore()
+chat_module.TokenCreditService = RecordingTokenCreditService
+chat_module.UsageService = RecordingUsageService
+
+
+async def run_round(answers):
+    recorded.clear()
+    user = User(id=uuid.uuid4(), credits=100000, is_active=True)
+    request = chat_module.DebateRequest(character_ids=list(answers), topic="Bilim mi sanat mı?")
+    events = []
+    response = await chat_module._run_debate(
+        request, user, ScriptedAIService(answers), None, get_settings(),
+        lambda event, data: events.append(event)
+    )
+    return response, events
+
+
+async def test_mixed_models():
+    """Each model's tokens are priced at its own rates, summed into one record."""
+    print("\n1️⃣ Round answered by two models...")
+    response, events = await run_round(ANSWERS)
+
+    token_service = TokenCreditService(None)
+    usage_service = UsageService()
+    per_model = {}
+    for model, prompt_tokens, completion_tokens in ANSWERS.values():
+        tokens = per_model.setdefault(model, [0, 0])
+        tokens[0] += prompt_tokens
+        tokens[1] += completion_tokens
+    expected_credits = 0
+    expected_cost = [0, 0]
+    for model, (prompt_tokens, completion_tokens) in per_model.items():
+        expected_credits += await token_service.calculate_credits_needed(prompt_tokens, completion_tokens, model)
+        input_cost, output_cost = usage_service.calculate_cost(model, prompt_tokens, completion_tokens)
+        expected_cost[0] += input_cost
+        expected_cost[1] += output_cost
+
+    usage = recorded.get("record_usage", {})
+    tracked = recorded.get("track_usage", {})
+    check("every turn is streamed", events.count("turn") == len(ANSWERS))
+    check("one usage record for the round", bool(usage) and usage["request_type"] == "debate")
+    check("usage is labelled as mixed", usage.get("model") == "mixed" and response.usage["model"] == "mixed")
+    check(
+        "tokens are summed over turns",
+        usage.get("input_tokens") == 3000 and usage.get("output_tokens") == 700,
+        f"{usage.get('input_tokens')} in / {usage.get('output_tokens')} out"
+    )
+    check(
+        "credits are the sum of per-model prices",
+        usage.get("credits") == expected_credits == response.usage["credits_used"],
+        f"{usage.get('credits')} vs {expected_credits}"
+    )
+    check(
+        "cost is the sum of per-model costs",
+        tracked.get("cost") == tuple(expected_cost),
+        f"{tracked.get('cost')} vs {tuple(expected_cost)}"
+    )
+    single_model_cost = usage_service.calculate_cost("gpt-4", 3000, 700)
+    check("cheaper model's tokens are not priced as gpt-4", tracked.get("cost") != single_model_cost)
+    check("round is stored in one write", len(recorded.get("messages", [])) == len(ANSWERS) + 1)
+
+
+async def test_mock_fallback():
+    """A turn served by a mock fallback is stored but not billed."""
+    print("\n2️⃣ Round with a mock fallback...")
+    answers = {"einstein-001": ANSWERS["einstein-001"], "frida-001": ("mock-fallback", 0, 0)}
+    response, _ = await run_round(answers)
+
+    usage = recorded.get("record_usage", {})
+    credits = await TokenCreditService(None).calculate_credits_needed(1200, 300, "gpt-4")
+    check("mock turn is still answered", len(response.turns) == 2)
+    check("mock turn adds no tokens", usage.get("input_tokens") == 1200 and usage.get("output_tokens") == 300)
+    check("only the real model is billed", usage.get("model") == "gpt-4" and usage.get("credits") == credits)
+
+    response, _ = await run_round({"einstein-001": ("mock-a", 0, 0), "fatih-001": ("mock-b", 0, 0)})
+    check("all-mock round is free", "record_usage" not in recorded and response.usage is None)
+
+
+async def main():
+    print("⚖️ Testing debate billing...")
+    await test_mixed_models()
+    await test_mock_fallback()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Debate billing tests completed!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
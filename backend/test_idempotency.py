@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test the Idempotency-Key store: attach to an in-flight run, replay a
+completed one, reject a reused key and retry a failed run.
+"""
+import os
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+
+from fastapi import HTTPException
+from app.core.idempotency import IdempotencyStore, request_fingerprint
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+async def test_attach_and_replay():
+    """Duplicates share one producer run: attached while running, replayed after."""
+    print("\n1️⃣ Attach and replay...")
+    store = IdempotencyStore(ttl=60)
+    key = ("user-1", "key-1")
+    fingerprint = request_fingerprint({"message": "Merhaba"})
+    calls = []
+    release = asyncio.Event()
+
+    async def produce():
+        calls.append(1)
+        await release.wait()
+        return {"response": "Merhaba!"}
+
+    first = asyncio.ensure_future(store.run(key, fingerprint, produce))
+    second = asyncio.ensure_future(store.run(key, fingerprint, produce))
+    await asyncio.sleep(0)
+    release.set()
+    (first_result, first_outcome), (second_result, second_outcome) = await asyncio.gather(first, second)
+
+    check("first request runs the producer", first_outcome == "new")
+    check("concurrent duplicate attaches", second_outcome == "attached")
+    check("both get the same result", first_result is second_result)
+
+    replay_result, replay_outcome = await store.run(key, fingerprint, produce)
+    check("later duplicate is replayed", replay_outcome == "replayed" and replay_result is first_result)
+    check("producer ran once", len(calls) == 1, f"{len(calls)} call(s)")
+
+
+async def test_detached_producer():
+    """The producer finishes and is kept even if the first request goes away."""
+    print("\n2️⃣ Cancelled request...")
+    store = IdempotencyStore(ttl=60)
+    key = ("user-1", "key-2")
+    fingerprint = request_fingerprint({"message": "Nasılsın?"})
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.ensure_future(store.run(key, fingerprint, produce))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    result, outcome = await store.run(key, fingerprint, produce)
+    check("retry attaches to the surviving run", outcome == "attached" and result == "done")
+    check("producer ran once", len(calls) == 1, f"{len(calls)} call(s)")
+
+
+async def test_conflict_and_failure():
+    """A key reused for another body is rejected; a failed run can be retried."""
+    print("\n3️⃣ Conflicts and failures...")
+    store = IdempotencyStore(ttl=60)
+    key = ("user-1", "key-3")
+    fingerprint = request_fingerprint({"message": "a"})
+
+    async def ok():
+        return "ok"
+
+    await store.run(key, fingerprint, ok)
+    try:
+        await store.run(key, request_fingerprint({"message": "b"}), ok)
+        check("reused key is rejected", False, "no error raised")
+    except HTTPException as e:
+        check("reused key is rejected", e.status_code == 422, f"status {e.status_code}")
+
+    other_user = await store.run(("user-2", "key-3"), request_fingerprint({"message": "b"}), ok)
+    check("keys are scoped per user", other_user[1] == "new")
+
+    failing_key = ("user-1", "key-4")
+
+    async def fail():
+        raise RuntimeError("upstream error")
+
+    try:
+        await store.run(failing_key, fingerprint, fail)
+    except RuntimeError:
+        pass
+    result, outcome = await store.run(failing_key, fingerprint, ok)
+    check("failed run is forgotten", outcome == "new" and result == "ok")
+
+
+async def main():
+    print("🔁 Testing idempotency store...")
+    await test_attach_and_replay()
+    await test_detached_producer()
+    await test_conflict_and_failure()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Idempotency tests completed!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
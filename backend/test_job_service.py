@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test the chat job queue: the claim transition, retry vs fail after the
+attempt limit, outcomes of re-claimed jobs and the webhook host allowlist.
+No database is needed; statements go to a scripted session and are checked
+as compiled for PostgreSQL.
+"""
+import os
+import asyncio
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+os.environ["CHAT_JOB_WEBHOOK_HOSTS"] = "hooks.example.com, localhost"
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+import app.services.job_service as job_service_module
+from app.models.database import ChatJob, User
+from app.services.job_service import (
+    ChatJobService, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, RETRYABLE_STATUSES,
+)
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+class ScriptedResult:
+    def __init__(self, value=None, rowcount: int = 1):
+        self.value = value
+        self.rowcount = rowcount
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class ScriptedSession:
+    """Records executed statements and answers from a script."""
+
+    def __init__(self, results=(), rows=None):
+        self.results = list(results)
+        self.rows = rows or {}
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return self.results.pop(0) if self.results else ScriptedResult()
+
+    async def get(self, model, key):
+        return self.rows.get((model, key))
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+def use_session(session: ScriptedSession):
+    @asynccontextmanager
+    async def scope():
+        yield session
+    job_service_module.async_session_scope = scope
+
+
+def compiled(statement):
+    return statement.compile(dialect=postgresql.dialect())
+
+
+async def test_claim():
+    """The oldest queued job moves to running for this worker in one statement."""
+    print("\n1️⃣ Claim transition...")
+    service = ChatJobService()
+    job_id = uuid.uuid4()
+    session = ScriptedSession([ScriptedResult(job_id)])
+    use_session(session)
+
+    claimed = await service._claim()
+    sql = compiled(session.statements[0])
+    text, params = str(sql), sql.params
+    check("claim returns the job id", claimed == job_id)
+    check("claim commits", session.commits == 1)
+    check("queued job is picked", params.get("status_1") == JOB_QUEUED, str(params))
+    check("oldest job first", "ORDER BY chat_jobs.created_at" in text)
+    check("locked rows are skipped", "FOR UPDATE SKIP LOCKED" in text)
+    check("job moves to running", params.get("status") == JOB_RUNNING)
+    check("job is claimed by this worker", params.get("claimed_by") == service.worker_id)
+    check("attempts are counted", "attempts=(chat_jobs.attempts +" in text)
+
+    session = ScriptedSession([ScriptedResult(None)])
+    use_session(session)
+    check("empty queue claims nothing", await service._claim() is None)
+
+
+async def test_retry_and_fail():
+    """Retryable errors requeue until the attempt limit; others fail at once."""
+    print("\n2️⃣ Retry vs fail...")
+    service = ChatJobService()
+    max_attempts = service.settings.chat_job_max_attempts
+    job_id = uuid.uuid4()
+    user = User(id=uuid.uuid4(), is_active=True)
+
+    async def outcome(attempts: int, error: Exception):
+        job = ChatJob(id=job_id, user_id=user.id, request={"message": "Merhaba"}, attempts=attempts)
+        use_session(ScriptedSession(rows={(ChatJob, job_id): job, (User, user.id): user}))
+
+        async def runner(payload, runner_user, db):
+            if error is not None:
+                raise error
+            return {"response": "Merhaba!"}
+
+        service._runner = runner
+        return await service._run(job_id)
+
+    status, result, _, _ = await outcome(1, None)
+    check("successful run succeeds", status == JOB_SUCCEEDED and result == {"response": "Merhaba!"})
+
+    for code in sorted(RETRYABLE_STATUSES):
+        status, _, _, error_status = await outcome(1, HTTPException(status_code=code, detail="busy"))
+        check(f"{code} is requeued before the limit", status == JOB_QUEUED and error_status == code)
+
+    status, _, _, _ = await outcome(max_attempts, HTTPException(status_code=503, detail="busy"))
+    check(f"503 fails after {max_attempts} attempts", status == JOB_FAILED)
+
+    status, _, _, error_status = await outcome(1, HTTPException(status_code=400, detail="bad"))
+    check("non-retryable error fails at once", status == JOB_FAILED and error_status == 400)
+
+    status, _, _, error_status = await outcome(1, RuntimeError("boom"))
+    check("crash fails without a retry", status == JOB_FAILED and error_status == 500)
+
+
+async def test_reclaimed_job():
+    """A worker whose job was re-claimed elsewhere leaves the row alone."""
+    print("\n3️⃣ Re-claimed job...")
+    service = ChatJobService()
+    job_id = uuid.uuid4()
+    other = ChatJob(
+        id=job_id, status=JOB_RUNNING, claimed_by="other-host:1", webhook_url="http://localhost/hook"
+    )
+
+    # The guarded UPDATE matches no row: another worker owns the job now
+    session = ScriptedSession([ScriptedResult(rowcount=0)], rows={(ChatJob, job_id): other})
+    use_session(session)
+    job = await service._finish(job_id, JOB_SUCCEEDED, {"response": "late"}, None, None)
+    sql = compiled(session.statements[0])
+    check("update is guarded by the claiming worker", sql.params.get("claimed_by_1") == service.worker_id)
+    check("stale outcome is dropped", job is None)
+    check("nothing is committed", session.commits == 0 and session.rollbacks == 1)
+
+    async def run(job_id):
+        return JOB_SUCCEEDED, {"response": "late"}, None, None
+
+    service._run = run
+    use_session(ScriptedSession([ScriptedResult(rowcount=0)], rows={(ChatJob, job_id): other}))
+    await service._execute(job_id)
+    check("no webhook for another worker's job", not service._webhooks)
+
+    session = ScriptedSession([ScriptedResult(rowcount=1)], rows={(ChatJob, job_id): other})
+    use_session(session)
+    job = await service._finish(job_id, JOB_QUEUED, None, "busy", 503)
+    check("owned job is settled", job is other and session.commits == 1)
+    check("requeue wakes other workers", any("pg_notify" in str(s) for s in session.statements))
+
+
+def test_webhook_allowlist():
+    """Callbacks go only to configured http(s) hosts."""
+    print("\n4️⃣ Webhook allowlist...")
+    service = ChatJobService()
+
+    check("allowed host passes", service.validate_webhook_url("https://hooks.example.com/done") == "https://hooks.example.com/done")
+    check("host match ignores case", service.validate_webhook_url("http://LOCALHOST:9000/cb") == "http://LOCALHOST:9000/cb")
+    for url in (
+        "https://evil.example.com/done",
+        "https://hooks.example.com.evil.test/done",
+        "http://169.254.169.254/latest/meta-data",
+        "ftp://hooks.example.com/done",
+        "/relative/path",
+    ):
+        try:
+            service.validate_webhook_url(url)
+            check(f"rejects {url}", False, "accepted")
+        except ValueError:
+            check(f"rejects {url}", True)
+
+
+async def main():
+    print("🧵 Testing chat job service...")
+    await test_claim()
+    await test_retry_and_fail()
+    await test_reclaimed_job()
+    test_webhook_allowlist()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Chat job service tests completed!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test model routing: default ordering, measured routes and 429 cooldown.
+No upstream calls are made; routes are fed synthetic observations.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+
+import app.services.model_router as model_router_module
+from app.core.config import get_settings
+from app.services.llm_providers import LLMProvider, ProviderRegistry, OPENROUTER_FREE_FALLBACKS
+from app.services.model_router import ModelRouter, PROFILE_LIGHT, PROFILE_HEAVY
+
+# Deterministic plans: never explore a random route first
+model_router_module.EXPLORE_RATE = 0.0
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def make_router() -> ModelRouter:
+    settings = get_settings()
+    models = [settings.default_ai_model, settings.backup_ai_model]
+    models += [m for m in OPENROUTER_FREE_FALLBACKS if m not in models]
+    provider = LLMProvider(name="openrouter", kind="openrouter", base_url="http://openrouter.test", models=models)
+    return ModelRouter(ProviderRegistry([provider]))
+
+
+def models(plan):
+    return [route.model for route in plan]
+
+
+def test_default_ordering():
+    """Before any samples, the configured models lead and the profiles differ."""
+    print("\n1️⃣ Ordering without samples...")
+    settings = get_settings()
+    router = make_router()
+
+    light = models(router.plan(PROFILE_LIGHT, 500, 200))
+    heavy = models(router.plan(PROFILE_HEAVY, 500, 200))
+    print(f"   light: {light}")
+    print(f"   heavy: {heavy}")
+
+    check("light starts with DEFAULT_AI_MODEL", light[0] == settings.default_ai_model)
+    check("heavy starts with BACKUP_AI_MODEL", heavy[0] == settings.backup_ai_model)
+    check("profiles order routes differently", light != heavy)
+    check("every route is planned", sorted(light) == sorted(models(router.routes())))
+
+    large_light = models(router.plan(PROFILE_LIGHT, 4000, 500))
+    check("large light request still starts with the default", large_light[0] == settings.default_ai_model)
+
+
+def test_measured_routes():
+    """Measured latency overrides the configured-order bonus."""
+    print("\n2️⃣ Ordering with measured routes...")
+    settings = get_settings()
+    router = make_router()
+    routes = {route.model: route for route in router.routes()}
+
+    for model, route in routes.items():
+        slow = model == settings.default_ai_model
+        for _ in range(5):
+            ttft = 12.0 if slow else 0.4
+            router.observe_success(route, ttft=ttft, duration=ttft + 2.0, output_tokens=200)
+
+    light = models(router.plan(PROFILE_LIGHT, 500, 200))
+    print(f"   light: {light}")
+    check("slow default loses the light lead", light[0] != settings.default_ai_model)
+    check("slow default is ranked last for light", light[-1] == settings.default_ai_model)
+
+
+def test_non_streamed_latency():
+    """A route measured only via /send is not scored slower than an equal streamed one."""
+    print("\n3️⃣ Non-streamed samples...")
+    router = make_router()
+    streamed, non_streamed = router.routes()[:2]
+
+    # Same real speed: 0.5s to the first token, then 200 tokens at 40 tokens/s
+    for _ in range(5):
+        router.observe_success(streamed, duration=5.5, output_tokens=200, ttft=0.5)
+        router.observe_success(non_streamed, duration=5.5, output_tokens=200)
+
+    priors = router._priors()
+    streamed_latency = router._route_stats(streamed).latency(200, *priors)
+    non_streamed_latency = router._route_stats(non_streamed).latency(200, *priors)
+    check("non-streamed calls add no TTFT samples", not router._route_stats(non_streamed).ttft)
+    check(
+        "equal routes get equal latency estimates",
+        abs(streamed_latency - non_streamed_latency) < 0.1,
+        f"{streamed_latency:.2f}s vs {non_streamed_latency:.2f}s"
+    )
+
+
+def test_rate_limit_cooldown():
+    """A 429 moves the route to the end until its cooldown ends."""
+    print("\n4️⃣ Rate-limit cooldown...")
+    settings = get_settings()
+    router = make_router()
+    routes = {route.model: route for route in router.routes()}
+
+    # The default is clearly fastest, so only the cooldown can demote it
+    for model, route in routes.items():
+        ttft = 0.2 if model == settings.default_ai_model else 4.0
+        for _ in range(20):
+            router.observe_success(route, ttft=ttft, duration=ttft + 2.0, output_tokens=200)
+    plan = models(router.plan(PROFILE_LIGHT, 500, 200))
+    check("fast default leads before the 429", plan[0] == settings.default_ai_model)
+
+    router.observe_failure(routes[settings.default_ai_model], rate_limited=True, retry_after=60)
+    plan = models(router.plan(PROFILE_LIGHT, 500, 200))
+    print(f"   light after 429: {plan}")
+    check("rate-limited route goes last", plan[-1] == settings.default_ai_model)
+    check("rate-limited route is still a fallback", len(plan) == len(routes))
+
+    # Expire the cooldown
+    router._route_stats(routes[settings.default_ai_model]).cooldown_until = 0.0
+    plan = models(router.plan(PROFILE_LIGHT, 500, 200))
+    check("route leads again once the cooldown ends", plan[0] == settings.default_ai_model)
+
+
+if __name__ == "__main__":
+    print("🧭 Testing model router...")
+    test_default_ordering()
+    test_measured_routes()
+    test_non_streamed_latency()
+    test_rate_limit_cooldown()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Model router tests completed!")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test SQL normalization for the query log: literals and IN lists collapse so
+that executions of the same query group together, while identifiers and
+bind parameters are kept.
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+
+from app.core.query_log import normalize_sql, RequestQueries, MAX_SQL_LENGTH
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def check_normalized(name: str, statement: str, expected: str):
+    normalized = normalize_sql(statement)
+    check(name, normalized == expected, normalized)
+
+
+def test_literals():
+    """String and number literals become ``?``; names and bind parameters stay."""
+    print("\n1️⃣ Literals...")
+    check_normalized(
+        "string literal",
+        "SELECT * FROM users WHERE email = 'ayse@example.com'",
+        "SELECT * FROM users WHERE email = ?",
+    )
+    check_normalized(
+        "escaped quote stays inside the literal",
+        "SELECT 1 FROM characters WHERE name = 'Sabiha''nın' AND id = 'x'",
+        "SELECT ? FROM characters WHERE name = ? AND id = ?",
+    )
+    check_normalized(
+        "integers, decimals and negatives",
+        "SELECT * FROM chat_messages WHERE score > -0.5 LIMIT 20 OFFSET 40",
+        "SELECT * FROM chat_messages WHERE score > ? LIMIT ? OFFSET ?",
+    )
+    check_normalized(
+        "digits inside identifiers are kept",
+        "SELECT users_1.id, t2.col3 FROM users AS users_1 JOIN t2 ON t2.user_id = users_1.id",
+        "SELECT users_1.id, t2.col3 FROM users AS users_1 JOIN t2 ON t2.user_id = users_1.id",
+    )
+    check_normalized(
+        "bind parameters are kept",
+        "SELECT * FROM chat_sessions WHERE user_id = $1::UUID AND id = $2",
+        "SELECT * FROM chat_sessions WHERE user_id = $1::UUID AND id = $2",
+    )
+
+
+def test_lists_and_whitespace():
+    """IN lists of any length collapse to one shape; whitespace is folded."""
+    print("\n2️⃣ Lists and whitespace...")
+    short = normalize_sql("SELECT * FROM characters WHERE id IN ($1, $2)")
+    long = normalize_sql("SELECT * FROM characters WHERE id IN ($1::VARCHAR, $2::VARCHAR, $3::VARCHAR, $4::VARCHAR)")
+    check("parameter lists collapse", short == "SELECT * FROM characters WHERE id IN (...)", short)
+    check("list length does not matter", short == long, long)
+    check_normalized(
+        "literal lists collapse",
+        "DELETE FROM chat_messages WHERE id IN (1, 2, 3)",
+        "DELETE FROM chat_messages WHERE id IN (...)",
+    )
+    check_normalized(
+        "single parameter is not a list",
+        "SELECT * FROM users WHERE id IN ($1)",
+        "SELECT * FROM users WHERE id IN ($1)",
+    )
+    check_normalized(
+        "whitespace is folded",
+        "SELECT id\n  FROM users\n\tWHERE  is_active = true  ",
+        "SELECT id FROM users WHERE is_active = true",
+    )
+    long_statement = "SELECT " + ", ".join(f"column_{i}" for i in range(1000)) + " FROM wide"
+    check("long statements are truncated", len(normalize_sql(long_statement)) == MAX_SQL_LENGTH)
+
+
+def test_grouping():
+    """An N+1 loop groups into one repeated statement."""
+    print("\n3️⃣ Grouping repeated statements...")
+    queries = RequestQueries(scope={})
+    for character_id in ("einstein-001", "fatih-001", "curie-001"):
+        queries.add(normalize_sql(f"SELECT * FROM characters WHERE id = '{character_id}'"), 0.002)
+    queries.add(normalize_sql("SELECT * FROM users WHERE id = 7"), 0.001)
+
+    repeated = queries.repeated()
+    check("request counts every statement", queries.count == 4)
+    check("loop is one repeated statement", len(repeated) == 1 and repeated[0]["count"] == 3, str(repeated))
+    check("repeated statement is normalized", repeated[0]["sql"] == "SELECT * FROM characters WHERE id = ?")
+
+
+if __name__ == "__main__":
+    print("🗂️ Testing query log normalization...")
+    test_literals()
+    test_lists_and_whitespace()
+    test_grouping()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Query log tests completed!")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test resumable stream buffers: replay after a reconnect, live events,
+ring-buffer overrun and the memory cap.
+"""
+import os
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-for-development")
+
+from fastapi import HTTPException
+from app.core.stream_buffers import StreamBufferRegistry, BufferOverrun, parse_last_event_id
+
+failures = []
+
+
+def check(name: str, condition: bool, details: str = ""):
+    status = "✅" if condition else "❌"
+    print(f"   {status} {name}{': ' + details if details else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def event_ids(chunks):
+    """Sequence numbers of the events among SSE chunks (comments skipped)."""
+    return [
+        int(chunk.decode().split("\n", 1)[0].rsplit(":", 1)[1])
+        for chunk in chunks
+        if chunk.startswith(b"id: ")
+    ]
+
+
+async def collect(buffer, after: int):
+    return [chunk async for chunk in buffer.events(after, heartbeat=1.0)]
+
+
+async def test_resume():
+    """A reconnect gets the missed events, then the live ones."""
+    print("\n1️⃣ Resume after a dropped connection...")
+    registry = StreamBufferRegistry(max_events=100, grace_seconds=60)
+    buffer = registry.create("gen-1", "user-1")
+    for i in range(5):
+        buffer.publish("token", {"text": f"t{i}"})
+
+    last_event_id = parse_last_event_id("gen-1:2", "gen-1")
+    reader = asyncio.ensure_future(collect(buffer, last_event_id))
+    await asyncio.sleep(0.01)
+    buffer.publish("token", {"text": "t5"})
+    buffer.close("done", {"response": "t0t1t2t3t4t5"})
+    ids = event_ids(await asyncio.wait_for(reader, 2))
+
+    check("missed and live events arrive in order", ids == [3, 4, 5, 6, 7], str(ids))
+    check("owner can look the buffer up", registry.get("gen-1", "user-1") is buffer)
+    check("other users cannot", registry.get("gen-1", "user-2") is None)
+    try:
+        parse_last_event_id("gen-2:2", "gen-1")
+        check("Last-Event-ID of another generation is rejected", False)
+    except HTTPException as e:
+        check("Last-Event-ID of another generation is rejected", e.status_code == 400)
+
+
+async def test_overrun():
+    """Events already dropped from the ring buffer cannot be resumed."""
+    print("\n2️⃣ Ring-buffer overrun...")
+    registry = StreamBufferRegistry(max_events=4, grace_seconds=60)
+    buffer = registry.create("gen-2", "user-1")
+    for i in range(10):
+        buffer.publish("token", {"text": f"t{i}"})
+
+    try:
+        buffer.check_resumable(2)
+        check("stale reconnect is refused", False, "no BufferOverrun")
+    except BufferOverrun:
+        check("stale reconnect is refused", True)
+
+    buffer.close("done", {})
+    buffer.check_resumable(7)
+    ids = event_ids(await asyncio.wait_for(collect(buffer, 7), 2))
+    check("recent reconnect replays the held events", ids == [8, 9, 10, 11], str(ids))
+
+
+async def test_memory_cap():
+    """Completed buffers are evicted first; new streams are refused while full."""
+    print("\n3️⃣ Memory cap...")
+    registry = StreamBufferRegistry(max_events=100, grace_seconds=60, memory_limit=2000)
+    done = registry.create("gen-done", "user-1")
+    done.publish("token", {"text": "x" * 2500})
+    done.close("done", {})
+
+    live = registry.create("gen-live", "user-1")
+    check("completed buffer is evicted to make room", registry.get("gen-done", "user-1") is None)
+
+    live.publish("token", {"text": "y" * 2500})
+    try:
+        registry.create("gen-new", "user-1")
+        check("new stream is refused while live buffers are full", False)
+    except HTTPException as e:
+        check("new stream is refused while live buffers are full", e.status_code == 503)
+
+    live.close("done", {})
+    registry.create("gen-new", "user-1")
+    check("new stream starts once the live buffer completes", registry.get("gen-new", "user-1") is not None)
+
+
+async def main():
+    print("📡 Testing stream buffers...")
+    await test_resume()
+    await test_overrun()
+    await test_memory_cap()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n🎉 Stream buffer tests completed!")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())